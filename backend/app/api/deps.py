@@ -2,12 +2,14 @@
 API依赖模块
 """
 
-from typing import Generator, Optional
+from typing import Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+# 与接口共用同一个 get_db，同一请求内的认证和业务查询使用同一个会话
+from app.core.database import get_db
 from app.core.security import verify_token, SecurityException
+from app.core.user_cache import cache_user, get_cached_user
 from app.models.user import User, UserRole
 
 
@@ -18,15 +20,6 @@ security = HTTPBearer(auto_error=False)
 COOKIE_NAME = "access_token"
 
 
-def get_db() -> Generator:
-    """获取数据库会话"""
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
-
 def get_current_user(
     request: Request,
     db: Session = Depends(get_db),
@@ -47,6 +40,11 @@ def get_current_user(
     if not token:
         raise SecurityException("未提供访问令牌")
 
+    # 命中缓存时不查询数据库（用户被修改或停用时缓存会被清除）
+    user = get_cached_user(token)
+    if user is not None:
+        return user
+
     user_id = verify_token(token)
     if user_id is None:
         raise SecurityException("无效的访问令牌")
@@ -58,6 +56,7 @@ def get_current_user(
     if not user.is_active:
         raise SecurityException("用户已被禁用")
 
+    cache_user(token, user)
     return user
 
 
@@ -3,18 +3,21 @@
 """
 
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from starlette.concurrency import run_in_threadpool
 
 from app.api.deps import get_db, get_current_user, get_current_superuser
 from app.core.config import settings
+from app.core.database import get_async_db, run_in_session
 from app.core.security import (
-    authenticate_user,
     create_access_token,
     get_password_hash,
+    verify_password,
 )
 from app.models.user import User, UserRole
 from app.schemas.auth import Token, UserLogin, UserRegister, UserResponse
@@ -27,13 +30,13 @@ COOKIE_MAX_AGE = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60  # 秒
 
 
 @router.post("/login")
-def login(
-    db: Session = Depends(get_db),
+async def login(
+    db=Depends(get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
-    """用户登录 - 通过HttpOnly Cookie设置JWT"""
-    user = authenticate_user(form_data.username, form_data.password, db)
-    if not user:
+    """用户登录 - 通过HttpOnly Cookie设置JWT（bcrypt 校验放到线程池，不阻塞事件循环）"""
+    user = await run_in_session(db, _get_user_by_username, form_data.username)
+    if not user or not await run_in_threadpool(verify_password, form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -50,24 +53,11 @@ def login(
         subject=user.id, expires_delta=access_token_expires
     )
 
-    # 更新最后登录时间
-    from sqlalchemy.sql import func
-    user.last_login = func.now()
-    db.commit()
-
-    # 构建响应数据（不再返回token给前端）
+    # 更新最后登录时间，并构建响应数据（不再返回token给前端）
     response_data = {
         "token_type": "bearer",
         "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        "user": {
-            "id": user.id,
-            "username": user.username,
-            "name": user.name,
-            "role": user.role.value,
-            "department": user.department,
-            "is_active": user.is_active,
-            "can_view_price": user.can_view_price()
-        }
+        "user": await run_in_session(db, _record_login, user)
     }
 
     # 通过HttpOnly Cookie设置JWT token
@@ -84,6 +74,26 @@ def login(
     return response
 
 
+def _get_user_by_username(db: Session, username: str) -> Optional[User]:
+    """按用户名查询用户（同步）"""
+    return db.query(User).filter(User.username == username).first()
+
+
+def _record_login(db: Session, user: User) -> dict:
+    """更新最后登录时间并返回登录响应中的用户信息（同步，提交后在会话内重新加载）"""
+    user.last_login = func.now()
+    db.commit()
+    return {
+        "id": user.id,
+        "username": user.username,
+        "name": user.name,
+        "role": user.role.value,
+        "department": user.department,
+        "is_active": user.is_active,
+        "can_view_price": user.can_view_price()
+    }
+
+
 @router.post("/logout")
 def logout() -> Any:
     """用户登出 - 清除HttpOnly Cookie"""
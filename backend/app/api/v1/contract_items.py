@@ -2,20 +2,22 @@
 合同清单明细管理API接口
 """
 
-import math
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db, run_in_session
 from app.models.user import User
-from app.models.contract import ContractFileVersion, SystemCategory, ContractItem
+from app.models.contract import ContractFileVersion, SystemCategory, ContractItem, VersionedContractItem
 from app.schemas.contract import (
     ContractItemCreate,
     ContractItemUpdate,
     ContractItemResponse,
 )
+from app.services.contract_search_service import ContractSearchService
+from app.services.contract_version_service import ContractVersionService
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
@@ -29,14 +31,35 @@ async def get_contract_items(
     search: Optional[str] = Query(None, description="搜索关键词"),
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
+    db=Depends(get_async_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
     获取合同清单明细列表
 
-    支持按系统分类、物料类型筛选，支持关键词搜索和分页
+    支持按系统分类、物料类型筛选，支持关键词搜索和分页；
+    传入 cursor 时按明细ID游标分页（不再按搜索相关度排序）
     """
+    return await run_in_session(
+        db, _list_contract_items, project_id, version_id, category_id, item_type, search, page, size, cursor, count
+    )
+
+
+def _list_contract_items(
+    db: Session,
+    project_id: int,
+    version_id: int,
+    category_id: Optional[int],
+    item_type: Optional[str],
+    search: Optional[str],
+    page: int,
+    size: int,
+    cursor: Optional[str],
+    count: str
+) -> dict:
+    """查询合同清单明细列表（同步），返回分页结果"""
 
     # 验证版本是否存在
     version = db.query(ContractFileVersion).filter(
@@ -48,49 +71,33 @@ async def get_contract_items(
         raise HTTPException(status_code=404, detail="指定的版本不存在")
 
     # 构建查询
-    query = db.query(ContractItem).filter(
-        ContractItem.version_id == version_id,
-        ContractItem.is_active == True
+    query = db.query(VersionedContractItem).filter(
+        VersionedContractItem.version_id == version_id,
+        VersionedContractItem.is_active == True
     )
 
     # 应用筛选条件
     if category_id:
-        query = query.filter(ContractItem.category_id == category_id)
+        query = query.filter(VersionedContractItem.category_id == category_id)
 
     if item_type:
-        query = query.filter(ContractItem.item_type == item_type)
+        query = query.filter(VersionedContractItem.item_type == item_type)
 
+    # 关键词搜索走全文索引，结果按相关度排序
     if search:
-        query = query.filter(
-            (ContractItem.item_name.contains(search)) |
-            (ContractItem.brand_model.contains(search)) |
-            (ContractItem.specification.contains(search))
-        )
+        query = ContractSearchService(db).apply_search(query, VersionedContractItem.id, search)
 
-    # 计算总数
-    total = query.count()
-
-    # 分页查询
-    offset = (page - 1) * size
-    items = query.offset(offset).limit(size).all()
-
-    # 计算总页数
-    pages = math.ceil(total / size)
+    # 页码分页时有搜索词则保留相关度排序，其余按明细ID排序
+    result = paginate(
+        query, [(VersionedContractItem.id, False)], size, page, cursor, count, preserve_order=bool(search)
+    )
 
     # 将数据库对象转换为字典格式，避免Pydantic序列化问题
-    items_dict = [item.to_dict() for item in items]
-
-    return {
-        "items": items_dict,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": pages
-    }
+    return {**result, "items": [item.to_dict() for item in result["items"]]}
 
 
 @router.post("/projects/{project_id}/versions/{version_id}/items", response_model=ContractItemResponse)
-async def create_contract_item(
+def create_contract_item(
     item_data: ContractItemCreate,
     project_id: int = Path(..., description="项目ID"),
     version_id: int = Path(..., description="版本ID"),
@@ -132,6 +139,9 @@ async def create_contract_item(
         new_item.calculate_total_price()
 
         db.add(new_item)
+        db.flush()
+        ContractSearchService(db).index_items([new_item.id])
+        ContractVersionService(db).refresh_summary(version_id, [new_item.category_id])
         db.commit()
         db.refresh(new_item)
 
@@ -147,28 +157,33 @@ async def get_contract_item(
     project_id: int = Path(..., description="项目ID"),
     version_id: int = Path(..., description="版本ID"),
     item_id: int = Path(..., description="明细ID"),
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
     获取单个合同清单明细
     """
+    return await run_in_session(db, _get_contract_item, project_id, version_id, item_id)
 
-    item = db.query(ContractItem).filter(
-        ContractItem.id == item_id,
-        ContractItem.version_id == version_id,
-        ContractItem.project_id == project_id,
-        ContractItem.is_active == True
+
+def _get_contract_item(db: Session, project_id: int, version_id: int, item_id: int) -> ContractItemResponse:
+    """查询单个合同清单明细（同步），在会话内完成序列化"""
+
+    item = db.query(VersionedContractItem).filter(
+        VersionedContractItem.id == item_id,
+        VersionedContractItem.version_id == version_id,
+        VersionedContractItem.project_id == project_id,
+        VersionedContractItem.is_active == True
     ).first()
 
     if not item:
         raise HTTPException(status_code=404, detail="指定的合同清单明细不存在")
 
-    return item
+    return ContractItemResponse.from_orm(item)
 
 
 @router.put("/projects/{project_id}/versions/{version_id}/items/{item_id}", response_model=ContractItemResponse)
-async def update_contract_item(
+def update_contract_item(
     item_update: ContractItemUpdate,
     project_id: int = Path(..., description="项目ID"),
     version_id: int = Path(..., description="版本ID"),
@@ -178,33 +193,34 @@ async def update_contract_item(
 ):
     """
     更新合同清单明细
-    """
-
-    item = db.query(ContractItem).filter(
-        ContractItem.id == item_id,
-        ContractItem.version_id == version_id,
-        ContractItem.project_id == project_id,
-        ContractItem.is_active == True
-    ).first()
 
-    if not item:
-        raise HTTPException(status_code=404, detail="指定的合同清单明细不存在")
+    明细同时属于其他版本时按写时复制处理：本版本改为引用修改后的新明细（返回新的明细ID），
+    其他版本中的明细保持不变
+    """
 
     try:
         # 更新字段
         update_data = item_update.dict(exclude_unset=True)
 
-        for field, value in update_data.items():
-            setattr(item, field, value)
+        updated_item_id = ContractVersionService(db).update_item(
+            project_id=project_id,
+            version_id=version_id,
+            item_id=item_id,
+            update_data=update_data
+        )
 
-        # 重新计算总价
-        item.calculate_total_price()
+        if updated_item_id is None:
+            raise HTTPException(status_code=404, detail="指定的合同清单明细不存在")
 
         db.commit()
-        db.refresh(item)
 
-        return item
+        return db.query(VersionedContractItem).filter(
+            VersionedContractItem.id == updated_item_id,
+            VersionedContractItem.version_id == version_id
+        ).first()
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"更新合同清单明细失败：{str(e)}")
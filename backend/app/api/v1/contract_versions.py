@@ -2,12 +2,12 @@
 合同清单版本管理API接口
 """
 
-from typing import List
+from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, HTTPException, Path
 from sqlalchemy.orm import Session
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User
 from app.models.project import Project
 from app.models.contract import ContractFileVersion
@@ -15,14 +15,15 @@ from app.schemas.contract import (
     ContractFileVersionCreate,
     ContractFileVersionResponse,
 )
+from app.services.contract_version_service import ContractVersionService
 
 router = APIRouter()
 
 
 @router.get("/projects/{project_id}/contract-versions", response_model=List[ContractFileVersionResponse])
-async def get_contract_versions(
+def get_contract_versions(
     project_id: int = Path(..., description="项目ID"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -45,9 +46,9 @@ async def get_contract_versions(
 
 
 @router.get("/projects/{project_id}/contract-versions/current", response_model=ContractFileVersionResponse)
-async def get_current_contract_version(
+def get_current_contract_version(
     project_id: int = Path(..., description="项目ID"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -73,8 +74,39 @@ async def get_current_contract_version(
     return current_version
 
 
+@router.get("/projects/{project_id}/contract-versions/{base_version_id}/diff/{target_version_id}")
+def diff_contract_versions(
+    project_id: int = Path(..., description="项目ID"),
+    base_version_id: int = Path(..., description="基准版本ID"),
+    target_version_id: int = Path(..., description="对比版本ID"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_user)
+) -> Dict[str, Any]:
+    """
+    比较两个合同清单版本
+
+    返回新增、删除、变化的设备明细（含逐字段新旧值）以及各系统分类的数量、金额和预算变化
+    """
+
+    # 验证项目是否存在
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail=f"项目ID {project_id} 不存在")
+
+    # 验证两个版本都属于该项目
+    for version_id in (base_version_id, target_version_id):
+        version = db.query(ContractFileVersion).filter(
+            ContractFileVersion.id == version_id,
+            ContractFileVersion.project_id == project_id
+        ).first()
+        if not version:
+            raise HTTPException(status_code=404, detail=f"版本ID {version_id} 不存在")
+
+    return ContractVersionService(db).diff_versions(base_version_id, target_version_id)
+
+
 @router.post("/projects/{project_id}/contract-versions", response_model=ContractFileVersionResponse)
-async def create_contract_version(
+def create_contract_version(
     version_data: ContractFileVersionCreate,
     project_id: int = Path(..., description="项目ID"),
     db: Session = Depends(get_db),
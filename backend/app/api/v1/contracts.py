@@ -9,15 +9,16 @@ import logging
 import os
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.user import User
 from app.models.project import Project
-from app.models.contract import ContractFileVersion, SystemCategory, ContractItem
+from app.models.contract import ContractFileVersion, SystemCategory
 from app.schemas.contract import (
     SystemCategoryCreate,
     SystemCategoryResponse,
     ContractSummaryResponse,
 )
+from app.services.contract_version_service import ContractVersionService
 
 # 创建路由器
 router = APIRouter()
@@ -31,7 +32,7 @@ logger = logging.getLogger(__name__)
 # ============================
 
 @router.get("/projects/{project_id}/versions/{version_id}/categories")
-async def get_system_categories_list(project_id: int, version_id: int, db: Session = Depends(get_db), current_user: User = Depends(deps.get_current_user)):
+def get_system_categories_list(project_id: int, version_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(deps.get_current_user)):
     """Get system categories for a specific version"""
     categories = db.query(SystemCategory).filter(
         SystemCategory.project_id == project_id,
@@ -59,7 +60,7 @@ async def get_system_categories_list(project_id: int, version_id: int, db: Sessi
     return result
 
 @router.get("/projects/{project_id}/versions/{version_id}/categories-working")
-async def get_system_categories_working(project_id: int, version_id: int, db: Session = Depends(get_db), current_user: User = Depends(deps.get_current_user)):
+def get_system_categories_working(project_id: int, version_id: int, db: Session = Depends(get_read_db), current_user: User = Depends(deps.get_current_user)):
     """Get system categories for a specific version - proper implementation"""
     try:
         categories = db.query(SystemCategory).filter(
@@ -93,7 +94,7 @@ async def get_system_categories_working(project_id: int, version_id: int, db: Se
 
 
 @router.post("/projects/{project_id}/versions/{version_id}/categories", response_model=SystemCategoryResponse)
-async def create_system_category(
+def create_system_category(
     category_data: SystemCategoryCreate,
     project_id: int = Path(..., description="项目ID"),
     version_id: int = Path(..., description="版本ID"),
@@ -146,9 +147,9 @@ async def create_system_category(
 # ============================
 
 @router.get("/projects/{project_id}/contract-summary", response_model=ContractSummaryResponse)
-async def get_contract_summary(
+def get_contract_summary(
     project_id: int = Path(..., description="项目ID"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -173,36 +174,28 @@ async def get_contract_summary(
         ContractFileVersion.project_id == project_id
     ).count()
 
-    # 统计当前版本的数据
+    # 统计当前版本的数据（读取维护好的版本汇总）
     total_categories = 0
-    total_items = 0
-    total_amount = 0
+    summary = None
 
     if current_version:
         total_categories = db.query(SystemCategory).filter(
             SystemCategory.version_id == current_version.id
         ).count()
 
-        items_query = db.query(ContractItem).filter(
-            ContractItem.version_id == current_version.id,
-            ContractItem.is_active == True
-        )
-
-        total_items = items_query.count()
-
-        # 计算总金额
-        total_amount = sum([
-            float(item.total_price) for item in items_query.all()
-            if item.total_price
-        ])
+        summary = ContractVersionService(db).get_version_summary(current_version.id)
 
     return ContractSummaryResponse(
         project_id=project_id,
         current_version=current_version,
         total_versions=total_versions,
         total_categories=total_categories,
-        total_items=total_items,
-        total_amount=total_amount
+        total_items=summary["items_count"] if summary else 0,
+        total_amount=summary["total_amount"] if summary else 0,
+        main_items=summary["main_items_count"] if summary else 0,
+        auxiliary_items=summary["auxiliary_items_count"] if summary else 0,
+        main_amount=summary["main_amount"] if summary else 0,
+        auxiliary_amount=summary["auxiliary_amount"] if summary else 0
     )
 
 
@@ -211,7 +204,7 @@ async def get_contract_summary(
 # ============================
 
 @router.get("/projects/{project_id}/contract-versions/{version_id}/download")
-async def download_contract_file(
+def download_contract_file(
     project_id: int = Path(..., description="项目ID"),
     version_id: int = Path(..., description="版本ID"),
     db: Session = Depends(get_db),
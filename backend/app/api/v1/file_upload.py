@@ -5,22 +5,25 @@
 提供Excel文件上传和解析功能，支持合同清单的批量导入
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import os
-import shutil
+import uuid
+import hashlib
 import logging
 from datetime import datetime
 from pathlib import Path
 
 from app.api import deps
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
 from app.models.project import Project
-from app.models.contract import ContractFileVersion, SystemCategory, ContractItem
+from app.models.contract import ContractFileVersion, ContractImportJob
 from app.schemas.contract import ExcelUploadResponse
-from app.utils.excel_parser import ContractExcelParser
+from app.services.contract_import_service import ContractImportService, run_contract_import_job
+from app.services.contract_version_service import ContractVersionService
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -32,6 +35,7 @@ router = APIRouter()
 UPLOAD_DIR = Path("uploads/contracts")
 ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 每次写入1MB
 
 # 确保上传目录存在
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
@@ -65,43 +69,64 @@ def validate_file(file: UploadFile) -> None:
             detail=f"文件大小超过限制 {MAX_FILE_SIZE / 1024 / 1024:.1f}MB"
         )
 
-def save_uploaded_file(file: UploadFile, project_id: int) -> str:
+def save_uploaded_file(file: UploadFile, project_id: int) -> Tuple[str, str]:
     """
     保存上传的文件
+
+    写入磁盘的同时计算内容哈希；开启去重时文件按哈希命名，
+    相同内容的文件只保存一份，新版本直接引用已存储的文件
     
     Args:
         file: 上传的文件
         project_id: 项目ID
         
     Returns:
-        str: 保存的文件路径
+        Tuple[str, str]: 保存的文件路径和文件内容的SHA-256哈希
     """
-    # 生成文件名
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     file_extension = Path(file.filename).suffix
-    stored_filename = f"contract_project_{project_id}_{timestamp}{file_extension}"
-    
-    # 完整路径
-    file_path = UPLOAD_DIR / stored_filename
+    tmp_path = UPLOAD_DIR / f".upload_{uuid.uuid4().hex}{file_extension}.part"
+    hasher = hashlib.sha256()
     
     # 保存文件
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: file.file.read(UPLOAD_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+                buffer.write(chunk)
+        
+        file_hash = hasher.hexdigest()
+        
+        if settings.contract_upload_dedup:
+            stored_filename = f"contract_{file_hash}{file_extension.lower()}"
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            stored_filename = f"contract_project_{project_id}_{timestamp}{file_extension}"
+        
+        # 完整路径
+        file_path = UPLOAD_DIR / stored_filename
+        
+        if settings.contract_upload_dedup and file_path.exists():
+            tmp_path.unlink()
+            logger.info(f"文件内容已存在，复用已存储的文件: {file_path}")
+        else:
+            os.replace(tmp_path, file_path)
+            logger.info(f"文件保存成功: {file_path}")
         
-        logger.info(f"文件保存成功: {file_path}")
-        return str(file_path)
+        return str(file_path), file_hash
         
     except Exception as e:
+        if tmp_path.exists():
+            tmp_path.unlink()
         logger.error(f"保存文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"保存文件失败: {str(e)}")
 
 @router.post("/projects/{project_id}/upload-contract-excel", response_model=ExcelUploadResponse)
-async def upload_contract_excel(
+def upload_contract_excel(
     project_id: int,
     file: UploadFile = File(..., description="Excel合同清单文件"),
     upload_reason: Optional[str] = Form(None, description="上传原因说明"),
     change_description: Optional[str] = Form(None, description="变更详细说明"),
+    incremental: bool = Form(False, description="返回相对当前版本的差异报告（新增、变化、删除的明细）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
@@ -127,151 +152,124 @@ async def upload_contract_excel(
     file.filename = Path(file.filename).name
 
     # 保存文件
-    file_path = save_uploaded_file(file, project_id)
+    file_path, file_hash = save_uploaded_file(file, project_id)
     
-    try:
-        # 解析Excel文件
-        parser = ContractExcelParser()
-        parser.load_excel_file(file_path)
-        parsed_result = parser.parse_all_sheets()
-        
-        # SQLAlchemy会自动管理事务，不需要手动begin()
-        
-        # 创建合同清单版本
-        latest_version = db.query(ContractFileVersion).filter(
-            ContractFileVersion.project_id == project_id
-        ).order_by(ContractFileVersion.version_number.desc()).first()
-        
-        next_version_number = (latest_version.version_number + 1) if latest_version else 1
-        
-        # 设置之前的版本为非当前版本
-        db.query(ContractFileVersion).filter(
-            ContractFileVersion.project_id == project_id,
-            ContractFileVersion.is_current == True
-        ).update({"is_current": False})
-        
-        # 创建新版本记录
-        new_version = ContractFileVersion(
-            project_id=project_id,
-            version_number=next_version_number,
-            upload_user_name=current_user.name,
-            original_filename=Path(file.filename).name if file.filename else "unknown",
-            stored_filename=Path(file_path).name,
-            file_size=Path(file_path).stat().st_size,
-            upload_reason=upload_reason,
-            change_description=change_description,
-            is_current=True
-        )
-        
-        db.add(new_version)
-        db.flush()  # 获取版本ID
-        
-        # 导入系统分类
-        category_id_mapping = {}  # 用于映射分类名称到ID
-        
-        for category_data in parsed_result['categories']:
-            new_category = SystemCategory(
-                project_id=project_id,
-                version_id=new_version.id,
-                category_name=category_data['category_name'],
-                category_code=category_data['category_code'],
-                excel_sheet_name=category_data['excel_sheet_name'],
-                budget_amount=category_data.get('budget_amount'),
-                description=category_data.get('description'),
-                total_items_count=category_data['total_items_count']
-            )
-            
-            db.add(new_category)
-            db.flush()  # 获取分类ID
-            
-            category_id_mapping[category_data['category_name']] = new_category.id
-        
-        # 导入设备明细
-        imported_items_count = 0
-        import_errors = []
-        
-        for item_data in parsed_result['items']:
-            try:
-                # 获取分类ID
-                category_id = category_id_mapping.get(item_data.get('category_name'))
-                
-                new_item = ContractItem(
-                    project_id=project_id,
-                    version_id=new_version.id,
-                    category_id=category_id,
-                    serial_number=item_data.get('serial_number'),
-                    item_name=item_data['item_name'],
-                    brand_model=item_data.get('brand_model'),
-                    specification=item_data.get('specification'),
-                    unit=item_data.get('unit', '台'),
-                    quantity=item_data['quantity'],
-                    unit_price=item_data.get('unit_price'),
-                    origin_place=item_data.get('origin_place', '中国'),
-                    item_type=item_data.get('item_type', '主材'),
-                    remarks=item_data.get('remarks')
-                )
-                
-                # 计算总价
-                new_item.calculate_total_price()
-                
-                db.add(new_item)
-                imported_items_count += 1
-                
-            except Exception as e:
-                error_msg = f"导入设备 '{item_data.get('item_name', '未知')}' 失败: {str(e)}"
-                import_errors.append(error_msg)
-                logger.warning(error_msg)
-        
-        # 提交事务
-        db.commit()
-        
-        # 关闭解析器
-        parser.close()
-        
-        # 构建响应
-        response = ExcelUploadResponse(
-            success=True,
-            message=f"Excel文件上传和解析成功！导入了 {imported_items_count} 个设备明细",
-            version_id=new_version.id,
-            parsed_data={
-                "total_sheets": parsed_result['summary']['total_sheets'],
-                "total_categories": len(parsed_result['categories']),
-                "total_items": len(parsed_result['items']),
-                "imported_items": imported_items_count,
-                "total_amount": float(parsed_result['summary']['total_amount']),
-                "categories": [cat['category_name'] for cat in parsed_result['categories']]
-            },
-            errors=import_errors if import_errors else None
-        )
-        
-        logger.info(f"项目 {project_id} 的Excel文件上传成功，版本ID: {new_version.id}")
-        
-        return response
-        
-    except Exception as e:
-        # 回滚事务
-        db.rollback()
-        
-        # 删除上传的文件
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except (OSError, IOError):
-            pass
-        
-        error_msg = f"解析Excel文件失败: {str(e)}"
-        logger.error(error_msg)
-        
+    return ContractImportService(db).import_contract_file(
+        project_id=project_id,
+        file_path=file_path,
+        original_filename=file.filename,
+        upload_user_name=current_user.name,
+        upload_reason=upload_reason,
+        change_description=change_description,
+        file_hash=file_hash,
+        incremental=incremental
+    )
+
+@router.post("/projects/{project_id}/contract-import-jobs")
+def create_contract_import_job(
+    project_id: int,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="Excel合同清单文件"),
+    upload_reason: Optional[str] = Form(None, description="上传原因说明"),
+    change_description: Optional[str] = Form(None, description="变更详细说明"),
+    incremental: bool = Form(False, description="返回相对当前版本的差异报告（新增、变化、删除的明细）"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    异步导入合同清单Excel文件
+
+    保存文件并创建导入任务后立即返回任务ID，解析和导入在后台执行，
+    通过任务查询接口轮询进度，完成后通过结果接口获取上传结果
+    """
+
+    # 验证项目是否存在
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail=f"项目ID {project_id} 不存在")
+
+    # 验证文件
+    validate_file(file)
+
+    # 去除文件名中的目录路径部分，防止路径遍历攻击
+    file.filename = Path(file.filename).name
+
+    # 保存文件
+    file_path, file_hash = save_uploaded_file(file, project_id)
+
+    job = ContractImportService(db).create_import_job(
+        project_id=project_id,
+        file_path=file_path,
+        original_filename=file.filename,
+        upload_user_name=current_user.name,
+        upload_reason=upload_reason,
+        change_description=change_description,
+        incremental=incremental,
+        file_hash=file_hash
+    )
+
+    background_tasks.add_task(run_contract_import_job, job.job_id)
+
+    logger.info(f"项目 {project_id} 创建合同清单导入任务: {job.job_id}")
+
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "message": "导入任务已创建，正在后台解析"
+    }
+
+def _get_import_job(db: Session, project_id: int, job_id: str) -> ContractImportJob:
+    """查询项目下的导入任务，不存在时抛出404"""
+    job = db.query(ContractImportJob).filter(
+        ContractImportJob.job_id == job_id,
+        ContractImportJob.project_id == project_id
+    ).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail=f"导入任务 {job_id} 不存在")
+
+    return job
+
+@router.get("/projects/{project_id}/contract-import-jobs/{job_id}")
+def get_contract_import_job(
+    project_id: int,
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    查询合同清单导入任务的状态和进度
+    """
+    return _get_import_job(db, project_id, job_id).to_dict()
+
+@router.get("/projects/{project_id}/contract-import-jobs/{job_id}/result", response_model=ExcelUploadResponse)
+def get_contract_import_job_result(
+    project_id: int,
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    获取已结束的导入任务的上传结果（与同步上传接口的返回格式一致）
+    """
+    job = _get_import_job(db, project_id, job_id)
+
+    if job.status not in ("completed", "failed"):
+        raise HTTPException(status_code=400, detail=f"导入任务尚未完成，当前状态: {job.status}")
+
+    if not job.result:
         return ExcelUploadResponse(
             success=False,
-            message=error_msg,
+            message="导入任务执行失败",
             version_id=None,
             parsed_data=None,
-            errors=[error_msg]
+            errors=job.errors or None
         )
 
+    return ExcelUploadResponse(**job.result)
+
 @router.get("/projects/{project_id}/contract-files")
-async def list_contract_files(
+def list_contract_files(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -313,7 +311,7 @@ async def list_contract_files(
     }
 
 @router.delete("/projects/{project_id}/contract-files/{version_id}")
-async def delete_contract_file(
+def delete_contract_file(
     project_id: int,
     version_id: int,
     db: Session = Depends(get_db),
@@ -339,19 +337,20 @@ async def delete_contract_file(
         raise HTTPException(status_code=400, detail="不能删除当前生效的版本")
     
     try:
-        # 删除设备明细
-        db.query(ContractItem).filter(ContractItem.version_id == version_id).delete()
-        
-        # 删除系统分类
-        db.query(SystemCategory).filter(SystemCategory.version_id == version_id).delete()
+        # 删除版本成员关系、系统分类和只属于该版本的设备明细（仍被其他版本引用的明细保留）
+        ContractVersionService(db).delete_version_contents(version_id)
         
         # 删除版本记录
         db.delete(version)
         
-        # 删除文件
+        # 删除文件（按内容去重存储的文件仍被其他版本引用时保留）
         if version.stored_filename:
             file_path = UPLOAD_DIR / version.stored_filename
-            if file_path.exists():
+            still_referenced = db.query(ContractFileVersion.id).filter(
+                ContractFileVersion.stored_filename == version.stored_filename,
+                ContractFileVersion.id != version_id
+            ).first()
+            if file_path.exists() and not still_referenced:
                 file_path.unlink()
         
         # 提交事务
@@ -35,7 +35,7 @@ UPLOAD_DIRECTORY.mkdir(parents=True, exist_ok=True)
 
 
 @router.get("/{project_id}/files", response_model=ProjectFileListResponse)
-async def get_project_files(
+def get_project_files(
     project_id: int,
     file_type: Optional[str] = None,
     db: Session = Depends(get_db),
@@ -67,7 +67,7 @@ async def get_project_files(
 
 
 @router.post("/{project_id}/files/upload", response_model=FileUploadResult)
-async def upload_project_file(
+def upload_project_file(
     project_id: int,
     file: UploadFile = File(...),
     file_type: str = Form(...),
@@ -102,7 +102,7 @@ async def upload_project_file(
         )
     
     # 读取文件内容并检查大小
-    content = await file.read()
+    content = file.file.read()
     file_size = len(content)
     
     if file_size > MAX_FILE_SIZE:
@@ -172,7 +172,7 @@ async def upload_project_file(
 
 
 @router.get("/{project_id}/files/{file_id}/download")
-async def download_project_file(
+def download_project_file(
     project_id: int,
     file_id: int,
     db: Session = Depends(get_db),
@@ -199,7 +199,7 @@ async def download_project_file(
 
 
 @router.get("/{project_id}/files/{file_id}/preview")
-async def preview_project_file(
+def preview_project_file(
     project_id: int,
     file_id: int,
     db: Session = Depends(get_db),
@@ -230,7 +230,7 @@ async def preview_project_file(
 
 
 @router.delete("/{project_id}/files/{file_id}")
-async def delete_project_file(
+def delete_project_file(
     project_id: int,
     file_id: int,
     db: Session = Depends(get_db),
@@ -263,7 +263,7 @@ async def delete_project_file(
 
 
 @router.get("/{project_id}/files/{file_id}")
-async def get_file_info(
+def get_file_info(
     project_id: int,
     file_id: int,
     db: Session = Depends(get_db),
@@ -282,7 +282,7 @@ async def get_file_info(
 
 
 @router.patch("/{project_id}/files/{file_id}")
-async def update_file_info(
+def update_file_info(
     project_id: int,
     file_id: int,
     description: Optional[str] = Form(None),
@@ -321,7 +321,7 @@ async def update_file_info(
 
 
 @router.head("/{project_id}/files/{file_id}")
-async def check_file_exists(
+def check_file_exists(
     project_id: int,
     file_id: int,
     db: Session = Depends(get_db),
@@ -344,7 +344,7 @@ async def check_file_exists(
 
 
 @router.get("/file-types")
-async def get_file_types(current_user: User = Depends(deps.get_current_user)):
+def get_file_types(current_user: User = Depends(deps.get_current_user)):
     """获取支持的文件类型配置"""
     return {
         "file_types": [
@@ -8,12 +8,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
-import math
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.project import Project
 from app.models.user import User
+from app.utils.pagination import paginate
 from app.schemas.project import (
     ProjectCreate, 
     ProjectUpdate, 
@@ -26,12 +26,14 @@ router = APIRouter()
 
 
 @router.get("/", response_model=ProjectListResponse)
-async def get_projects(
+def get_projects(
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(10, ge=1, le=100, description="每页数量"),
     search: str = Query(None, description="搜索关键词"),
     status: str = Query(None, description="状态筛选"),
-    db: Session = Depends(get_db),
+    cursor: str = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -55,28 +57,12 @@ async def get_projects(
     if status:
         query = query.filter(Project.status == status)
     
-    # 计算总数
-    total = query.count()
-    
-    # 分页查询 - 就像翻书，一页一页看
-    offset = (page - 1) * size
-    projects = query.offset(offset).limit(size).all()
-    
-    # 计算总页数
-    pages = math.ceil(total / size)
-    
-    # 返回结果
-    return ProjectListResponse(
-        items=projects,
-        total=total,
-        page=page,
-        size=size,
-        pages=pages
-    )
+    # 分页查询 - 就像翻书，一页一页看（传入游标时从上一页最后一个项目之后接着取）
+    return ProjectListResponse(**paginate(query, [(Project.id, False)], size, page, cursor, count))
 
 
 @router.post("/", response_model=ProjectResponse)
-async def create_project(
+def create_project(
     project: ProjectCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -111,9 +97,9 @@ async def create_project(
 
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-async def get_project(
+def get_project(
     project_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -135,7 +121,7 @@ async def get_project(
 
 
 @router.put("/{project_id}", response_model=ProjectResponse)
-async def update_project(
+def update_project(
     project_id: int,
     project_update: ProjectUpdate,
     db: Session = Depends(get_db),
@@ -171,7 +157,7 @@ async def update_project(
 
 
 @router.delete("/{project_id}")
-async def delete_project(
+def delete_project(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -2,37 +2,106 @@
 采购请购模块 - 合同清单物料查询和系统分类查询
 """
 
-from typing import Optional
+import json
+from typing import Iterator, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy import and_
 
 from app.api import deps
-from app.core.database import get_db
-from app.models.purchase import (
-    PurchaseRequest, PurchaseRequestItem, PurchaseStatus
-)
-from app.models.contract import ContractItem
+from app.core.database import get_db, get_read_db
+from app.models.contract import ContractItem, VersionedContractItem
+from app.models.purchase import ContractItemPurchaseLedger
 from app.models.user import User
 from app.schemas.purchase import AuxiliaryTemplateCreate, AuxiliaryTemplateInDB
+from app.services.contract_search_service import ContractSearchService
+from app.services.material_typeahead_service import MaterialTypeaheadService
+from app.services.purchase_ledger_service import PurchaseLedgerService
 from app.services.purchase_service import PurchaseService
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
 
 # ========== 合同清单物料查询 ==========
 
+# by-project 接口可选择返回的明细字段（与 ContractItem.to_dict 一致）
+CONTRACT_ITEM_FIELDS = (
+    "id", "project_id", "version_id", "category_id", "serial_number", "item_name", "brand_model",
+    "specification", "unit", "quantity", "unit_price", "total_price", "origin_place", "item_type",
+    "is_key_equipment", "technical_params", "is_optimized", "optimization_reason", "is_active",
+    "remarks", "created_at", "updated_at"
+)
+_NUMERIC_ITEM_FIELDS = {"quantity", "unit_price", "total_price"}
+_DATETIME_ITEM_FIELDS = {"created_at", "updated_at"}
+# 流式输出时每批从数据库读取的行数
+STREAM_BATCH_SIZE = 1000
+
+
+def _parse_item_fields(fields: Optional[str]) -> List[str]:
+    """解析 fields 参数（逗号分隔），未指定时返回全部字段"""
+    if not fields:
+        return list(CONTRACT_ITEM_FIELDS)
+
+    selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in CONTRACT_ITEM_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"不支持的字段: {', '.join(unknown) or fields}")
+    return selected
+
+
+def _item_row_to_dict(row, fields: List[str]) -> dict:
+    """按 ContractItem.to_dict 的格式输出所选字段"""
+    result = {}
+    for field in fields:
+        value = getattr(row, field)
+        if field in _NUMERIC_ITEM_FIELDS:
+            value = float(value) if value else 0
+        elif field in _DATETIME_ITEM_FIELDS:
+            value = value.isoformat() if value else None
+        result[field] = value
+    return result
+
+
+def _stream_items(query, fields: List[str], stream: str, project_id: int, version_id: int) -> Iterator[str]:
+    """逐批读取并输出明细，内存占用与总行数无关"""
+    rows = query.yield_per(STREAM_BATCH_SIZE)
+
+    if stream == "ndjson":
+        for row in rows:
+            yield json.dumps(_item_row_to_dict(row, fields), ensure_ascii=False) + "\n"
+        return
+
+    yield f'{{"project_id":{project_id},"version_id":{version_id},"items":['
+    total = 0
+    for row in rows:
+        yield ("," if total else "") + json.dumps(_item_row_to_dict(row, fields), ensure_ascii=False)
+        total += 1
+    yield f'],"total":{total}}}'
+
+
 @router.get("/contract-items/by-project/{project_id}")
-async def get_contract_items_by_project(
+def get_contract_items_by_project(
     project_id: int,
     item_type: Optional[str] = Query(None, description="物料类型：主材/辅材"),
     search: Optional[str] = Query(None, description="搜索关键字"),
-    db: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description="返回的字段，逗号分隔，如 id,item_name,brand_model"),
+    size: Optional[int] = Query(None, ge=1, le=1000, description="每页数量（不传则返回全部）"),
+    page: int = Query(1, ge=1, description="页码"),
+    cursor: Optional[str] = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|json)$", description="流式输出：ndjson/json"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
     根据项目获取合同清单物料
     用于申购单表单的智能选择功能
+
+    - fields 只查询和返回所需字段
+    - 传入 size 或 cursor 时分页返回（分页参数与其他列表接口一致）
+    - stream=ndjson 每行一条明细，stream=json 输出与不分页时相同结构的JSON，边查边输出
     """
     # 获取项目的最新版本合同清单
     from app.models.contract import ContractFileVersion
@@ -48,31 +117,52 @@ async def get_contract_items_by_project(
             detail="该项目还没有上传合同清单"
         )
 
-    # 查询合同清单项目
-    query = db.query(ContractItem).filter(
-        ContractItem.project_id == project_id,
-        ContractItem.version_id == latest_version.id,
-        ContractItem.is_active == True
+    selected_fields = _parse_item_fields(fields)
+
+    # 只查询所需字段（始终带上ID，用于排序和游标）
+    columns = [VersionedContractItem.id] + [
+        getattr(VersionedContractItem, field) for field in selected_fields if field != "id"
+    ]
+    query = db.query(*columns).filter(
+        VersionedContractItem.project_id == project_id,
+        VersionedContractItem.version_id == latest_version.id,
+        VersionedContractItem.is_active == True
     )
 
     # 按物料类型筛选（主要用于限制主材只能从清单选择）
     if item_type:
-        query = query.filter(ContractItem.item_type == item_type)
+        query = query.filter(VersionedContractItem.item_type == item_type)
 
-    # 搜索功能
+    # 搜索功能（全文索引，按相关度排序）
     if search:
-        query = query.filter(
-            or_(
-                ContractItem.item_name.ilike(f"%{search}%"),
-                ContractItem.brand_model.ilike(f"%{search}%"),
-                ContractItem.specification.ilike(f"%{search}%")
-            )
+        query = ContractSearchService(db).apply_search(query, VersionedContractItem.id, search)
+    else:
+        query = query.order_by(VersionedContractItem.id)
+
+    if stream:
+        media_type = "application/x-ndjson" if stream == "ndjson" else "application/json"
+        return StreamingResponse(
+            _stream_items(query, selected_fields, stream, project_id, latest_version.id),
+            media_type=media_type,
+            headers={"X-Contract-Version-Id": str(latest_version.id)}
+        )
+
+    if size is not None or cursor is not None:
+        result = paginate(
+            query, [(VersionedContractItem.id, False)], size or 100, page, cursor, count,
+            preserve_order=bool(search)
         )
+        return {
+            **result,
+            "items": [_item_row_to_dict(row, selected_fields) for row in result["items"]],
+            "project_id": project_id,
+            "version_id": latest_version.id
+        }
 
-    items = query.all()
+    items = [_item_row_to_dict(row, selected_fields) for row in query]
 
     return {
-        "items": [item.to_dict() for item in items],
+        "items": items,
         "project_id": project_id,
         "version_id": latest_version.id,
         "total": len(items)
@@ -80,9 +170,9 @@ async def get_contract_items_by_project(
 
 
 @router.get("/contract-items/{item_id}/details")
-async def get_contract_item_details(
+def get_contract_item_details(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -97,13 +187,8 @@ async def get_contract_item_details(
     if not item:
         raise HTTPException(status_code=404, detail="合同清单物料不存在")
 
-    # 计算已申购数量（只统计总经理已批准和已完成的申购单）
-    purchased_quantity = db.query(func.sum(PurchaseRequestItem.quantity)).join(
-        PurchaseRequest
-    ).filter(
-        PurchaseRequestItem.contract_item_id == item_id,
-        PurchaseRequest.status.in_([PurchaseStatus.FINAL_APPROVED, PurchaseStatus.COMPLETED])
-    ).scalar() or 0
+    # 已申购数量（已批准、已完成以及审批中的申购单，读取申购台账，与提交时的超量校验一致）
+    purchased_quantity = PurchaseLedgerService(db).get_requested_quantities([item_id])[item_id]
 
     # 计算剩余可申购数量
     remaining_quantity = float(item.quantity) - float(purchased_quantity)
@@ -117,10 +202,10 @@ async def get_contract_item_details(
 
 
 @router.get("/material-names/by-project/{project_id}")
-async def get_material_names_by_project(
+def get_material_names_by_project(
     project_id: int,
     item_type: str = Query("主材", description="物料类型：主材/辅材"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -138,11 +223,11 @@ async def get_material_names_by_project(
         return {"material_names": []}
 
     # 获取去重的物料名称
-    material_names = db.query(ContractItem.item_name).distinct().filter(
-        ContractItem.project_id == project_id,
-        ContractItem.version_id == latest_version.id,
-        ContractItem.item_type == item_type,
-        ContractItem.is_active == True
+    material_names = db.query(VersionedContractItem.item_name).distinct().filter(
+        VersionedContractItem.project_id == project_id,
+        VersionedContractItem.version_id == latest_version.id,
+        VersionedContractItem.item_type == item_type,
+        VersionedContractItem.is_active == True
     ).all()
 
     return {
@@ -152,11 +237,33 @@ async def get_material_names_by_project(
     }
 
 
+@router.get("/material-names/suggest/{project_id}")
+def suggest_material_names(
+    project_id: int,
+    q: str = Query(..., min_length=1, description="输入内容：汉字、全拼或拼音首字母"),
+    item_type: Optional[str] = Query(None, description="物料类型：主材/辅材"),
+    limit: int = Query(10, ge=1, le=50, description="返回条数"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    物料名称联想输入
+    在项目当前版本的设备名称和品牌型号中按汉字、全拼或拼音首字母前缀匹配，返回前k条
+    """
+    version_id, suggestions = MaterialTypeaheadService(db).suggest(project_id, q, limit, item_type)
+
+    return {
+        "suggestions": suggestions,
+        "project_id": project_id,
+        "version_id": version_id
+    }
+
+
 @router.get("/specifications/by-material")
-async def get_specifications_by_material(
+def get_specifications_by_material(
     project_id: int,
     item_name: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -173,24 +280,30 @@ async def get_specifications_by_material(
     if not latest_version:
         return {"specifications": []}
 
-    # 获取该物料名称下的所有规格选项
-    items = db.query(ContractItem).filter(
-        ContractItem.project_id == project_id,
-        ContractItem.version_id == latest_version.id,
-        ContractItem.item_name == item_name,
-        ContractItem.is_active == True
-    ).all()
+    # 一次查询取出该物料名称下的所有规格选项及申购台账中的已申购数量
+    # （已批准、已完成以及审批中的申购单，与提交时的超量校验一致）
+    rows = db.query(
+        VersionedContractItem.id,
+        VersionedContractItem.specification,
+        VersionedContractItem.brand_model,
+        VersionedContractItem.unit,
+        VersionedContractItem.quantity,
+        VersionedContractItem.unit_price,
+        ContractItemPurchaseLedger.committed_quantity,
+        ContractItemPurchaseLedger.pending_quantity
+    ).outerjoin(
+        ContractItemPurchaseLedger,
+        ContractItemPurchaseLedger.contract_item_id == VersionedContractItem.id
+    ).filter(
+        VersionedContractItem.project_id == project_id,
+        VersionedContractItem.version_id == latest_version.id,
+        VersionedContractItem.item_name == item_name,
+        VersionedContractItem.is_active == True
+    ).order_by(VersionedContractItem.id).all()
 
     specifications = []
-    for item in items:
-        # 计算已申购数量（只统计总经理已批准和已完成的申购单）
-        purchased_quantity = db.query(func.sum(PurchaseRequestItem.quantity)).join(
-            PurchaseRequest
-        ).filter(
-            PurchaseRequestItem.contract_item_id == item.id,
-            PurchaseRequest.status.in_([PurchaseStatus.FINAL_APPROVED, PurchaseStatus.COMPLETED])
-        ).scalar() or 0
-
+    for item in rows:
+        purchased_quantity = (item.committed_quantity or 0) + (item.pending_quantity or 0)
         remaining_quantity = float(item.quantity) - float(purchased_quantity)
 
         specifications.append({
@@ -214,9 +327,9 @@ async def get_specifications_by_material(
 # ========== 辅材智能推荐 ==========
 
 @router.get("/auxiliary/recommend")
-async def recommend_auxiliary_materials(
+def recommend_auxiliary_materials(
     main_material_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -229,7 +342,7 @@ async def recommend_auxiliary_materials(
 
 
 @router.post("/auxiliary/templates/", response_model=AuxiliaryTemplateInDB)
-async def create_auxiliary_template(
+def create_auxiliary_template(
     template_data: AuxiliaryTemplateCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -249,9 +362,9 @@ async def create_auxiliary_template(
 # ========== 系统分类相关API ==========
 
 @router.get("/system-categories/by-project/{project_id}")
-async def get_system_categories_by_project(
+def get_system_categories_by_project(
     project_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -293,10 +406,10 @@ async def get_system_categories_by_project(
 
 
 @router.get("/system-categories/by-material")
-async def get_system_categories_by_material(
+def get_system_categories_by_material(
     project_id: int = Query(..., description="项目ID"),
     material_name: str = Query(..., description="物料名称"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -317,11 +430,11 @@ async def get_system_categories_by_material(
         raise HTTPException(status_code=404, detail="项目未找到有效的合同清单版本")
 
     # 查找该物料名称在合同清单中的所有记录
-    contract_items = db.query(ContractItem).filter(
+    contract_items = db.query(VersionedContractItem).filter(
         and_(
-            ContractItem.version_id == current_version.id,
-            ContractItem.item_name == material_name,
-            ContractItem.is_active == True
+            VersionedContractItem.version_id == current_version.id,
+            VersionedContractItem.item_name == material_name,
+            VersionedContractItem.is_active == True
         )
     ).all()
 
@@ -8,12 +8,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.purchase import Supplier
 from app.models.user import User
 from app.schemas.purchase import (
     SupplierCreate, SupplierUpdate, SupplierInDB, SupplierListResponse
 )
+from app.utils.pagination import paginate
 
 router = APIRouter()
 
@@ -21,15 +22,17 @@ router = APIRouter()
 # ========== 供应商管理 ==========
 
 @router.get("/suppliers/", response_model=SupplierListResponse)
-async def get_suppliers(
+def get_suppliers(
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
     search: Optional[str] = None,
     is_active: Optional[bool] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    """获取供应商列表"""
+    """获取供应商列表（传入 cursor 时按供应商ID游标分页）"""
     query = db.query(Supplier)
 
     if search:
@@ -44,20 +47,11 @@ async def get_suppliers(
     if is_active is not None:
         query = query.filter(Supplier.is_active == is_active)
 
-    total = query.count()
-    items = query.offset((page - 1) * size).limit(size).all()
-
-    return {
-        "items": items,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": (total + size - 1) // size
-    }
+    return paginate(query, [(Supplier.id, False)], size, page, cursor, count)
 
 
 @router.post("/suppliers/", response_model=SupplierInDB)
-async def create_supplier(
+def create_supplier(
     supplier_data: SupplierCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -90,7 +84,7 @@ async def create_supplier(
 
 
 @router.put("/suppliers/{supplier_id}", response_model=SupplierInDB)
-async def update_supplier(
+def update_supplier(
     supplier_id: int,
     update_data: SupplierUpdate,
     db: Session = Depends(get_db),
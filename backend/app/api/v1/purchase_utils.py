@@ -3,15 +3,25 @@
 提供权限检查、数据转换等通用功能
 """
 
+import logging
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import or_
 
-from app.models.purchase import (
-    PurchaseRequest, PurchaseRequestItem, PurchaseStatus
-)
+from app.models.purchase import PurchaseRequest
 from app.models.project import Project
 from app.models.user import User
+from app.services.purchase_ledger_service import PurchaseLedgerService
+
+logger = logging.getLogger(__name__)
+
+# 申购单列表和详情的预加载选项：明细、项目和申请人各用一次 IN 查询批量加载，
+# 查询次数与申购单数量无关
+PURCHASE_REQUEST_LOAD_OPTIONS = (
+    selectinload(PurchaseRequest.items),
+    selectinload(PurchaseRequest.project),
+    selectinload(PurchaseRequest.requester),
+)
 
 
 def get_managed_project_ids(db: Session, current_user: User) -> Optional[List[int]]:
@@ -91,26 +101,10 @@ def enrich_purchase_item_details(db: Session, result: dict):
         ).all()
         contract_item_map = {ci.id: ci for ci in contract_items}
 
-    # 批量获取已申购数量（按contract_item_id分组）
-    # NOTE: This intentionally sums ALL approved/completed purchases globally for each
-    # contract_item_id, matching the original per-item loop behavior. The current purchase
-    # request's own items are included in the sum because the remaining quantity should
-    # reflect the total already committed against the contract line item.
-    purchased_qty_map = {}
-    if contract_item_ids:
-        purchased_rows = db.query(
-            PurchaseRequestItem.contract_item_id,
-            func.sum(PurchaseRequestItem.quantity)
-        ).join(
-            PurchaseRequest
-        ).filter(
-            PurchaseRequestItem.contract_item_id.in_(contract_item_ids),
-            PurchaseRequestItem.item_type == "main",
-            PurchaseRequest.status.in_([PurchaseStatus.FINAL_APPROVED, PurchaseStatus.COMPLETED])
-        ).group_by(
-            PurchaseRequestItem.contract_item_id
-        ).all()
-        purchased_qty_map = {row[0]: row[1] or 0 for row in purchased_rows}
+    # 批量读取申购台账中的已申购数量
+    # NOTE: 台账按contract_item_id全局累计已批准/已完成以及审批中的主材申购（包含当前申购单自身），
+    # 剩余数量与提交时的超量校验口径一致
+    purchased_qty_map = PurchaseLedgerService(db).get_requested_quantities(contract_item_ids)
 
     for item in result['items']:
         # 添加系统分类名称
@@ -133,11 +127,17 @@ def get_project_and_requester_names(db: Session, purchase_request: PurchaseReque
     """
     获取申购单关联的项目名称和申请人名称
     返回 (project_name, requester_name) 元组
+    通过关系读取，查询申购单时已预加载 project 和 requester 的不会再发出查询
     """
-    project = db.query(Project).filter(Project.id == purchase_request.project_id).first()
+    project = purchase_request.project
     project_name = project.project_name if project else None
 
-    requester = db.query(User).filter(User.id == purchase_request.requester_id).first()
+    requester = purchase_request.requester
     requester_name = requester.name if requester else "系统管理员"
+    if purchase_request.requester_id and not requester:
+        logger.warning(
+            "Requester id=%s not found in users table (purchase request id=%s), defaulting to '系统管理员'",
+            purchase_request.requester_id, purchase_request.id
+        )
 
     return project_name, requester_name
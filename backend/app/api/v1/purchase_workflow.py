@@ -3,14 +3,15 @@
 包括提交、询价、部门审批、总经理审批、退回、工作流日志查询
 """
 
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, selectinload
 
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.purchase import (
-    PurchaseRequest, PurchaseRequestItem, PurchaseApproval,
+    PurchaseRequest, PurchaseApproval,
     PurchaseStatus, ApprovalStatus,
     PurchaseWorkflowLog, WorkflowStep
 )
@@ -18,8 +19,9 @@ from app.models.project import Project
 from app.models.user import User, UserRole
 from app.schemas.purchase import (
     PurchaseRequestInDB,
-    PurchaseRequestApprove, PurchaseRequestPriceQuote,
+    PurchaseRequestApprove, PurchaseRequestPriceQuote, PurchaseRequestBatchQuote,
 )
+from app.services.purchase_ledger_service import PurchaseLedgerService
 from app.services.purchase_service import PurchaseService
 from app.api.v1.purchase_utils import check_project_manager_access
 
@@ -27,7 +29,7 @@ router = APIRouter()
 
 
 @router.post("/{request_id}/submit", response_model=PurchaseRequestInDB)
-async def submit_purchase_request(
+def submit_purchase_request(
     request_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -75,8 +77,12 @@ async def submit_purchase_request(
     if not purchaser:
         raise HTTPException(status_code=500, detail="系统中未找到采购员角色")
 
-    # 更新申购单状态和工作流
-    request.status = PurchaseStatus.SUBMITTED
+    # 更新申购单状态和工作流（预留合同数量，与并发提交的申购单一起不超过合同数量）
+    try:
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.SUBMITTED)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     request.current_step = "purchaser"
     request.current_approver_id = purchaser.id
 
@@ -100,25 +106,25 @@ async def submit_purchase_request(
     return request
 
 
-@router.post("/{request_id}/quote", response_model=PurchaseRequestInDB)
-async def quote_purchase_request(
-    request_id: int,
+def _find_dept_manager(db: Session) -> User:
+    """查找部门主管（询价后的下一步审批人）"""
+    dept_manager = db.query(User).filter(User.role == UserRole.DEPT_MANAGER).first()
+    if not dept_manager:
+        raise HTTPException(status_code=500, detail="系统中未找到部门主管角色")
+    return dept_manager
+
+
+def _apply_quote(
+    db: Session,
+    request: PurchaseRequest,
     quote_data: PurchaseRequestPriceQuote,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User,
+    dept_manager: User
 ):
     """
-    申购单询价（采购员）
-    - 填写供应商信息和价格
-    - 预计到货时间和付款方式
+    校验并写入一张申购单的询价信息（不提交事务）
+    申购明细通过 request.items 一次加载，所有报价的明细ID必须属于该申购单
     """
-    if current_user.role.value not in ["purchaser", "admin"]:
-        raise HTTPException(status_code=403, detail="只有采购员可以进行询价")
-
-    request = db.query(PurchaseRequest).filter(PurchaseRequest.id == request_id).first()
-    if not request:
-        raise HTTPException(status_code=404, detail="申购单不存在")
-
     # 状态检查
     if request.status != PurchaseStatus.SUBMITTED:
         raise HTTPException(status_code=400, detail="只能对已提交的申购单进行询价")
@@ -131,18 +137,15 @@ async def quote_purchase_request(
     if request.current_approver_id and request.current_approver_id != current_user.id:
         raise HTTPException(status_code=403, detail="非当前指定审批人，无权操作")
 
-    # 更新申购项价格信息
+    items = {item.id: item for item in request.items}
+    missing_ids = [item_quote.item_id for item_quote in quote_data.items if item_quote.item_id not in items]
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"申购项 {', '.join(map(str, missing_ids))} 不存在")
+
+    # 更新申购项价格信息（修改在提交时按批写入）
     total_amount = 0
     for item_quote in quote_data.items:
-        item = db.query(PurchaseRequestItem).filter(
-            and_(
-                PurchaseRequestItem.id == item_quote.item_id,
-                PurchaseRequestItem.request_id == request_id
-            )
-        ).first()
-
-        if not item:
-            raise HTTPException(status_code=404, detail=f"申购项 {item_quote.item_id} 不存在")
+        item = items[item_quote.item_id]
 
         # 更新价格和供应商信息
         item.unit_price = item_quote.unit_price
@@ -153,7 +156,7 @@ async def quote_purchase_request(
         item.estimated_delivery = item_quote.estimated_delivery
 
         # 更新supplier_info JSON字段来存储新的信息
-        supplier_info = item.supplier_info or {}
+        supplier_info = dict(item.supplier_info or {})
         if item_quote.supplier_contact_person:
             supplier_info['contact_person'] = item_quote.supplier_contact_person
         if item_quote.payment_method:
@@ -162,21 +165,16 @@ async def quote_purchase_request(
 
         total_amount += item.total_price
 
-    # 查找部门主管（下一步审批人）
-    dept_manager = db.query(User).filter(User.role == UserRole.DEPT_MANAGER).first()
-    if not dept_manager:
-        raise HTTPException(status_code=500, detail="系统中未找到部门主管角色")
-
     # 更新申购单信息
     request.total_amount = total_amount
-    request.status = PurchaseStatus.PRICE_QUOTED
+    PurchaseLedgerService(db).transition(request, PurchaseStatus.PRICE_QUOTED)
     # payment_method和estimated_delivery_date已移动到物料级别，这里不再设置
     request.current_step = "dept_manager"
     request.current_approver_id = dept_manager.id
 
     # 记录工作流操作
     workflow_log = PurchaseWorkflowLog(
-        request_id=request_id,
+        request_id=request.id,
         from_step="purchaser",
         to_step="dept_manager",
         operation="quote",
@@ -191,6 +189,30 @@ async def quote_purchase_request(
     )
     db.add(workflow_log)
 
+
+@router.post("/{request_id}/quote", response_model=PurchaseRequestInDB)
+def quote_purchase_request(
+    request_id: int,
+    quote_data: PurchaseRequestPriceQuote,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    申购单询价（采购员）
+    - 填写供应商信息和价格
+    - 预计到货时间和付款方式
+    """
+    if current_user.role.value not in ["purchaser", "admin"]:
+        raise HTTPException(status_code=403, detail="只有采购员可以进行询价")
+
+    request = db.query(PurchaseRequest).options(selectinload(PurchaseRequest.items)).filter(
+        PurchaseRequest.id == request_id
+    ).first()
+    if not request:
+        raise HTTPException(status_code=404, detail="申购单不存在")
+
+    _apply_quote(db, request, quote_data, current_user, _find_dept_manager(db))
+
     db.commit()
     db.refresh(request)
 
@@ -199,8 +221,64 @@ async def quote_purchase_request(
     return request
 
 
+@router.post("/batch-quote", response_model=List[PurchaseRequestInDB])
+def batch_quote_purchase_requests(
+    batch_data: PurchaseRequestBatchQuote,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    批量询价（采购员）
+    - 一次提交多张申购单的询价，全部校验通过后在同一事务内写入
+    - 任意一张申购单校验失败时整体不生效
+    """
+    if current_user.role.value not in ["purchaser", "admin"]:
+        raise HTTPException(status_code=403, detail="只有采购员可以进行询价")
+
+    if len(batch_data.quotes) > 100:
+        raise HTTPException(status_code=400, detail="单次最多询价100张申购单")
+
+    request_ids = [quote.request_id for quote in batch_data.quotes]
+    duplicate_ids = sorted({request_id for request_id in request_ids if request_ids.count(request_id) > 1})
+    if duplicate_ids:
+        raise HTTPException(
+            status_code=400, detail=f"申购单 {', '.join(map(str, duplicate_ids))} 重复提交询价，每张申购单只能出现一次"
+        )
+
+    requests = {
+        request.id: request
+        for request in db.query(PurchaseRequest).options(
+            selectinload(PurchaseRequest.items)
+        ).filter(PurchaseRequest.id.in_(request_ids))
+    }
+    missing_ids = [request_id for request_id in request_ids if request_id not in requests]
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"申购单 {', '.join(map(str, missing_ids))} 不存在")
+
+    dept_manager = _find_dept_manager(db)
+    for quote in batch_data.quotes:
+        request = requests[quote.request_id]
+        try:
+            _apply_quote(db, request, quote, current_user, dept_manager)
+        except HTTPException as e:
+            db.rollback()
+            raise HTTPException(status_code=e.status_code, detail=f"申购单 {request.request_code}: {e.detail}")
+
+    db.commit()
+
+    # 提交后一次查询重新加载所有申购单
+    quoted = {
+        request.id: request
+        for request in db.query(PurchaseRequest).filter(PurchaseRequest.id.in_(request_ids))
+    }
+
+    # TODO: 发送通知给部门主管审批
+
+    return [quoted[request_id] for request_id in request_ids]
+
+
 @router.post("/{request_id}/return", response_model=PurchaseRequestInDB)
-async def return_purchase_request(
+def return_purchase_request(
     request_id: int,
     return_data: PurchaseRequestApprove,  # 复用审批结构，但只用notes字段
     db: Session = Depends(get_db),
@@ -237,7 +315,7 @@ async def return_purchase_request(
             raise HTTPException(status_code=500, detail="未找到原申请人")
 
         # 更新申购单状态
-        request.status = PurchaseStatus.DRAFT
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.DRAFT)
         request.current_step = "project_manager"
         request.current_approver_id = request.requester_id
 
@@ -263,7 +341,7 @@ async def return_purchase_request(
             raise HTTPException(status_code=500, detail="未找到采购员")
 
         # 更新申购单状态
-        request.status = PurchaseStatus.SUBMITTED
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.SUBMITTED)
         request.current_step = "purchaser"
         request.current_approver_id = purchaser.id
 
@@ -299,7 +377,7 @@ async def return_purchase_request(
 
 
 @router.post("/{request_id}/dept-approve", response_model=PurchaseRequestInDB)
-async def dept_approve_purchase_request(
+def dept_approve_purchase_request(
     request_id: int,
     approval_data: PurchaseRequestApprove,
     db: Session = Depends(get_db),
@@ -336,7 +414,7 @@ async def dept_approve_purchase_request(
             raise HTTPException(status_code=500, detail="系统中未找到总经理角色")
 
         # 更新申购单状态和工作流
-        request.status = PurchaseStatus.DEPT_APPROVED
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.DEPT_APPROVED)
         request.current_step = "general_manager"
         request.current_approver_id = general_manager.id
         operation = "approve"
@@ -345,7 +423,7 @@ async def dept_approve_purchase_request(
     elif approval_data.approval_status.value == ApprovalStatus.REJECTED.value:
         # 拒绝：重置到采购员步骤重新询价
         purchaser = db.query(User).filter(User.role == UserRole.PURCHASER).first()
-        request.status = PurchaseStatus.SUBMITTED
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.SUBMITTED)
         request.current_step = "purchaser"
         request.current_approver_id = purchaser.id if purchaser else None
         operation = "reject"
@@ -389,7 +467,7 @@ async def dept_approve_purchase_request(
 
 
 @router.post("/{request_id}/final-approve", response_model=PurchaseRequestInDB)
-async def final_approve_purchase_request(
+def final_approve_purchase_request(
     request_id: int,
     approval_data: PurchaseRequestApprove,
     db: Session = Depends(get_db),
@@ -421,7 +499,7 @@ async def final_approve_purchase_request(
     # 处理审批结果
     if approval_data.approval_status.value == ApprovalStatus.APPROVED.value:
         # 最终批准：完成工作流
-        request.status = PurchaseStatus.FINAL_APPROVED
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.FINAL_APPROVED)
         request.current_step = "completed"
         request.current_approver_id = None
         operation = "final_approve"
@@ -430,7 +508,7 @@ async def final_approve_purchase_request(
     elif approval_data.approval_status.value == ApprovalStatus.REJECTED.value:
         # 拒绝：重置到部门主管步骤重新审批
         dept_manager = db.query(User).filter(User.role == UserRole.DEPT_MANAGER).first()
-        request.status = PurchaseStatus.PRICE_QUOTED
+        PurchaseLedgerService(db).transition(request, PurchaseStatus.PRICE_QUOTED)
         request.current_step = "dept_manager"
         request.current_approver_id = dept_manager.id if dept_manager else None
         operation = "reject"
@@ -476,7 +554,7 @@ async def final_approve_purchase_request(
 
 # 保留原有通用审批API作为兼容性接口
 @router.post("/{request_id}/approve", response_model=PurchaseRequestInDB)
-async def approve_purchase_request(
+def approve_purchase_request(
     request_id: int,
     approval_data: PurchaseRequestApprove,
     db: Session = Depends(get_db),
@@ -487,17 +565,17 @@ async def approve_purchase_request(
     根据用户角色自动路由到对应审批流程
     """
     if current_user.role.value == "dept_manager":
-        return await dept_approve_purchase_request(request_id, approval_data, db, current_user)
+        return dept_approve_purchase_request(request_id, approval_data, db, current_user)
     elif current_user.role.value in ["general_manager", "admin"]:
-        return await final_approve_purchase_request(request_id, approval_data, db, current_user)
+        return final_approve_purchase_request(request_id, approval_data, db, current_user)
     else:
         raise HTTPException(status_code=403, detail="无审批权限")
 
 
 @router.get("/{request_id}/workflow-logs")
-async def get_purchase_workflow_logs(
+def get_purchase_workflow_logs(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
@@ -2,17 +2,14 @@
 采购请购API接口 - CRUD操作
 """
 
-import logging
 from typing import List, Optional
 from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 
-logger = logging.getLogger(__name__)
-
 from app.api import deps
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db, run_in_session
 from app.models.purchase import (
     PurchaseRequest, PurchaseRequestItem, PurchaseApproval,
     PurchaseStatus, PurchaseWorkflowLog
@@ -25,7 +22,9 @@ from app.schemas.purchase import (
     PurchaseRequestListResponse
 )
 from app.services.purchase_service import PurchaseService
+from app.utils.pagination import paginate
 from app.api.v1.purchase_utils import (
+    PURCHASE_REQUEST_LOAD_OPTIONS,
     get_managed_project_ids,
     check_project_manager_access,
     enrich_purchase_item_details,
@@ -45,15 +44,36 @@ async def get_purchase_requests(
     status: Optional[PurchaseStatus] = None,
     requester_id: Optional[int] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
+    db=Depends(get_async_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """
     获取申购单列表
     - 项目经理只能看到自己的申购单，且不显示价格
     - 采购员、项目主管、总经理可以看到所有申购单和价格
+    - 传入 cursor 时按申购单ID游标分页，count 控制是否统计总数
     """
-    query = db.query(PurchaseRequest)
+    return await run_in_session(
+        db, _list_purchase_requests, page, size, project_id, status, requester_id, search, cursor, count, current_user
+    )
+
+
+def _list_purchase_requests(
+    db: Session,
+    page: int,
+    size: int,
+    project_id: Optional[int],
+    status: Optional[PurchaseStatus],
+    requester_id: Optional[int],
+    search: Optional[str],
+    cursor: Optional[str],
+    count: str,
+    current_user: User
+) -> dict:
+    """查询申购单列表（同步），返回分页结果"""
+    query = db.query(PurchaseRequest).options(*PURCHASE_REQUEST_LOAD_OPTIONS)
 
     # 权限过滤 - 项目级权限控制
     managed_ids = get_managed_project_ids(db, current_user)
@@ -79,31 +99,14 @@ async def get_purchase_requests(
             )
         )
 
-    # 分页
-    total = query.count()
-    items = query.offset((page - 1) * size).limit(size).all()
-
-    # 批量获取项目名称和申请人名称，避免N+1查询
-    project_ids = list({item.project_id for item in items if item.project_id})
-    requester_ids = list({item.requester_id for item in items if item.requester_id})
-
-    project_map = {}
-    if project_ids:
-        projects = db.query(Project).filter(Project.id.in_(project_ids)).all()
-        project_map = {p.id: p.project_name for p in projects}
+    # 分页（按ID排序，与默认的插入顺序一致）
+    result = paginate(query, [(PurchaseRequest.id, False)], size, page, cursor, count)
+    items = result["items"]
 
-    requester_map = {}
-    if requester_ids:
-        requesters = db.query(User).filter(User.id.in_(requester_ids)).all()
-        requester_map = {u.id: u.name for u in requesters}
-
-    # 根据角色返回不同的数据视图
+    # 根据角色返回不同的数据视图（明细、项目和申请人已随分页查询批量预加载）
     result_items = []
     for item in items:
-        project_name = project_map.get(item.project_id)
-        requester_name = requester_map.get(item.requester_id, "系统管理员")
-        if item.requester_id and item.requester_id not in requester_map:
-            logger.warning("Requester id=%s not found in users table (purchase request id=%s), defaulting to '系统管理员'", item.requester_id, item.id)
+        project_name, requester_name = get_project_and_requester_names(db, item)
 
         if current_user.role.value == "project_manager":
             # 项目经理看不到价格信息
@@ -117,23 +120,24 @@ async def get_purchase_requests(
             item_dict['requester_name'] = requester_name
             result_items.append(item_dict)
 
-    return {
-        "items": result_items,
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": (total + size - 1) // size
-    }
+    return {**result, "items": result_items}
 
 
 @router.get("/{request_id}", response_model=PurchaseRequestWithItems)
 async def get_purchase_request(
     request_id: int,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     current_user: User = Depends(deps.get_current_user)
 ):
     """获取申购单详情"""
-    request = db.query(PurchaseRequest).filter(PurchaseRequest.id == request_id).first()
+    return await run_in_session(db, _get_purchase_request_detail, request_id, current_user)
+
+
+def _get_purchase_request_detail(db: Session, request_id: int, current_user: User) -> dict:
+    """查询申购单详情（同步），按角色返回是否包含价格的视图"""
+    request = db.query(PurchaseRequest).options(*PURCHASE_REQUEST_LOAD_OPTIONS).filter(
+        PurchaseRequest.id == request_id
+    ).first()
     if not request:
         raise HTTPException(status_code=404, detail="申购单不存在")
 
@@ -161,7 +165,7 @@ async def get_purchase_request(
 
 
 @router.post("/", response_model=PurchaseRequestInDB)
-async def create_purchase_request(
+def create_purchase_request(
     request_data: PurchaseRequestCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -192,7 +196,7 @@ async def create_purchase_request(
 
 
 @router.put("/{request_id}", response_model=PurchaseRequestWithItems)
-async def update_purchase_request(
+def update_purchase_request(
     request_id: int,
     update_data: PurchaseRequestUpdate,
     db: Session = Depends(get_db),
@@ -271,13 +275,13 @@ async def update_purchase_request(
     db.refresh(request)
 
     # 返回完整的申购单信息
-    return await get_purchase_request(request_id, db, current_user)
+    return _get_purchase_request_detail(db, request_id, current_user)
 
 
 # ========== 申购单删除 ==========
 
 @router.delete("/{request_id}")
-async def delete_purchase_request(
+def delete_purchase_request(
     request_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -334,7 +338,7 @@ async def delete_purchase_request(
 
 
 @router.post("/batch-delete")
-async def batch_delete_purchase_requests(
+def batch_delete_purchase_requests(
     request_ids: List[int],
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_user)
@@ -8,7 +8,6 @@ from sqlalchemy import desc
 from typing import List, Optional
 from datetime import datetime, timedelta
 import uuid
-import asyncio
 import sys
 import os
 import subprocess
@@ -18,6 +17,7 @@ from app.core.database import get_db
 from app.models.test_result import TestResult, TestRun
 from app.api.deps import get_current_user
 from app.core.test_scheduler import TestScheduler
+from app.utils.pagination import paginate
 
 
 logger = logging.getLogger(__name__)
@@ -32,9 +32,11 @@ def get_test_runs(
     run_type: Optional[str] = None,
     status: Optional[str] = None,
     days: int = Query(7, ge=1, le=90, description="查询最近N天的数据"),
+    cursor: Optional[str] = Query(None, description="游标（第一页传空字符串，传入后使用游标分页）"),
+    count: str = Query("exact", description="总数统计方式：exact/estimate/none"),
     db: Session = Depends(get_db)
 ):
-    """获取测试运行列表"""
+    """获取测试运行列表（按创建时间倒序，传入 cursor 时使用游标分页）"""
     query = db.query(TestRun)
     
     # 时间过滤
@@ -47,17 +49,10 @@ def get_test_runs(
     if status:
         query = query.filter(TestRun.status == status)
     
-    # 排序和分页
-    total = query.count()
-    items = query.order_by(desc(TestRun.created_at)).offset((page - 1) * size).limit(size).all()
+    # 排序和分页（创建时间相同时按ID倒序，保证排序稳定）
+    result = paginate(query, [(TestRun.created_at, True), (TestRun.id, True)], size, page, cursor, count)
     
-    return {
-        "items": [item.to_dict() for item in items],
-        "total": total,
-        "page": page,
-        "size": size,
-        "pages": (total + size - 1) // size
-    }
+    return {**result, "items": [item.to_dict() for item in result["items"]]}
 
 
 @router.get("/runs/{run_id}")
@@ -89,7 +84,7 @@ def get_test_run_detail(
 
 
 @router.post("/runs/trigger")
-async def trigger_test_run(
+def trigger_test_run(
     test_type: str = Query(..., pattern="^(all|unit|integration)$"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -184,15 +179,14 @@ async def trigger_test_run(
         
         logger.info(f"Using Python interpreter: {venv_python}")
         
-        # 使用异步subprocess，排除disabled和manual目录
-        process = await asyncio.create_subprocess_exec(
-            venv_python, '-m', 'pytest', test_path, '--ignore=tests/disabled', '--ignore=tests/manual', '-v', '--tb=line',
+        # 排除disabled和manual目录（接口在线程池中执行，等待子进程不阻塞事件循环）
+        process = subprocess.run(
+            [venv_python, '-m', 'pytest', test_path, '--ignore=tests/disabled', '--ignore=tests/manual', '-v', '--tb=line'],
             cwd=backend_path,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            capture_output=True,
+            timeout=60
         )
-        
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=60)
+        stdout, stderr = process.stdout, process.stderr
         
         # 简单解析输出
         output = stdout.decode('utf-8') if stdout else ''
@@ -270,7 +264,7 @@ async def trigger_test_run(
             "return_code": process.returncode,
             "output_preview": output[-300:] if output else error_output[-300:]
         }
-    except asyncio.TimeoutError:
+    except subprocess.TimeoutExpired:
         # 超时处理
         test_run.status = "failed"
         test_run.end_time = datetime.now()
@@ -34,6 +34,28 @@ class Settings(BaseSettings):
         # 生产/服务器 origins 由 backend/.env 的 backend_cors_origins 覆盖(不在代码硬编码服务器 IP）
     ]
 
+    # 合同清单Excel导入配置：并行解析工作表的最大进程数（1表示顺序解析）
+    excel_parse_max_workers: int = 1
+    # 合同清单导入时每批写入并提交的设备明细行数
+    contract_import_chunk_size: int = 5000
+    # 相同内容的上传文件只保存一份（按内容哈希命名），新版本直接引用已存储的文件
+    contract_upload_dedup: bool = True
+    # 解析结果缓存目录（按文件哈希和解析器版本缓存，重复上传跳过解析）
+    contract_parse_cache_dir: str = "uploads/contracts/parse_cache"
+    # 解析结果缓存最多保留的文件数，超出时删除最久未使用的（0表示不缓存）；其他解析器版本的缓存写入时清理
+    contract_parse_cache_max_entries: int = 200
+    # 版本差异结果在进程内缓存的最大条数（0表示不缓存）
+    contract_diff_cache_size: int = 64
+    # 物料名称联想索引在进程内缓存的最大项目数
+    material_typeahead_cache_size: int = 32
+    # 列表接口按 count=estimate 统计总数时最多统计的行数
+    pagination_count_estimate_cap: int = 10000
+    # 同步接口（def）在线程池中执行，单个进程内可同时处理的阻塞请求数
+    api_threadpool_size: int = 40
+    # 已认证用户缓存：最多缓存的令牌数和缓存秒数（任一为0表示不缓存）
+    user_cache_size: int = 4096
+    user_cache_ttl_seconds: int = 60
+
     # 数据库驱动和PostgreSQL配置（可选，从.env读取）
     database_driver: str = "sqlite"
     postgres_host: str = "localhost"
@@ -41,6 +63,26 @@ class Settings(BaseSettings):
     postgres_user: str = "erp_user"
     postgres_password: str = ""
     postgres_db: str = "erp_dev"
+    # 连接池配置：常驻连接数、高峰时额外连接数、等待空闲连接的秒数、连接回收秒数、取用前检测连接是否可用
+    database_pool_size: int = 20
+    database_max_overflow: int = 20
+    database_pool_timeout: int = 30
+    database_pool_recycle: int = 1800
+    database_pool_pre_ping: bool = True
+    # 单条语句超时毫秒数（PostgreSQL的statement_timeout，0表示不限制）
+    database_statement_timeout_ms: int = 30000
+    # SQLite连接参数：WAL日志模式下写入（如合同导入）不阻塞读取；cache_size单位为KB，mmap_size单位为字节
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size: int = 268435456
+    sqlite_busy_timeout_ms: int = 5000
+    # 只读副本URL列表（为空时读请求也走主库），只读GET接口按轮询使用各副本
+    database_replica_urls: list = []
+    # 用户写入后这段时间（秒）内的读请求仍走主库，保证读到自己刚写入的数据
+    database_replica_sticky_seconds: int = 10
+    # 热点读接口使用异步引擎（按 database_driver 选择 aiosqlite 或 asyncpg，需要安装对应驱动）
+    database_async: bool = False
 
     @property
     def effective_database_url(self) -> str:
@@ -48,6 +90,17 @@ class Settings(BaseSettings):
             return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         return self.database_url
 
+    @property
+    def effective_async_database_url(self) -> str:
+        return self.to_async_database_url(self.effective_database_url)
+
+    @staticmethod
+    def to_async_database_url(url: str) -> str:
+        for scheme, async_scheme in (("postgresql://", "postgresql+asyncpg://"), ("sqlite://", "sqlite+aiosqlite://")):
+            if url.startswith(scheme):
+                return async_scheme + url[len(scheme):]
+        return url
+
     model_config = ConfigDict(extra="ignore", env_file=".env")
 
 settings = Settings()
\ No newline at end of file
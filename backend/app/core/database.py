@@ -2,25 +2,120 @@
 """
 数据库配置文件
 负责连接和管理数据库
+
+同步引擎供所有接口和后台任务使用；开启 database_async 时另外创建异步引擎（aiosqlite/asyncpg），
+热点读接口通过 get_async_db 获取 AsyncSession，在事件循环上执行查询，不占用线程池。
+配置只读副本后，只读接口（get_read_db/get_async_db）的 GET 请求轮询读副本，写入走主库
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import itertools
+import time
+from typing import Any, Callable
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
 
 # 从统一配置中读取数据库URL
 DATABASE_URL = settings.effective_database_url
 
-# 创建数据库引擎
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False  # SQLite需要这个参数
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """新建SQLite连接时设置日志模式、同步级别、缓存、内存映射和锁等待时间"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    finally:
+        cursor.close()
+
+
+def create_database_engine(url: str, use_async: bool = False):
+    """
+    按配置创建数据库引擎
+
+    连接池参数对所有数据库生效（SQLite内存库除外，内存库每个线程一个连接）；
+    PostgreSQL在连接上设置 statement_timeout，SQLite在新建连接时设置 WAL 等连接参数
+
+    Args:
+        url: 数据库URL
+        use_async: 是否创建异步引擎（url 需使用 aiosqlite/asyncpg 驱动）
+
+    Returns:
+        Engine 或 AsyncEngine
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+
+    connect_args = {}
+    if backend == "sqlite" and not use_async:
+        connect_args["check_same_thread"] = False  # SQLite需要这个参数
+    elif backend == "postgresql" and settings.database_statement_timeout_ms:
+        timeout = str(settings.database_statement_timeout_ms)
+        if url.get_driver_name() == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": timeout}
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout}"
+
+    options = {}
+    if not (backend == "sqlite" and url.database in (None, "", ":memory:")):
+        options = {
+            "pool_size": settings.database_pool_size,
+            "max_overflow": settings.database_max_overflow,
+            "pool_timeout": settings.database_pool_timeout,
+            "pool_recycle": settings.database_pool_recycle,
+            "pool_pre_ping": settings.database_pool_pre_ping,
+        }
+
+    if use_async:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        new_engine = create_async_engine(url, connect_args=connect_args, **options)
+        sync_engine = new_engine.sync_engine
+    else:
+        new_engine = sync_engine = create_engine(url, connect_args=connect_args, **options)
+
+    if backend == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+# 创建数据库引擎
+engine = create_database_engine(DATABASE_URL)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 只读副本的会话工厂（未配置 database_replica_urls 时为空）
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=create_database_engine(url))
+    for url in settings.database_replica_urls
+]
+
+# 异步引擎和会话工厂（未开启 database_async 时为None）
+async_engine = None
+AsyncSessionLocal = None
+AsyncReplicaSessionLocals = []
+if settings.database_async:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = create_database_engine(settings.effective_async_database_url, use_async=True)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    AsyncReplicaSessionLocals = [
+        async_sessionmaker(create_database_engine(settings.to_async_database_url(url), use_async=True), autoflush=False)
+        for url in settings.database_replica_urls
+    ]
+
+# 写入后读主库的截止时间（Unix秒）保存在这个Cookie中，多个进程之间同样生效
+READ_PRIMARY_COOKIE = "read_primary_until"
+_replica_counter = itertools.count()
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -33,4 +128,94 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def use_replica(request: Request) -> bool:
+    """
+    判断请求是否可以读只读副本
+
+    只有 GET/HEAD 请求读副本；用户写入后 READ_PRIMARY_COOKIE 未过期时仍读主库（读到自己刚写入的数据）
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    read_primary_until = request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return not read_primary_until or float(read_primary_until) <= time.time()
+    except ValueError:
+        return True
+
+
+def mark_recent_write(request: Request, response: Response) -> None:
+    """配置了只读副本时，写请求成功后设置 READ_PRIMARY_COOKIE，之后一段时间内该用户的读请求走主库"""
+    if not ReplicaSessionLocals or request.method in ("GET", "HEAD", "OPTIONS") or response.status_code >= 400:
+        return
+    sticky_seconds = settings.database_replica_sticky_seconds
+    response.set_cookie(
+        key=READ_PRIMARY_COOKIE,
+        value=str(time.time() + sticky_seconds),
+        max_age=sticky_seconds,
+        httponly=True,
+        samesite="lax",
+        secure=settings.COOKIE_SECURE,
+        path="/",
+    )
+
+
+def _choose_session_factory(request: Request, primary, replicas):
+    """按请求选择主库或轮询选择一个只读副本的会话工厂"""
+    if replicas and use_replica(request):
+        return replicas[next(_replica_counter) % len(replicas)]
+    return primary
+
+
+def get_read_db(request: Request):
+    """
+    获取只读接口使用的数据库会话
+
+    配置了只读副本时，GET 请求使用副本会话（刚写入过的用户除外），其余请求使用主库；
+    只能用于不写入数据的接口
+    """
+    db = _choose_session_factory(request, SessionLocal, ReplicaSessionLocals)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request):
+    """
+    获取热点读接口使用的数据库会话
+
+    开启 database_async 时返回 AsyncSession，否则返回同步会话（由 run_in_session 放到线程池执行）；
+    与 get_read_db 相同，GET 请求在配置了只读副本时读副本
+    """
+    if AsyncSessionLocal is None:
+        db = _choose_session_factory(request, SessionLocal, ReplicaSessionLocals)()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+
+    async with _choose_session_factory(request, AsyncSessionLocal, AsyncReplicaSessionLocals)() as db:
+        yield db
+
+
+async def run_in_session(db: Any, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    在 get_async_db 返回的会话上执行同步查询函数 fn(session, *args, **kwargs)
+
+    AsyncSession 通过 run_sync 在事件循环上执行（模型和查询代码不用改写），同步会话放到线程池执行；
+    fn 应在内部完成序列化，返回的ORM对象在函数外不能再触发延迟加载
+
+    Args:
+        db: get_async_db 返回的会话
+        fn: 第一个参数为同步 Session 的函数
+
+    Returns:
+        fn 的返回值
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
@@ -53,17 +53,6 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def authenticate_user(username: str, password: str, db) -> Union[bool, Any]:
-    """用户认证"""
-    from app.models.user import User
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        return False
-    if not verify_password(password, user.password_hash):
-        return False
-    return user
-
-
 class SecurityException(HTTPException):
     """安全相关异常"""
     def __init__(self, detail: str):
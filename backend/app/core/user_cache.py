@@ -0,0 +1,112 @@
+"""
+已认证用户缓存
+
+get_current_user 每个请求都要按令牌查询用户，这里在进程内按 令牌 -> 用户快照 缓存（LRU，有过期时间）：
+- 快照只保存认证、权限判断和 /me 需要的字段，命中时生成一个不属于任何会话的 User 对象，不访问数据库
+- 过期时间取 user_cache_ttl_seconds 与令牌自身过期时间中较早的一个
+- 通过ORM修改或删除用户（如停用、改角色、登录更新时间）时，提交前后都会清除该用户的所有缓存；
+  批量 update/delete 用户时清空全部缓存；其他进程中的缓存最多在 user_cache_ttl_seconds 秒后过期
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from jose import jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.user import User
+
+# 用户快照保存的字段
+USER_CACHE_FIELDS = (
+    'id', 'username', 'email', 'name', 'role', 'department', 'phone',
+    'is_active', 'is_superuser', 'created_at', 'last_login'
+)
+
+# 令牌哈希 -> (过期时间, 用户快照)
+_user_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+
+def _token_key(token: str) -> str:
+    """缓存键使用令牌的哈希，不在内存中保留令牌原文"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_user(token: str) -> Optional[User]:
+    """
+    按令牌读取缓存的用户
+
+    Returns:
+        Optional[User]: 未命中或已过期时返回None
+    """
+    key = _token_key(token)
+    with _user_cache_lock:
+        cached = _user_cache.get(key)
+        if cached is None:
+            return None
+        if cached[0] <= time.time():
+            del _user_cache[key]
+            return None
+        _user_cache.move_to_end(key)
+        return User(**cached[1])
+
+
+def cache_user(token: str, user: User) -> None:
+    """缓存已通过认证的用户（user_cache_size 或 user_cache_ttl_seconds 为0时不缓存）"""
+    if settings.user_cache_size <= 0 or settings.user_cache_ttl_seconds <= 0:
+        return
+
+    expires_at = time.time() + settings.user_cache_ttl_seconds
+    token_expires_at = jwt.get_unverified_claims(token).get("exp")
+    if token_expires_at is not None:
+        expires_at = min(expires_at, float(token_expires_at))
+
+    snapshot = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+    key = _token_key(token)
+    with _user_cache_lock:
+        _user_cache[key] = (expires_at, snapshot)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > settings.user_cache_size:
+            _user_cache.popitem(last=False)
+
+
+def invalidate_user(user_id: int) -> None:
+    """清除某个用户所有令牌的缓存"""
+    with _user_cache_lock:
+        for key in [key for key, (_, snapshot) in _user_cache.items() if snapshot['id'] == user_id]:
+            del _user_cache[key]
+
+
+def clear_user_cache() -> None:
+    """清空用户缓存"""
+    with _user_cache_lock:
+        _user_cache.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_flush(mapper, connection, target: User) -> None:
+    """用户写入数据库时清除缓存，并记下用户ID，提交后再清除一次（避免提交前被其他请求重新缓存旧数据）"""
+    invalidate_user(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('updated_user_ids', set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    for user_id in session.info.pop('updated_user_ids', ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _clear_on_bulk_write(context) -> None:
+    """query(User).update()/delete() 不逐个触发 after_update，无法确定涉及的用户，清空全部缓存"""
+    if context.mapper.class_ is User:
+        clear_user_cache()
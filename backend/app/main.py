@@ -3,18 +3,19 @@
 FastAPI主程序入口 - 包含项目管理API
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 import asyncio
 import logging
+from anyio import to_thread
 from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
 # 导入配置和数据库
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, SessionLocal, mark_recent_write
 
 # 导入所有模型（确保数据库表创建）
 from app.models import project, project_file, contract, test_result
@@ -22,6 +23,10 @@ from app.models import project, project_file, contract, test_result
 # 导入API路由
 from app.api.v1 import api_router
 
+from app.services.contract_search_service import backfill_search_index
+from app.services.contract_version_service import backfill_version_memberships, backfill_version_summaries
+from app.services.purchase_ledger_service import backfill_purchase_ledger
+
 # 导入测试调度器
 from app.core.test_scheduler import start_test_scheduler, stop_test_scheduler
 
@@ -29,10 +34,23 @@ from app.core.test_scheduler import start_test_scheduler, stop_test_scheduler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时执行
+    # 接口均为同步函数，由线程池执行数据库查询、文件读写等阻塞操作，不阻塞事件循环
+    to_thread.current_default_thread_limiter().total_tokens = settings.api_threadpool_size
+    
     logger.info("正在创建数据库表...")
     Base.metadata.create_all(bind=engine)
     logger.info("数据库表创建完成！")
     
+    # 为升级前的数据补充版本成员关系、版本汇总、全文索引和申购台账
+    db = SessionLocal()
+    try:
+        backfill_version_memberships(db)
+        backfill_version_summaries(db)
+        backfill_search_index(db)
+        backfill_purchase_ledger(db)
+    finally:
+        db.close()
+    
     # 启动测试调度器（后台任务）
     logger.info("启动测试调度器...")
     scheduler_task = asyncio.create_task(start_test_scheduler())
@@ -82,6 +100,13 @@ app.add_middleware(
     expose_headers=["Content-Length"],
 )
 
+# 写请求成功后，该用户短时间内的只读请求走主库（配置了只读副本时）
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    mark_recent_write(request, response)
+    return response
+
 # 注册API路由
 app.include_router(api_router, prefix="/api/v1")
 
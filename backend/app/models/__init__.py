@@ -10,7 +10,11 @@ from .project_file import ProjectFile  # 项目文件管理模型
 from .contract import (
     ContractFileVersion,  # 合同清单版本管理
     SystemCategory,       # 系统分类管理
-    ContractItem         # 合同清单明细项
+    ContractItem,         # 合同清单明细项
+    ContractVersionItem,  # 版本与明细的成员关系
+    ContractVersionSummary, # 按版本和系统分类维护的汇总
+    VersionedContractItem, # 按版本解析的明细视图
+    ContractImportJob     # 合同清单异步导入任务
 )
 
 # 导入用户相关模型
@@ -20,8 +24,10 @@ from .permission import RolePermission, PermissionCategory  # 权限管理模型
 # 导入采购请购相关模型
 from .purchase import (
     PurchaseRequest,      # 申购单主表
+    PurchaseRequestCodeSequence, # 申购单号按日序号
     PurchaseRequestItem,  # 申购明细项
     PurchaseApproval,     # 审批记录
+    ContractItemPurchaseLedger, # 合同清单项申购台账
     Supplier,             # 供应商信息
     InboundBatch,         # 入库批次
     AuxiliaryTemplate,    # 辅材模板
@@ -35,12 +41,18 @@ __all__ = [
     "ContractFileVersion",
     "SystemCategory",
     "ContractItem",
+    "ContractVersionItem",
+    "ContractVersionSummary",
+    "VersionedContractItem",
+    "ContractImportJob",
     "User",
     "RolePermission", 
     "PermissionCategory",
     "PurchaseRequest",
+    "PurchaseRequestCodeSequence",
     "PurchaseRequestItem",
     "PurchaseApproval",
+    "ContractItemPurchaseLedger",
     "Supplier",
     "InboundBatch",
     "AuxiliaryTemplate",
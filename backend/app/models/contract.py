@@ -5,9 +5,9 @@
 支持按系统分类管理，支持版本控制和优化功能
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Numeric, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Numeric, ForeignKey, Boolean, JSON, DDL, event
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property
 from app.core.database import Base
 
 
@@ -115,14 +115,18 @@ class ContractItem(Base):
     对应Excel中的数据行：序号、设备名称、品牌型号、规格、单价、数量等
     
     这是系统的核心数据表，所有采购申请都要基于这个表进行校验
+    
+    明细行可以被多个版本共享（写时复制）：
+    - version_id/category_id 记录创建该明细的版本和当时的分类
+    - 版本包含哪些明细由 ContractVersionItem 决定，按版本查询请使用 VersionedContractItem
     """
     __tablename__ = "contract_items"
     
     # 主键和关联关系
     id = Column(Integer, primary_key=True, index=True, comment="明细ID")
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, comment="项目ID")
-    version_id = Column(Integer, ForeignKey("contract_file_versions.id"), nullable=False, comment="版本ID")
-    category_id = Column(Integer, ForeignKey("system_categories.id"), comment="系统分类ID")
+    version_id = Column(Integer, ForeignKey("contract_file_versions.id"), nullable=False, comment="创建该明细的版本ID")
+    category_id = Column(Integer, ForeignKey("system_categories.id"), comment="创建时所属的系统分类ID")
     
     # Excel原始数据字段（对应投标清单的列）
     serial_number = Column(String(50), comment="Excel中的序号")
@@ -200,4 +204,174 @@ class ContractItem(Base):
         """
         if self.quantity and self.unit_price:
             self.total_price = self.quantity * self.unit_price
-        return self.total_price
\ No newline at end of file
+        return self.total_price
+
+
+class ContractVersionItem(Base):
+    """
+    合同清单版本成员表
+    
+    记录每个版本包含哪些明细行：新版本中未变化的明细只增加一条成员记录，
+    不再复制整行数据；明细在该版本中所属的系统分类也记录在这里（分类按版本创建）
+    """
+    __tablename__ = "contract_version_items"
+    
+    version_id = Column(Integer, ForeignKey("contract_file_versions.id"), primary_key=True, comment="版本ID")
+    item_id = Column(Integer, ForeignKey("contract_items.id"), primary_key=True, index=True, comment="明细ID")
+    category_id = Column(Integer, ForeignKey("system_categories.id"), comment="该版本中明细所属的系统分类ID")
+    
+    def __repr__(self):
+        return f"<ContractVersionItem(version_id={self.version_id}, item_id={self.item_id})>"
+
+
+class ContractVersionSummary(Base):
+    """
+    合同清单版本汇总表（按版本和系统分类）
+    
+    保存每个版本各系统分类的明细数量和金额（含主材/辅材拆分），
+    由 ContractVersionService 在导入、新增和修改明细时同步维护，
+    汇总接口和看板直接读取，不再逐条加载明细计算
+    """
+    __tablename__ = "contract_version_summaries"
+    # 汇总行在重算时删除后重新插入，ID不复用，最大ID可作为版本内容的变化标记
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True, index=True, comment="汇总ID")
+    version_id = Column(Integer, ForeignKey("contract_file_versions.id"), nullable=False, index=True, comment="版本ID")
+    category_id = Column(Integer, ForeignKey("system_categories.id"), comment="系统分类ID（为空表示未分类明细）")
+    
+    items_count = Column(Integer, nullable=False, default=0, comment="有效明细数")
+    main_items_count = Column(Integer, nullable=False, default=0, comment="主材明细数")
+    auxiliary_items_count = Column(Integer, nullable=False, default=0, comment="辅材明细数")
+    total_amount = Column(Numeric(18, 2), nullable=False, default=0, comment="明细金额合计（元）")
+    main_amount = Column(Numeric(18, 2), nullable=False, default=0, comment="主材金额合计（元）")
+    auxiliary_amount = Column(Numeric(18, 2), nullable=False, default=0, comment="辅材金额合计（元）")
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def __repr__(self):
+        return f"<ContractVersionSummary(version_id={self.version_id}, category_id={self.category_id})>"
+
+
+@event.listens_for(ContractItem, "after_insert")
+def _add_item_to_origin_version(mapper, connection, target):
+    """通过ORM新建的明细自动加入创建它的版本"""
+    connection.execute(
+        ContractVersionItem.__table__.insert().values(
+            version_id=target.version_id,
+            item_id=target.id,
+            category_id=target.category_id
+        )
+    )
+
+
+# 合同清单明细全文检索表（以明细ID为键，由 ContractSearchService 维护）
+# SQLite 使用 FTS5 虚拟表，PostgreSQL 使用带 GIN 索引的 tsvector 列，随 create_all 一起创建
+CONTRACT_ITEM_SEARCH_TABLE = "contract_items_fts"
+
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTRACT_ITEM_SEARCH_TABLE} "
+    f"USING fts5(item_name, brand_model, specification, tokenize='unicode61')"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE TABLE IF NOT EXISTS {CONTRACT_ITEM_SEARCH_TABLE} "
+    f"(item_id INTEGER PRIMARY KEY, document TSVECTOR NOT NULL)"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_{CONTRACT_ITEM_SEARCH_TABLE}_document "
+    f"ON {CONTRACT_ITEM_SEARCH_TABLE} USING GIN (document)"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "before_drop", DDL(f"DROP TABLE IF EXISTS {CONTRACT_ITEM_SEARCH_TABLE}"))
+
+
+_version_items = ContractVersionItem.__table__
+_items = ContractItem.__table__
+
+
+class VersionedContractItem(Base):
+    """
+    按版本解析的合同清单明细（只读视图）
+    
+    映射到 版本成员表 JOIN 明细表：version_id/category_id 取自成员关系，
+    其余字段取自共享的明细行；VersionedContractItem.version_id == X
+    与原先 ContractItem.version_id == X 的查询结果一致
+    
+    修改明细请通过 ContractVersionService（写时复制），不要直接写入该视图
+    """
+    __table__ = _version_items.join(_items, _version_items.c.item_id == _items.c.id)
+    __mapper_args__ = {"primary_key": [_version_items.c.version_id, _items.c.id]}
+    
+    id = column_property(_items.c.id, _version_items.c.item_id)
+    version_id = column_property(_version_items.c.version_id)
+    category_id = column_property(_version_items.c.category_id)
+    origin_version_id = column_property(_items.c.version_id)
+    origin_category_id = column_property(_items.c.category_id)
+    
+    to_dict = ContractItem.to_dict
+    
+    def __repr__(self):
+        return f"<VersionedContractItem(version_id={self.version_id}, id={self.id}, name='{self.item_name}')>"
+
+
+class ContractImportJob(Base):
+    """
+    合同清单导入任务表
+    
+    大型投标清单的上传在后台异步导入，前端通过任务ID轮询进度：
+    解析/导入的行数、每个工作表的进度和错误信息，完成后可取回上传结果
+    """
+    __tablename__ = "contract_import_jobs"
+    
+    # 主键和关联
+    id = Column(Integer, primary_key=True, index=True, comment="任务ID")
+    job_id = Column(String(50), unique=True, nullable=False, index=True, comment="任务编号")
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, comment="项目ID")
+    version_id = Column(Integer, ForeignKey("contract_file_versions.id"), comment="导入成功后创建的版本ID")
+    
+    # 上传信息
+    upload_user_name = Column(String(100), nullable=False, comment="上传人员姓名")
+    original_filename = Column(String(255), nullable=False, comment="原始Excel文件名")
+    stored_file_path = Column(String(500), nullable=False, comment="服务器存储的文件路径")
+    file_hash = Column(String(64), comment="文件内容的SHA-256哈希（上传时计算，导入时不再重新读取文件）")
+    upload_reason = Column(Text, comment="上传原因")
+    change_description = Column(Text, comment="变更详细说明")
+    incremental = Column(Boolean, default=False, comment="是否返回相对当前版本的差异报告")
+
+    # 状态和进度
+    status = Column(String(20), nullable=False, default="pending", comment="任务状态: pending/running/completed/failed")
+    total_sheets = Column(Integer, default=0, comment="工作表总数")
+    parsed_sheets = Column(Integer, default=0, comment="已解析的工作表数")
+    rows_parsed = Column(Integer, default=0, comment="已解析的设备明细数")
+    rows_inserted = Column(Integer, default=0, comment="已导入的设备明细数")
+    sheet_progress = Column(JSON, comment="各工作表进度列表")
+    errors = Column(JSON, comment="错误信息列表")
+    result = Column(JSON, comment="完成后的上传结果（ExcelUploadResponse）")
+    
+    # 时间信息
+    start_time = Column(DateTime(timezone=True), comment="开始执行时间")
+    end_time = Column(DateTime(timezone=True), comment="结束时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="创建时间")
+    
+    def __repr__(self):
+        return f"<ContractImportJob(job_id='{self.job_id}', project_id={self.project_id}, status='{self.status}')>"
+    
+    def to_dict(self):
+        """转换为字典，用于进度轮询接口"""
+        return {
+            "job_id": self.job_id,
+            "project_id": self.project_id,
+            "version_id": self.version_id,
+            "status": self.status,
+            "original_filename": self.original_filename,
+            "upload_user_name": self.upload_user_name,
+            "incremental": bool(self.incremental),
+            "total_sheets": self.total_sheets or 0,
+            "parsed_sheets": self.parsed_sheets or 0,
+            "rows_parsed": self.rows_parsed or 0,
+            "rows_inserted": self.rows_inserted or 0,
+            "sheet_progress": self.sheet_progress or [],
+            "errors": self.errors or [],
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
@@ -90,11 +90,27 @@ class PurchaseRequest(Base):
     
     # 关系
     project = relationship("Project", back_populates="purchase_requests")
+    requester = relationship("User", foreign_keys=[requester_id])
     items = relationship("PurchaseRequestItem", back_populates="purchase_request", cascade="all, delete-orphan")
     approvals = relationship("PurchaseApproval", back_populates="purchase_request", cascade="all, delete-orphan")
     workflow_logs = relationship("PurchaseWorkflowLog", back_populates="purchase_request", cascade="all, delete-orphan")
 
 
+class PurchaseRequestCodeSequence(Base):
+    """
+    申购单号按日序号表
+    
+    每天一行，last_value 为当天已分配的最大序号，分配单号时原子递增，
+    不再扫描当天的申购单号，并发创建也不会生成重复单号
+    """
+    __tablename__ = "purchase_request_code_sequences"
+    
+    prefix = Column(String(20), primary_key=True)  # 单号前缀，如 PR20250101
+    last_value = Column(Integer, default=0, nullable=False)  # 已分配的最大序号
+    
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class PurchaseRequestItem(Base):
     """申购明细表"""
     __tablename__ = "purchase_request_items"
@@ -147,6 +163,25 @@ class PurchaseRequestItem(Base):
     inbound_batches = relationship("InboundBatch", back_populates="purchase_item")
 
 
+class ContractItemPurchaseLedger(Base):
+    """
+    合同清单项申购台账
+    
+    按合同清单项累计各状态申购单的数量，由 PurchaseLedgerService 在申购单状态流转时
+    于同一事务内增减维护，剩余可申购数量直接读取台账，不再汇总全部申购明细
+    """
+    __tablename__ = "contract_item_purchase_ledgers"
+    
+    contract_item_id = Column(Integer, ForeignKey("contract_items.id"), primary_key=True)
+    
+    # 累计数量
+    committed_quantity = Column(DECIMAL(12, 2), default=0, nullable=False)  # 已占用（总经理已批准、已完成）
+    pending_quantity = Column(DECIMAL(12, 2), default=0, nullable=False)  # 审批中（已提交未最终批准）
+    
+    # 时间戳
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class PurchaseApproval(Base):
     """申购审批记录表"""
     __tablename__ = "purchase_approvals"
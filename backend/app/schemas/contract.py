@@ -217,10 +217,12 @@ class ContractItemListResponse(BaseModel):
     包含分页信息和明细列表
     """
     items: List[ContractItemResponse] = Field(description="明细列表")
-    total: int = Field(description="总数量")
-    page: int = Field(description="当前页码")
+    total: Optional[int] = Field(description="总数量（count=none时为空）")
+    page: Optional[int] = Field(description="当前页码（游标分页时为空）")
     size: int = Field(description="每页数量")
-    pages: int = Field(description="总页数")
+    pages: Optional[int] = Field(description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（游标分页时返回，没有下一页时为空）")
+    total_is_estimate: bool = Field(False, description="总数是否为估算值")
 
 
 class ContractSummaryResponse(BaseModel):
@@ -234,6 +236,10 @@ class ContractSummaryResponse(BaseModel):
     total_categories: int
     total_items: int
     total_amount: Optional[Decimal]
+    main_items: int = 0
+    auxiliary_items: int = 0
+    main_amount: Optional[Decimal] = None
+    auxiliary_amount: Optional[Decimal] = None
     
     class Config:
         from_attributes = True
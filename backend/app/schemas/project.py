@@ -103,10 +103,12 @@ class ProjectListResponse(BaseModel):
     包含分页信息和项目列表
     """
     items: list[ProjectResponse] = Field(description="项目列表")
-    total: int = Field(description="总数量")
-    page: int = Field(description="当前页码")
+    total: Optional[int] = Field(description="总数量（count=none时为空）")
+    page: Optional[int] = Field(description="当前页码（游标分页时为空）")
     size: int = Field(description="每页数量")
-    pages: int = Field(description="总页数")
+    pages: Optional[int] = Field(description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（游标分页时返回，没有下一页时为空）")
+    total_is_estimate: bool = Field(False, description="总数是否为估算值")
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -224,6 +224,23 @@ class PurchaseRequestPriceQuote(BaseModel):
     # 移除统一的payment_method和estimated_delivery_date，改为物料级别
 
 
+class PurchaseRequestBatchQuoteItem(PurchaseRequestPriceQuote):
+    """批量询价中的单张申购单"""
+    request_id: int
+
+
+class PurchaseRequestBatchQuote(BaseModel):
+    """批量询价（采购员一次提交多张申购单的询价）"""
+    quotes: List[PurchaseRequestBatchQuoteItem]
+
+    @validator('quotes')
+    def validate_quotes(cls, v):
+        """至少包含一张申购单（重复的申购单由接口校验并返回重复的ID）"""
+        if not v:
+            raise ValueError('请提供要询价的申购单')
+        return v
+
+
 class PurchaseWorkflowOperation(BaseModel):
     """工作流操作"""
     operation: str  # submit, approve, reject, return
@@ -336,7 +353,9 @@ class ApprovalRecordInDB(ApprovalRecordBase):
 class PurchaseRequestListResponse(BaseModel):
     """申购单列表响应"""
     items: List[PurchaseRequestWithItems]
-    total: int
-    page: int
+    total: Optional[int]
+    page: Optional[int]
     size: int
-    pages: int
+    pages: Optional[int]
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
@@ -56,10 +56,12 @@ class SupplierInDB(SupplierBase):
 class SupplierListResponse(BaseModel):
     """供应商列表响应"""
     items: List[SupplierInDB]
-    total: int
-    page: int
+    total: Optional[int]
+    page: Optional[int]
     size: int
-    pages: int
+    pages: Optional[int]
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
 
 # ========== 辅材模板相关 ==========
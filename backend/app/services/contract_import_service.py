@@ -0,0 +1,578 @@
+"""
+合同清单导入业务逻辑服务
+
+解析合同清单Excel文件，创建新的合同清单版本并导入系统分类和设备明细
+同步上传接口和后台异步导入任务共用同一套导入逻辑
+"""
+
+import os
+import uuid
+import logging
+from collections import defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.contract import (
+    ContractFileVersion, SystemCategory, ContractItem, VersionedContractItem, ContractImportJob
+)
+from app.schemas.contract import ExcelUploadResponse
+from app.services.contract_search_service import ContractSearchService
+from app.services.material_typeahead_service import MaterialTypeaheadService
+from app.services.contract_version_service import (
+    ContractVersionService, ITEM_KEY_FIELDS, ITEM_COMPARE_FIELDS,
+    normalize_item_value, item_match_key, report_value, describe_item
+)
+from app.utils.excel_parser import ContractExcelParser
+from app.utils.parse_cache import ContractParseCache, compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+class ContractImportService:
+    """合同清单导入服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def import_contract_file(
+        self,
+        project_id: int,
+        file_path: str,
+        original_filename: str,
+        upload_user_name: str,
+        upload_reason: Optional[str] = None,
+        change_description: Optional[str] = None,
+        job: Optional[ContractImportJob] = None,
+        file_hash: Optional[str] = None,
+        incremental: bool = False
+    ) -> ExcelUploadResponse:
+        """
+        导入合同清单Excel文件
+        - 解析Excel文件
+        - 创建新的合同清单版本（设为当前版本）
+        - 导入系统分类和设备明细
+
+        导入失败时回滚事务、删除已保存的文件并返回失败结果
+        传入job时同步更新导入任务的进度；file_hash为空时根据文件内容计算
+        项目已有当前版本时与之逐行比对，只写入新增和变化的明细，未变化的明细由新版本直接引用（不复制明细行）；
+        incremental=True 时在结果中返回差异报告
+        """
+        parser = None
+        version_id = None
+
+        try:
+            # 相同内容的文件直接使用缓存的解析结果，跳过解析
+            if file_hash is None:
+                file_hash = compute_file_hash(file_path)
+            parse_cache = ContractParseCache(settings.contract_parse_cache_dir, settings.contract_parse_cache_max_entries)
+            parsed_result = parse_cache.get(file_hash)
+
+            if parsed_result is not None:
+                logger.info(f"文件 {original_filename} 命中解析缓存，跳过解析")
+                if job is not None:
+                    self._replay_cached_progress(job, parsed_result)
+            else:
+                # 解析Excel文件（只读流式模式，大清单内存占用平稳）
+                parser = ContractExcelParser(streaming=True)
+                parser.load_excel_file(file_path)
+
+                if job is not None:
+                    job.total_sheets = len(parser.sheet_names)
+                    self.db.commit()
+
+                parsed_result = parser.parse_all_sheets(
+                    max_workers=settings.excel_parse_max_workers,
+                    progress_callback=self._record_sheet_parsed(job) if job is not None else None
+                )
+                parse_cache.set(file_hash, parsed_result)
+
+            # 以项目当前版本为比对基准，没有当前版本（首次导入）时全部写入
+            base_version_id = self._current_version_id(project_id)
+
+            new_version = self._create_version(
+                project_id=project_id,
+                file_path=file_path,
+                original_filename=original_filename,
+                upload_user_name=upload_user_name,
+                upload_reason=upload_reason,
+                change_description=change_description
+            )
+            version_id = new_version.id
+
+            # 批量导入系统分类，得到分类名称到ID的映射
+            category_id_mapping = self._insert_categories(project_id, version_id, parsed_result['categories'])
+            self.db.commit()
+
+            # 转换设备明细为批量插入的行数据
+            import_errors = []
+            item_rows = []  # (工作表名称, 行数据)
+
+            for item_data in parsed_result['items']:
+                try:
+                    row = self._build_item_row(project_id, version_id, category_id_mapping, item_data)
+                except Exception as e:
+                    error_msg = f"导入设备 '{item_data.get('item_name', '未知')}' 失败: {str(e)}"
+                    import_errors.append(error_msg)
+                    logger.warning(error_msg)
+                    continue
+                item_rows.append((item_data.get('category_name'), row))
+
+            # 与当前版本逐行比对，只写入新增和变化的行，未变化的行由新版本直接引用
+            carried_over = []  # (工作表名称, 原明细ID, 新分类ID)
+            incremental_report = None
+            if base_version_id is not None:
+                item_rows, carried_over, incremental_report = self._plan_incremental(base_version_id, item_rows)
+                if not incremental:
+                    incremental_report = None
+
+            # 按块批量写入设备明细，每块单独提交，内存占用和事务大小可控
+            imported_by_sheet: Dict[str, int] = {}
+            chunk_size = max(settings.contract_import_chunk_size, 1)
+
+            for chunk_start in range(0, len(item_rows), chunk_size):
+                chunk = item_rows[chunk_start:chunk_start + chunk_size]
+                self.db.execute(insert(ContractItem), [row for _, row in chunk])
+                self._count_by_sheet(imported_by_sheet, chunk)
+
+                if job is not None:
+                    self._record_items_inserted(job, imported_by_sheet)
+
+                self.db.commit()
+
+            version_service = ContractVersionService(self.db)
+
+            for chunk_start in range(0, len(carried_over), chunk_size):
+                chunk = carried_over[chunk_start:chunk_start + chunk_size]
+                version_service.share_items(version_id, [(item_id, category_id) for _, item_id, category_id in chunk])
+                self._count_by_sheet(imported_by_sheet, chunk)
+
+                if job is not None:
+                    self._record_items_inserted(job, imported_by_sheet)
+
+                self.db.commit()
+
+            imported_items_count = sum(imported_by_sheet.values())
+
+            # 本次写入的明细加入新版本，全部完成后再切换当前版本，导入中途的版本不会被当作当前版本
+            version_service.add_origin_items(version_id)
+            version_service.refresh_summary(version_id)
+            ContractSearchService(self.db).index_version_items(version_id)
+            self._activate_version(project_id, version_id)
+
+            if job is not None:
+                self._record_items_inserted(job, imported_by_sheet, import_errors, finished=True)
+
+            self.db.commit()
+
+            # 构建响应
+            response = ExcelUploadResponse(
+                success=True,
+                message=f"Excel文件上传和解析成功！导入了 {imported_items_count} 个设备明细",
+                version_id=version_id,
+                parsed_data={
+                    "total_sheets": parsed_result['summary']['total_sheets'],
+                    "total_categories": len(parsed_result['categories']),
+                    "total_items": len(parsed_result['items']),
+                    "imported_items": imported_items_count,
+                    "total_amount": float(parsed_result['summary']['total_amount']),
+                    "categories": [cat['category_name'] for cat in parsed_result['categories']],
+                    "incremental": incremental_report
+                },
+                errors=import_errors if import_errors else None
+            )
+
+            logger.info(f"项目 {project_id} 的Excel文件上传成功，版本ID: {version_id}")
+
+            self._warm_typeahead_index(project_id)
+
+            return response
+
+        except Exception as e:
+            # 回滚事务，并清理分块提交后已写入的不完整版本
+            self.db.rollback()
+            if version_id is not None:
+                self._discard_version(version_id)
+
+            # 删除上传的文件（仍被其他版本或任务引用的去重文件除外）
+            self._remove_unreferenced_file(file_path, job)
+
+            error_msg = f"解析Excel文件失败: {str(e)}"
+            logger.error(error_msg)
+
+            return ExcelUploadResponse(
+                success=False,
+                message=error_msg,
+                version_id=None,
+                parsed_data=None,
+                errors=[error_msg]
+            )
+
+        finally:
+            # 关闭解析器
+            if parser is not None:
+                parser.close()
+
+    def create_import_job(
+        self,
+        project_id: int,
+        file_path: str,
+        original_filename: str,
+        upload_user_name: str,
+        upload_reason: Optional[str] = None,
+        change_description: Optional[str] = None,
+        incremental: bool = False,
+        file_hash: Optional[str] = None
+    ) -> ContractImportJob:
+        """创建待执行的合同清单导入任务（file_hash 为上传时计算的文件哈希）"""
+        job = ContractImportJob(
+            job_id=f"IMP_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}",
+            project_id=project_id,
+            upload_user_name=upload_user_name,
+            original_filename=original_filename,
+            stored_file_path=file_path,
+            file_hash=file_hash,
+            upload_reason=upload_reason,
+            change_description=change_description,
+            incremental=incremental,
+            status="pending",
+            sheet_progress=[],
+            errors=[]
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+
+        return job
+
+    def _create_version(
+        self,
+        project_id: int,
+        file_path: str,
+        original_filename: str,
+        upload_user_name: str,
+        upload_reason: Optional[str],
+        change_description: Optional[str]
+    ) -> ContractFileVersion:
+        """创建新的合同清单版本记录（导入完成前不设为当前版本）"""
+        latest_version = self.db.query(ContractFileVersion).filter(
+            ContractFileVersion.project_id == project_id
+        ).order_by(ContractFileVersion.version_number.desc()).first()
+
+        next_version_number = (latest_version.version_number + 1) if latest_version else 1
+
+        new_version = ContractFileVersion(
+            project_id=project_id,
+            version_number=next_version_number,
+            upload_user_name=upload_user_name,
+            original_filename=original_filename or "unknown",
+            stored_filename=Path(file_path).name,
+            file_size=Path(file_path).stat().st_size,
+            upload_reason=upload_reason,
+            change_description=change_description,
+            is_current=False
+        )
+
+        self.db.add(new_version)
+        self.db.flush()  # 获取版本ID
+
+        return new_version
+
+    def _activate_version(self, project_id: int, version_id: int) -> None:
+        """把指定版本设为项目的当前版本"""
+        self.db.query(ContractFileVersion).filter(
+            ContractFileVersion.project_id == project_id,
+            ContractFileVersion.is_current == True,
+            ContractFileVersion.id != version_id
+        ).update({"is_current": False}, synchronize_session=False)
+
+        self.db.query(ContractFileVersion).filter(
+            ContractFileVersion.id == version_id
+        ).update({"is_current": True}, synchronize_session=False)
+
+    def _warm_typeahead_index(self, project_id: int) -> None:
+        """新版本生效后预先构建物料联想索引，失败不影响导入结果"""
+        try:
+            MaterialTypeaheadService(self.db).get_index(project_id)
+        except Exception as e:
+            logger.warning(f"构建项目 {project_id} 的物料联想索引失败: {str(e)}")
+
+    def _discard_version(self, version_id: int) -> None:
+        """删除导入失败的版本及其已写入的分类和明细"""
+        try:
+            ContractVersionService(self.db).delete_version_contents(version_id)
+            self.db.query(ContractFileVersion).filter(ContractFileVersion.id == version_id).delete(synchronize_session=False)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"清理导入失败的版本 {version_id} 失败: {str(e)}")
+
+    def _current_version_id(self, project_id: int) -> Optional[int]:
+        """查询项目当前生效版本的ID"""
+        current = self.db.query(ContractFileVersion.id).filter(
+            ContractFileVersion.project_id == project_id,
+            ContractFileVersion.is_current == True
+        ).first()
+        return current.id if current else None
+
+    def _plan_incremental(self, base_version_id: int, item_rows: List[Tuple[str, Dict[str, Any]]]):
+        """
+        把解析出的明细与基准版本逐行比对
+
+        按 (工作表, 序号, 设备名称, 品牌型号) 匹配，键重复时按出现顺序依次匹配
+
+        Returns:
+            tuple: (需要写入的新增和变化行, 未变化可直接引用的行, 差异报告)
+        """
+        key_columns = [getattr(VersionedContractItem, field) for field in ITEM_KEY_FIELDS]
+        compare_columns = [getattr(VersionedContractItem, field) for field in ITEM_COMPARE_FIELDS]
+
+        base_items = self.db.query(
+            VersionedContractItem.id, SystemCategory.category_name, *key_columns, *compare_columns
+        ).outerjoin(
+            SystemCategory, VersionedContractItem.category_id == SystemCategory.id
+        ).filter(
+            VersionedContractItem.version_id == base_version_id,
+            VersionedContractItem.is_active == True
+        ).order_by(VersionedContractItem.id).all()
+
+        base_by_key = defaultdict(deque)
+        for base in base_items:
+            base_by_key[item_match_key(base.category_name, base._mapping)].append(base)
+
+        rows_to_insert = []
+        carried_over = []
+        added, changed = [], []
+
+        for sheet_name, row in item_rows:
+            candidates = base_by_key.get(item_match_key(sheet_name, row))
+            if not candidates:
+                added.append(describe_item(sheet_name, row))
+                rows_to_insert.append((sheet_name, row))
+                continue
+
+            base = candidates.popleft()
+            changes = {
+                field: {"old": report_value(base._mapping[field]), "new": report_value(row[field])}
+                for field in ITEM_COMPARE_FIELDS
+                if normalize_item_value(base._mapping[field]) != normalize_item_value(row[field])
+            }
+
+            if changes:
+                # 变化的行写入新记录，并关联到上一版本的明细便于追溯
+                row['original_item_id'] = base.id
+                changed.append({**describe_item(sheet_name, row), "changes": changes})
+                rows_to_insert.append((sheet_name, row))
+            else:
+                carried_over.append((sheet_name, base.id, row['category_id']))
+
+        removed = [
+            describe_item(base.category_name, base._mapping)
+            for remaining in base_by_key.values() for base in remaining
+        ]
+
+        report = {
+            "base_version_id": base_version_id,
+            "summary": {
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed),
+                "unchanged": len(carried_over)
+            },
+            "added": added,
+            "changed": changed,
+            "removed": removed
+        }
+
+        return rows_to_insert, carried_over, report
+
+    @staticmethod
+    def _count_by_sheet(imported_by_sheet: Dict[str, int], chunk: list) -> None:
+        """按工作表累计已写入的明细数量"""
+        for entry in chunk:
+            imported_by_sheet[entry[0]] = imported_by_sheet.get(entry[0], 0) + 1
+
+    def _insert_categories(self, project_id: int, version_id: int, categories: list) -> Dict[str, int]:
+        """
+        批量插入系统分类
+
+        Returns:
+            Dict[str, int]: 分类名称到分类ID的映射
+        """
+        if not categories:
+            return {}
+
+        rows = [
+            {
+                "project_id": project_id,
+                "version_id": version_id,
+                "category_name": category_data['category_name'],
+                "category_code": category_data['category_code'],
+                "excel_sheet_name": category_data['excel_sheet_name'],
+                "budget_amount": category_data.get('budget_amount'),
+                "description": category_data.get('description'),
+                "total_items_count": category_data['total_items_count']
+            }
+            for category_data in categories
+        ]
+
+        result = self.db.execute(
+            insert(SystemCategory).returning(SystemCategory.id, SystemCategory.category_name),
+            rows
+        )
+
+        return {category_name: category_id for category_id, category_name in result}
+
+    @staticmethod
+    def _build_item_row(project_id: int, version_id: int, category_id_mapping: Dict[str, int],
+                        item_data: Dict[str, Any]) -> Dict[str, Any]:
+        """把解析出的设备明细转换为批量插入的行数据，总价 = 数量 × 单价"""
+        quantity = item_data['quantity']
+        unit_price = item_data.get('unit_price')
+
+        return {
+            "project_id": project_id,
+            "version_id": version_id,
+            "category_id": category_id_mapping.get(item_data.get('category_name')),
+            "serial_number": item_data.get('serial_number'),
+            "item_name": item_data['item_name'],
+            "brand_model": item_data.get('brand_model'),
+            "specification": item_data.get('specification'),
+            "unit": item_data.get('unit', '台'),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "total_price": quantity * unit_price if quantity and unit_price else None,
+            "origin_place": item_data.get('origin_place', '中国'),
+            "item_type": item_data.get('item_type', '主材'),
+            "remarks": item_data.get('remarks')
+        }
+
+    def _remove_unreferenced_file(self, file_path: str, job: Optional[ContractImportJob] = None) -> None:
+        """删除导入失败的上传文件；按内容去重存储的文件仍被其他版本或待执行任务引用时保留"""
+        try:
+            referenced = self.db.query(ContractFileVersion.id).filter(
+                ContractFileVersion.stored_filename == Path(file_path).name
+            ).first()
+
+            pending_jobs = self.db.query(ContractImportJob.id).filter(
+                ContractImportJob.stored_file_path == file_path,
+                ContractImportJob.status.in_(("pending", "running"))
+            )
+            if job is not None:
+                pending_jobs = pending_jobs.filter(ContractImportJob.id != job.id)
+
+            if referenced or pending_jobs.first():
+                return
+
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            logger.warning(f"删除上传文件失败: {file_path}: {str(e)}")
+
+    def _replay_cached_progress(self, job: ContractImportJob, parsed_result: Dict[str, Any]) -> None:
+        """命中解析缓存时，按缓存结果一次性记录各工作表的解析进度"""
+        record_sheet_parsed = self._record_sheet_parsed(job)
+        job.total_sheets = parsed_result['summary']['total_sheets']
+
+        for sheet_result in parsed_result['sheets_info']:
+            record_sheet_parsed(sheet_result['sheet_name'], sheet_result, None)
+
+        parse_errors = parsed_result['summary']['parse_errors']
+        if parse_errors:
+            job.parsed_sheets = job.total_sheets
+            job.errors = list(job.errors or []) + parse_errors
+            self.db.commit()
+
+    def _record_sheet_parsed(self, job: ContractImportJob):
+        """生成解析进度回调：每解析完一个工作表就提交一次任务进度"""
+        def callback(sheet_name: str, sheet_result: Optional[Dict[str, Any]], error: Optional[str]):
+            items_parsed = len(sheet_result['items']) if sheet_result else 0
+
+            job.parsed_sheets = (job.parsed_sheets or 0) + 1
+            job.rows_parsed = (job.rows_parsed or 0) + items_parsed
+            # JSON字段需要整体赋值才能被识别为已修改
+            job.sheet_progress = list(job.sheet_progress or []) + [{
+                "sheet_name": sheet_name,
+                "status": "failed" if error else "parsed",
+                "items_parsed": items_parsed,
+                "items_inserted": 0,
+                "error": error
+            }]
+            if error:
+                job.errors = list(job.errors or []) + [error]
+
+            self.db.commit()
+
+        return callback
+
+    def _record_items_inserted(self, job: ContractImportJob, imported_by_sheet: Dict[str, int],
+                               import_errors: Optional[list] = None, finished: bool = False):
+        """记录各工作表已写入的明细数量（随当前数据块一起提交）"""
+        job.rows_inserted = sum(imported_by_sheet.values())
+        job.sheet_progress = [
+            {
+                **sheet,
+                "status": "imported" if finished and sheet["status"] == "parsed" else sheet["status"],
+                "items_inserted": imported_by_sheet.get(sheet["sheet_name"], 0)
+            }
+            for sheet in (job.sheet_progress or [])
+        ]
+        if import_errors:
+            job.errors = list(job.errors or []) + import_errors
+
+def run_contract_import_job(job_id: str) -> None:
+    """
+    执行合同清单导入任务（后台运行）
+
+    使用独立的数据库会话，任务结束后记录最终状态和上传结果
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == job_id).first()
+        if not job:
+            logger.error(f"导入任务 {job_id} 不存在")
+            return
+
+        job.status = "running"
+        job.start_time = datetime.now()
+        db.commit()
+
+        response = ContractImportService(db).import_contract_file(
+            project_id=job.project_id,
+            file_path=job.stored_file_path,
+            original_filename=job.original_filename,
+            upload_user_name=job.upload_user_name,
+            upload_reason=job.upload_reason,
+            change_description=job.change_description,
+            job=job,
+            file_hash=job.file_hash,
+            incremental=bool(job.incremental)
+        )
+
+        job.status = "completed" if response.success else "failed"
+        job.version_id = response.version_id
+        job.result = response.dict()
+        if not response.success:
+            job.errors = list(job.errors or []) + (response.errors or [])
+        job.end_time = datetime.now()
+        db.commit()
+
+        logger.info(f"导入任务 {job_id} 结束，状态: {job.status}")
+
+    except Exception as e:
+        db.rollback()
+        error_msg = f"导入任务执行失败: {str(e)}"
+        logger.error(error_msg)
+
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == job_id).first()
+        if job:
+            job.status = "failed"
+            job.errors = list(job.errors or []) + [error_msg]
+            job.end_time = datetime.now()
+            db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,192 @@
+"""
+合同清单明细全文检索服务
+
+对明细的设备名称、品牌型号、规格描述建立全文索引，替代逐行 LIKE '%关键词%' 的全表扫描：
+- 中文按单字和相邻两字切分（"监控相机" -> 监 控 相 机 监控 控相 相机），两个字的常用词也能命中索引
+- 英文和数字按连续字母数字切分并转小写，查询时按前缀匹配（"DS-2C" 可以匹配 "DS-2CD"）
+- SQLite 使用 FTS5（bm25 排序），PostgreSQL 使用 tsvector + GIN 索引（ts_rank 排序）
+
+索引表以明细ID为键，明细在版本之间共享，每行明细只索引一次；
+明细写入后由调用方调用 index_items / index_version_items 同步索引
+"""
+
+import logging
+import re
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Float, Integer, column, delete, or_, select, table, text
+from sqlalchemy.orm import Query, Session
+
+from app.models.contract import CONTRACT_ITEM_SEARCH_TABLE, ContractItem
+
+logger = logging.getLogger(__name__)
+
+# 中文（含扩展A区和兼容区）连续片段，或英文数字连续片段
+_TOKEN_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+# 建立索引时每批处理的明细数
+INDEX_BATCH_SIZE = 5000
+# 被索引的明细字段，按排序权重从高到低
+SEARCH_FIELDS = ('item_name', 'brand_model', 'specification')
+
+
+def _is_cjk(run: str) -> bool:
+    return not run[0].isascii()
+
+
+def tokenize_for_index(value: Optional[str]) -> str:
+    """把字段内容切分为以空格分隔的索引词"""
+    tokens = []
+    for run in _TOKEN_RUN.findall((value or '').lower()):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return ' '.join(tokens)
+
+
+def tokenize_query(search: str) -> List[tuple]:
+    """
+    把搜索关键词切分为查询词
+
+    Returns:
+        List[tuple]: (查询词, 是否前缀匹配) 列表，中文片段取相邻两字（单字片段取单字）
+    """
+    terms = []
+    for run in _TOKEN_RUN.findall(search.lower()):
+        if _is_cjk(run):
+            if len(run) == 1:
+                terms.append((run, False))
+            else:
+                terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+        else:
+            terms.append((run, True))
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms))
+
+
+class ContractSearchService:
+    """合同清单明细全文检索服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def index_items(self, item_ids: Iterable[int]) -> None:
+        """重建指定明细的索引（不提交事务）"""
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), INDEX_BATCH_SIZE):
+            self._index_rows(ContractItem.id.in_(item_ids[start:start + INDEX_BATCH_SIZE]))
+
+    def index_version_items(self, version_id: int) -> None:
+        """为版本新创建的明细建立索引（版本中共享的已有明细已经索引过）"""
+        self._index_rows(ContractItem.version_id == version_id)
+
+    def remove_items(self, item_ids) -> None:
+        """
+        从索引中删除明细（不提交事务）
+
+        Args:
+            item_ids: 明细ID列表或返回明细ID的子查询
+        """
+        key = self._search_key()
+        self.db.execute(delete(key.table).where(key.in_(item_ids)))
+
+    def apply_search(self, query: Query, item_id_column, search: str) -> Query:
+        """
+        在查询上应用关键词搜索，结果按相关度排序
+
+        关键词中没有可检索的字符（如只有标点）时退回到 LIKE 匹配
+
+        Args:
+            query: 明细查询（VersionedContractItem 或 ContractItem）
+            item_id_column: 查询中的明细ID列
+            search: 搜索关键词
+        """
+        terms = tokenize_query(search)
+        if not terms:
+            entity = item_id_column.class_
+            pattern = f"%{search}%"
+            return query.filter(or_(*(getattr(entity, field).ilike(pattern) for field in SEARCH_FIELDS)))
+
+        matches = self._match_subquery(terms)
+        return query.join(matches, matches.c.item_id == item_id_column).order_by(matches.c.rank, item_id_column)
+
+    def _search_key(self):
+        """索引表的明细ID列（SQLite 中为 rowid，PostgreSQL 中为 item_id）"""
+        key = column('rowid' if self.dialect == 'sqlite' else 'item_id', Integer)
+        table(CONTRACT_ITEM_SEARCH_TABLE, key)
+        return key
+
+    def _match_subquery(self, terms: List[tuple]):
+        if self.dialect == 'sqlite':
+            match = ' AND '.join(f'"{term}"' + ('*' if prefix else '') for term, prefix in terms)
+            statement = text(
+                f"SELECT rowid AS item_id, bm25({CONTRACT_ITEM_SEARCH_TABLE}, 10.0, 5.0, 1.0) AS rank "
+                f"FROM {CONTRACT_ITEM_SEARCH_TABLE} WHERE {CONTRACT_ITEM_SEARCH_TABLE} MATCH :match"
+            )
+        else:
+            match = ' & '.join(f"'{term}'" + (':*' if prefix else '') for term, prefix in terms)
+            statement = text(
+                f"SELECT item_id, -ts_rank(document, to_tsquery('simple', :match)) AS rank "
+                f"FROM {CONTRACT_ITEM_SEARCH_TABLE} WHERE document @@ to_tsquery('simple', :match)"
+            )
+
+        matches = statement.bindparams(match=match).columns(item_id=Integer, rank=Float).cte('search_matches')
+        # 强制先算出匹配集合再关联明细，避免查询规划把全文检索放在循环内层逐行执行
+        if self._supports_materialized_cte():
+            matches = matches.prefix_with('MATERIALIZED')
+        return matches
+
+    def _supports_materialized_cte(self) -> bool:
+        version = self.db.get_bind().dialect.server_version_info or ()
+        return version >= ((3, 35) if self.dialect == 'sqlite' else (12,))
+
+    def _index_rows(self, condition) -> None:
+        rows = self.db.query(ContractItem.id, *(getattr(ContractItem, field) for field in SEARCH_FIELDS)).filter(
+            condition
+        ).all()
+        if not rows:
+            return
+
+        self.remove_items(select(ContractItem.id).where(condition))
+
+        documents = [
+            {"item_id": row.id, **{field: tokenize_for_index(getattr(row, field)) for field in SEARCH_FIELDS}}
+            for row in rows
+        ]
+        if self.dialect == 'sqlite':
+            statement = text(
+                f"INSERT INTO {CONTRACT_ITEM_SEARCH_TABLE} (rowid, item_name, brand_model, specification) "
+                f"VALUES (:item_id, :item_name, :brand_model, :specification)"
+            )
+        else:
+            statement = text(
+                f"INSERT INTO {CONTRACT_ITEM_SEARCH_TABLE} (item_id, document) VALUES (:item_id, "
+                f"setweight(to_tsvector('simple', :item_name), 'A') || "
+                f"setweight(to_tsvector('simple', :brand_model), 'B') || "
+                f"setweight(to_tsvector('simple', :specification), 'C'))"
+            )
+        self.db.execute(statement, documents)
+
+
+def backfill_search_index(db: Session) -> int:
+    """
+    为尚未建立索引的明细建立全文索引
+
+    用于升级前已导入的历史数据，可重复执行
+
+    Returns:
+        int: 新建立索引的明细数
+    """
+    service = ContractSearchService(db)
+    indexed = select(service._search_key())
+
+    item_ids = [item_id for (item_id,) in db.query(ContractItem.id).filter(ContractItem.id.notin_(indexed))]
+    service.index_items(item_ids)
+    db.commit()
+
+    if item_ids:
+        logger.info(f"已为 {len(item_ids)} 条合同清单明细建立全文索引")
+
+    return len(item_ids)
@@ -0,0 +1,554 @@
+"""
+合同清单版本存储业务逻辑服务
+
+合同清单明细按写时复制方式在版本之间共享：
+- 版本包含哪些明细由版本成员表 contract_version_items 决定
+- 新版本中未变化的明细只增加成员记录，不复制明细行
+- 修改被多个版本共享的明细时，先复制一份新的明细行再修改，其他版本不受影响
+"""
+
+import logging
+import threading
+from collections import OrderedDict, defaultdict, deque
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, exists, func, insert, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.services.contract_search_service import ContractSearchService
+from app.models.contract import (
+    ContractItem, ContractVersionItem, ContractVersionSummary, SystemCategory, VersionedContractItem
+)
+
+logger = logging.getLogger(__name__)
+
+# 复制明细行时由新版本重新赋值的列
+COPY_EXCLUDED_COLUMNS = {'id', 'version_id', 'category_id', 'original_item_id', 'created_at', 'updated_at'}
+
+# 跨版本匹配同一条明细的字段（再加上所属工作表/系统分类名称）
+ITEM_KEY_FIELDS = ('serial_number', 'item_name', 'brand_model')
+# 比对明细是否变化的字段
+ITEM_COMPARE_FIELDS = ('specification', 'unit', 'quantity', 'unit_price', 'origin_place', 'item_type', 'remarks')
+# 版本差异报告中逐字段列出变化的字段
+DIFF_COMPARE_FIELDS = ITEM_COMPARE_FIELDS + ('total_price',)
+
+# 汇总中主材/辅材的物料类型取值
+MAIN_ITEM_TYPE = '主材'
+AUXILIARY_ITEM_TYPE = '辅材'
+# 版本汇总的数量和金额字段
+SUMMARY_FIELDS = (
+    'items_count', 'main_items_count', 'auxiliary_items_count', 'total_amount', 'main_amount', 'auxiliary_amount'
+)
+
+# 版本差异结果缓存：键中包含两个版本的内容标记，版本内容变化后旧结果自然失效
+_diff_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_diff_cache_lock = threading.Lock()
+
+
+def normalize_item_value(value: Any) -> Any:
+    """统一比对口径：字符串去空白、空字符串视为空，数值按两位小数比较"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    return value
+
+
+def item_match_key(sheet_name: Optional[str], values) -> tuple:
+    """明细的跨版本匹配键：(工作表, 序号, 设备名称, 品牌型号)"""
+    return (sheet_name,) + tuple(normalize_item_value(values[field]) for field in ITEM_KEY_FIELDS)
+
+
+def report_value(value: Any) -> Any:
+    """差异报告中的值需要能被JSON序列化"""
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def describe_item(sheet_name: Optional[str], values) -> Dict[str, Any]:
+    return {
+        "sheet_name": sheet_name,
+        **{field: values[field] for field in ITEM_KEY_FIELDS}
+    }
+
+
+def _round_amount(value: Any) -> float:
+    return round(float(value or 0), 2)
+
+
+def _category_scope(column, category_ids: set):
+    """按分类ID筛选的条件，集合中的None匹配未分类"""
+    conditions = [column.in_(category_ids - {None})]
+    if None in category_ids:
+        conditions.append(column.is_(None))
+    return or_(*conditions)
+
+
+class ContractVersionService:
+    """合同清单版本存储服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def add_origin_items(self, version_id: int) -> None:
+        """把该版本新创建（批量写入、未经ORM）的明细加入版本成员表"""
+        items = ContractItem.__table__
+        version_items = ContractVersionItem.__table__
+
+        self.db.execute(
+            insert(version_items).from_select(
+                ['version_id', 'item_id', 'category_id'],
+                select(items.c.version_id, items.c.id, items.c.category_id).where(
+                    items.c.version_id == version_id,
+                    ~exists().where(version_items.c.item_id == items.c.id)
+                )
+            )
+        )
+
+    def share_items(self, version_id: int, items: Iterable[Tuple[int, Optional[int]]]) -> None:
+        """
+        让新版本直接引用已有的明细行（不复制明细数据）
+
+        Args:
+            version_id: 新版本ID
+            items: (明细ID, 新版本中的分类ID) 列表
+        """
+        rows = [
+            {"version_id": version_id, "item_id": item_id, "category_id": category_id}
+            for item_id, category_id in items
+        ]
+        if rows:
+            self.db.execute(insert(ContractVersionItem.__table__), rows)
+
+    def update_item(self, project_id: int, version_id: int, item_id: int,
+                    update_data: Dict[str, Any]) -> Optional[int]:
+        """
+        修改版本中的明细（写时复制）
+
+        明细同时属于其他版本时，复制出新的明细行供本版本修改，
+        原明细行保持不变并通过 original_item_id 关联
+
+        Returns:
+            Optional[int]: 本版本中该明细修改后的ID，明细不存在时返回None
+        """
+        membership = self.db.query(ContractVersionItem).filter(
+            ContractVersionItem.version_id == version_id,
+            ContractVersionItem.item_id == item_id
+        ).first()
+
+        item = self.db.query(ContractItem).filter(
+            ContractItem.id == item_id,
+            ContractItem.project_id == project_id,
+            ContractItem.is_active == True
+        ).first()
+
+        if not membership or not item:
+            return None
+
+        shared = self.db.query(ContractVersionItem.version_id).filter(
+            ContractVersionItem.item_id == item_id,
+            ContractVersionItem.version_id != version_id
+        ).first()
+
+        if shared:
+            target = ContractItem(
+                **{
+                    column.name: getattr(item, column.name)
+                    for column in ContractItem.__table__.columns
+                    if column.name not in COPY_EXCLUDED_COLUMNS
+                },
+                version_id=version_id,
+                category_id=membership.category_id,
+                original_item_id=item.id
+            )
+            # 本版本改为引用新的明细行（新行插入时自动加入本版本）
+            self.db.delete(membership)
+            self.db.add(target)
+        else:
+            target = item
+
+        for field, value in update_data.items():
+            setattr(target, field, value)
+
+        # 重新计算总价
+        target.calculate_total_price()
+
+        self.db.flush()
+        ContractSearchService(self.db).index_items([target.id])
+        self.refresh_summary(version_id, [membership.category_id])
+        invalidate_version_diffs(version_id)
+
+        return target.id
+
+    def delete_version_contents(self, version_id: int) -> None:
+        """
+        删除版本的成员关系、分类以及不再被任何版本引用的明细
+
+        由该版本创建、但仍被其他版本引用的明细转交给引用它的最早版本
+        （不提交事务，版本记录本身由调用方删除）
+        """
+        items = ContractItem.__table__
+        version_items = ContractVersionItem.__table__
+
+        self.db.execute(version_items.delete().where(version_items.c.version_id == version_id))
+
+        owners = version_items.alias()
+        new_owner = select(func.min(owners.c.version_id)).where(
+            owners.c.item_id == items.c.id
+        ).correlate(items).scalar_subquery()
+        new_owner_category = select(version_items.c.category_id).where(
+            version_items.c.item_id == items.c.id,
+            version_items.c.version_id == new_owner
+        ).correlate(items).scalar_subquery()
+
+        self.db.execute(
+            update(items).where(
+                items.c.version_id == version_id,
+                exists().where(version_items.c.item_id == items.c.id)
+            ).values(version_id=new_owner, category_id=new_owner_category)
+        )
+
+        # 剩下的明细只属于该版本，删除前先解除其他明细对它们的追溯引用
+        orphan_ids = select(items.c.id).where(items.c.version_id == version_id)
+        self.db.execute(
+            update(items).where(items.c.original_item_id.in_(orphan_ids)).values(original_item_id=None)
+        )
+        ContractSearchService(self.db).remove_items(orphan_ids)
+        self.db.execute(items.delete().where(items.c.version_id == version_id))
+
+        self.db.query(ContractVersionSummary).filter(
+            ContractVersionSummary.version_id == version_id
+        ).delete(synchronize_session=False)
+        self.db.query(SystemCategory).filter(
+            SystemCategory.version_id == version_id
+        ).delete(synchronize_session=False)
+
+        invalidate_version_diffs(version_id)
+
+    def refresh_summary(self, version_id: int, category_ids: Optional[Iterable[Optional[int]]] = None) -> None:
+        """
+        重新计算版本汇总，并同步系统分类的明细数量
+
+        每次写入明细后调用，只重算受影响的分类（不提交事务）
+
+        Args:
+            version_id: 版本ID
+            category_ids: 需要重算的分类ID（None表示整个版本，列表中的None表示未分类明细）
+        """
+        if category_ids is not None:
+            category_ids = set(category_ids)
+
+        is_main = VersionedContractItem.item_type == MAIN_ITEM_TYPE
+        is_auxiliary = VersionedContractItem.item_type == AUXILIARY_ITEM_TYPE
+        price = VersionedContractItem.total_price
+
+        query = self.db.query(
+            VersionedContractItem.category_id,
+            func.count(VersionedContractItem.id),
+            func.sum(case((is_main, 1), else_=0)),
+            func.sum(case((is_auxiliary, 1), else_=0)),
+            func.sum(price),
+            func.sum(case((is_main, price), else_=None)),
+            func.sum(case((is_auxiliary, price), else_=None))
+        ).filter(
+            VersionedContractItem.version_id == version_id,
+            VersionedContractItem.is_active == True
+        )
+        if category_ids is not None:
+            query = query.filter(_category_scope(VersionedContractItem.category_id, category_ids))
+        rows = query.group_by(VersionedContractItem.category_id).all()
+
+        existing = self.db.query(ContractVersionSummary).filter(
+            ContractVersionSummary.version_id == version_id
+        )
+        if category_ids is not None:
+            existing = existing.filter(_category_scope(ContractVersionSummary.category_id, category_ids))
+        existing.delete(synchronize_session=False)
+
+        summaries = [
+            {
+                "version_id": version_id,
+                "category_id": row[0],
+                **{
+                    field: (value or 0) if field.endswith('_count') else Decimal(str(value or 0)).quantize(Decimal('0.01'))
+                    for field, value in zip(SUMMARY_FIELDS, row[1:])
+                }
+            }
+            for row in rows
+        ]
+        if summaries:
+            self.db.execute(insert(ContractVersionSummary), summaries)
+
+        # 系统分类上的明细数量随汇总一起更新
+        counts = {summary["category_id"]: summary["items_count"] for summary in summaries}
+        categories = self.db.query(SystemCategory).filter(SystemCategory.version_id == version_id)
+        if category_ids is not None:
+            categories = categories.filter(SystemCategory.id.in_(category_ids - {None}))
+        for category in categories:
+            category.total_items_count = counts.get(category.id, 0)
+
+        self.db.flush()
+
+    def get_version_summary(self, version_id: int) -> Dict[str, Any]:
+        """
+        读取版本汇总（按分类的汇总行及版本合计）
+
+        Returns:
+            Dict: 版本合计字段以及 categories 分类汇总列表
+        """
+        rows = self.db.query(ContractVersionSummary).filter(
+            ContractVersionSummary.version_id == version_id
+        ).order_by(ContractVersionSummary.category_id).all()
+
+        totals = {field: sum((getattr(row, field) for row in rows), 0) for field in SUMMARY_FIELDS}
+
+        return {
+            "version_id": version_id,
+            **totals,
+            "categories": [
+                {"category_id": row.category_id, **{field: getattr(row, field) for field in SUMMARY_FIELDS}}
+                for row in rows
+            ]
+        }
+
+    def diff_versions(self, base_version_id: int, target_version_id: int) -> Dict[str, Any]:
+        """
+        比较两个版本的合同清单明细
+
+        两个版本共享的明细行必然相同，直接在数据库中计数；
+        只需把各自独有的明细按 (系统分类, 序号, 设备名称, 品牌型号) 哈希匹配，
+        匹配上的逐字段比较，匹配不上的分别为新增和删除
+
+        Args:
+            base_version_id: 基准版本ID
+            target_version_id: 对比版本ID
+
+        Returns:
+            Dict: 差异报告，包含汇总、新增/删除/变化的明细以及各系统分类的数量和金额变化
+        """
+        cache_size = settings.contract_diff_cache_size
+        cache_key = (
+            base_version_id, target_version_id,
+            self._version_token(base_version_id), self._version_token(target_version_id)
+        )
+
+        if cache_size > 0:
+            with _diff_cache_lock:
+                cached = _diff_cache.get(cache_key)
+                if cached is not None:
+                    _diff_cache.move_to_end(cache_key)
+                    return cached
+
+        result = self._compute_diff(base_version_id, target_version_id)
+
+        if cache_size > 0:
+            with _diff_cache_lock:
+                _diff_cache[cache_key] = result
+                while len(_diff_cache) > cache_size:
+                    _diff_cache.popitem(last=False)
+
+        return result
+
+    def _version_token(self, version_id: int) -> tuple:
+        """版本内容标记：明细数量、最大明细ID、最近修改时间以及分类预算，任一变化都会使缓存失效"""
+        items = self.db.query(
+            func.count(VersionedContractItem.id),
+            func.max(VersionedContractItem.id),
+            func.max(VersionedContractItem.updated_at),
+            func.sum(VersionedContractItem.total_price)
+        ).filter(
+            VersionedContractItem.version_id == version_id,
+            VersionedContractItem.is_active == True
+        ).one()
+        categories = self.db.query(
+            func.count(SystemCategory.id),
+            func.max(SystemCategory.updated_at),
+            func.sum(SystemCategory.budget_amount)
+        ).filter(SystemCategory.version_id == version_id).one()
+        return tuple(items) + tuple(categories)
+
+    def _exclusive_items(self, version_id: int, other_version_id: int) -> List:
+        """查询只属于 version_id、不被 other_version_id 引用的有效明细"""
+        other = aliased(ContractVersionItem)
+        columns = [getattr(VersionedContractItem, field) for field in ITEM_KEY_FIELDS + DIFF_COMPARE_FIELDS]
+
+        return self.db.query(
+            VersionedContractItem.id, SystemCategory.category_name, *columns
+        ).outerjoin(
+            SystemCategory, VersionedContractItem.category_id == SystemCategory.id
+        ).filter(
+            VersionedContractItem.version_id == version_id,
+            VersionedContractItem.is_active == True,
+            ~exists().where(other.version_id == other_version_id, other.item_id == VersionedContractItem.id)
+        ).order_by(VersionedContractItem.id).all()
+
+    def _category_stats(self, version_id: int) -> Dict[Optional[str], Dict[str, Any]]:
+        """按系统分类名称汇总版本的明细数量、明细金额和预算金额"""
+        stats = defaultdict(lambda: {"items_count": 0, "total_amount": 0.0, "budget_amount": 0.0})
+
+        rows = self.db.query(
+            SystemCategory.category_name,
+            func.count(VersionedContractItem.id),
+            func.sum(VersionedContractItem.total_price)
+        ).select_from(VersionedContractItem).outerjoin(
+            SystemCategory, VersionedContractItem.category_id == SystemCategory.id
+        ).filter(
+            VersionedContractItem.version_id == version_id,
+            VersionedContractItem.is_active == True
+        ).group_by(SystemCategory.category_name).all()
+
+        for category_name, items_count, total_amount in rows:
+            stats[category_name]["items_count"] = items_count
+            stats[category_name]["total_amount"] = _round_amount(total_amount)
+
+        budgets = self.db.query(
+            SystemCategory.category_name, func.sum(SystemCategory.budget_amount)
+        ).filter(SystemCategory.version_id == version_id).group_by(SystemCategory.category_name).all()
+
+        for category_name, budget_amount in budgets:
+            stats[category_name]["budget_amount"] = _round_amount(budget_amount)
+
+        return stats
+
+    def _compute_diff(self, base_version_id: int, target_version_id: int) -> Dict[str, Any]:
+        other = aliased(ContractVersionItem)
+        shared_count = self.db.query(func.count(VersionedContractItem.id)).filter(
+            VersionedContractItem.version_id == base_version_id,
+            VersionedContractItem.is_active == True,
+            exists().where(other.version_id == target_version_id, other.item_id == VersionedContractItem.id)
+        ).scalar()
+
+        base_by_key = defaultdict(deque)
+        for base in self._exclusive_items(base_version_id, target_version_id):
+            base_by_key[item_match_key(base.category_name, base._mapping)].append(base)
+
+        added, modified = [], []
+        unchanged = shared_count
+
+        for target in self._exclusive_items(target_version_id, base_version_id):
+            candidates = base_by_key.get(item_match_key(target.category_name, target._mapping))
+            if not candidates:
+                added.append(self._diff_item(target))
+                continue
+
+            base = candidates.popleft()
+            changes = {
+                field: {"old": report_value(base._mapping[field]), "new": report_value(target._mapping[field])}
+                for field in DIFF_COMPARE_FIELDS
+                if normalize_item_value(base._mapping[field]) != normalize_item_value(target._mapping[field])
+            }
+            if changes:
+                modified.append({
+                    **describe_item(target.category_name, target._mapping),
+                    "base_item_id": base.id,
+                    "target_item_id": target.id,
+                    "changes": changes
+                })
+            else:
+                unchanged += 1
+
+        removed = [self._diff_item(base) for remaining in base_by_key.values() for base in remaining]
+
+        base_stats = self._category_stats(base_version_id)
+        target_stats = self._category_stats(target_version_id)
+        categories = []
+        for category_name in sorted(set(base_stats) | set(target_stats), key=lambda name: name or ""):
+            base_stat, target_stat = base_stats[category_name], target_stats[category_name]
+            categories.append({
+                "category_name": category_name,
+                "base": base_stat,
+                "target": target_stat,
+                "delta": {
+                    field: round(target_stat[field] - base_stat[field], 2)
+                    for field in ("items_count", "total_amount", "budget_amount")
+                }
+            })
+
+        return {
+            "base_version_id": base_version_id,
+            "target_version_id": target_version_id,
+            "summary": {
+                "added": len(added),
+                "removed": len(removed),
+                "modified": len(modified),
+                "unchanged": unchanged
+            },
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+            "categories": categories
+        }
+
+    @staticmethod
+    def _diff_item(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "category_name": row.category_name,
+            **{field: report_value(row._mapping[field]) for field in ITEM_KEY_FIELDS + DIFF_COMPARE_FIELDS}
+        }
+
+
+def invalidate_version_diffs(version_id: int) -> None:
+    """清除涉及指定版本的差异缓存（本进程内）"""
+    with _diff_cache_lock:
+        for key in [key for key in _diff_cache if version_id in key[:2]]:
+            del _diff_cache[key]
+
+
+def backfill_version_memberships(db: Session) -> int:
+    """
+    为没有任何版本成员记录的明细补充其创建版本的成员关系
+
+    用于升级前已导入的历史数据，可重复执行
+
+    Returns:
+        int: 补充的成员记录数
+    """
+    items = ContractItem.__table__
+    version_items = ContractVersionItem.__table__
+
+    result = db.execute(
+        insert(version_items).from_select(
+            ['version_id', 'item_id', 'category_id'],
+            select(items.c.version_id, items.c.id, items.c.category_id).where(
+                ~exists().where(version_items.c.item_id == items.c.id)
+            )
+        )
+    )
+    db.commit()
+
+    if result.rowcount:
+        logger.info(f"已为 {result.rowcount} 条历史合同清单明细补充版本成员关系")
+
+    return result.rowcount
+
+
+def backfill_version_summaries(db: Session) -> int:
+    """
+    为有明细但还没有汇总记录的版本生成汇总
+
+    用于升级前已导入的历史版本，可重复执行
+
+    Returns:
+        int: 生成汇总的版本数
+    """
+    summaries = ContractVersionSummary.__table__
+    version_ids = [
+        version_id for (version_id,) in db.query(ContractVersionItem.version_id).filter(
+            ~exists().where(summaries.c.version_id == ContractVersionItem.version_id)
+        ).distinct()
+    ]
+
+    service = ContractVersionService(db)
+    for version_id in version_ids:
+        service.refresh_summary(version_id)
+    db.commit()
+
+    if version_ids:
+        logger.info(f"已为 {len(version_ids)} 个历史合同清单版本生成汇总")
+
+    return len(version_ids)
@@ -0,0 +1,222 @@
+"""
+物料名称联想输入服务
+
+为项目当前版本的合同清单建立内存前缀索引，覆盖设备名称和品牌型号，
+支持按汉字、全拼和拼音首字母联想，如 "jkxj"、"jiankong"、"监控" 都能找到 "监控相机"：
+- 每个词条从每个字（或连续的字母数字片段）开始分别生成 原文/全拼/首字母 三种键，
+  因此 "xiangji"、"xj" 也能匹配 "监控相机"
+- 所有键排序后用二分查找取前缀区间，按 从词首匹配 > 名称优先 > 出现次数多 > 词条短 排序取前k条
+
+索引按项目缓存在进程内，版本汇总变化（切换当前版本、导入、修改明细）后自动重建；
+重建时复用上一份索引已经算好的拼音键，只对新出现的词条做拼音转换
+"""
+
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pypinyin import lazy_pinyin
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.contract import ContractFileVersion, ContractVersionSummary, VersionedContractItem
+
+logger = logging.getLogger(__name__)
+
+# 汉字连续片段，或不含空白的其他字符连续片段
+_UNIT_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[^\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\s]+')
+_HANZI = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+# 参与联想的字段，顺序即排序优先级
+TYPEAHEAD_FIELDS = ('item_name', 'brand_model')
+
+# 按项目缓存的索引：project_id -> (版本ID, 汇总标记, 索引)
+_index_cache: "OrderedDict[int, Tuple[int, Any, MaterialTypeaheadIndex]]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def build_keys(text: str) -> List[Tuple[str, int]]:
+    """
+    生成词条的联想键
+
+    Returns:
+        List[Tuple[str, int]]: (键, 起始位置) 列表，起始位置为0表示从词首匹配
+    """
+    units = []
+    for run in _UNIT_RUN.findall(text):
+        if _HANZI.match(run):
+            syllables = lazy_pinyin(run)
+            if len(syllables) != len(run):
+                syllables = [lazy_pinyin(char)[0] for char in run]
+            units.extend((char, syllable.lower(), syllable[:1].lower()) for char, syllable in zip(run, syllables))
+        else:
+            units.append((run.lower(),) * 3)
+
+    keys = set()
+    for position in range(len(units)):
+        for form in range(3):
+            keys.add((''.join(unit[form] for unit in units[position:]), position))
+
+    # 同一个键只保留最靠前的位置
+    best: Dict[str, int] = {}
+    for key, position in keys:
+        if key and position < best.get(key, len(units)):
+            best[key] = position
+    return list(best.items())
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r'\s+', '', query).lower()
+
+
+class MaterialTypeaheadIndex:
+    """单个版本的联想前缀索引（只读，可在线程间共享）"""
+
+    def __init__(self, entries: List[Dict[str, Any]], key_cache: Optional[Dict[str, List[Tuple[str, int]]]] = None):
+        """
+        Args:
+            entries: 词条列表，每项包含 text、field、item_type、count
+            key_cache: 上一份索引的 词条->联想键 缓存，用于增量重建
+        """
+        self.entries = entries
+        self.key_cache: Dict[str, List[Tuple[str, int]]] = {}
+        reused = 0
+
+        postings = []
+        for entry_id, entry in enumerate(entries):
+            text = entry['text']
+            keys = self.key_cache.get(text)
+            if keys is None:
+                keys = key_cache.get(text) if key_cache else None
+                if keys is None:
+                    keys = build_keys(text)
+                else:
+                    reused += 1
+                self.key_cache[text] = keys
+            postings.extend((key, entry_id, position) for key, position in keys)
+
+        postings.sort()
+        self._keys = [key for key, _, _ in postings]
+        self._postings = [(entry_id, position) for _, entry_id, position in postings]
+        self.reused_keys = reused
+
+    def search(self, query: str, limit: int = 10, item_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按前缀查找联想词条
+
+        Args:
+            query: 输入的汉字、全拼或拼音首字母
+            limit: 返回条数
+            item_type: 物料类型筛选（主材/辅材）
+        """
+        query = normalize_query(query)
+        if not query:
+            return []
+
+        start = bisect_left(self._keys, query)
+        end = bisect_left(self._keys, query + '\uffff', lo=start)
+
+        # 同一词条可能由多个键命中，取最靠前的命中位置
+        matched: Dict[int, int] = {}
+        for entry_id, position in self._postings[start:end]:
+            if item_type and self.entries[entry_id]['item_type'] != item_type:
+                continue
+            if position < matched.get(entry_id, position + 1):
+                matched[entry_id] = position
+
+        def rank(entry_id: int):
+            entry = self.entries[entry_id]
+            return (
+                matched[entry_id] > 0, TYPEAHEAD_FIELDS.index(entry['field']),
+                -entry['count'], len(entry['text']), entry['text']
+            )
+
+        return [
+            {
+                "text": self.entries[entry_id]['text'],
+                "field": self.entries[entry_id]['field'],
+                "item_type": self.entries[entry_id]['item_type'],
+                "count": self.entries[entry_id]['count']
+            }
+            for entry_id in heapq.nsmallest(limit, matched, key=rank)
+        ]
+
+
+class MaterialTypeaheadService:
+    """物料名称联想输入服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def suggest(self, project_id: int, query: str, limit: int = 10,
+                item_type: Optional[str] = None) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """
+        返回项目当前版本中与输入匹配的前k条联想
+
+        Returns:
+            tuple: (当前版本ID, 联想列表)，项目没有当前版本时返回 (None, [])
+        """
+        version_id, index = self.get_index(project_id)
+        if index is None:
+            return None, []
+        return version_id, index.search(query, limit, item_type)
+
+    def get_index(self, project_id: int) -> Tuple[Optional[int], Optional[MaterialTypeaheadIndex]]:
+        """取项目当前版本的索引，版本或内容变化后增量重建"""
+        version_id = self.db.query(ContractFileVersion.id).filter(
+            ContractFileVersion.project_id == project_id,
+            ContractFileVersion.is_current == True
+        ).scalar()
+        if version_id is None:
+            return None, None
+
+        # 汇总记录在每次写入明细后重建（ID递增），用作索引内容标记
+        token = self.db.query(func.max(ContractVersionSummary.id)).filter(
+            ContractVersionSummary.version_id == version_id
+        ).scalar()
+
+        with _index_cache_lock:
+            cached = _index_cache.get(project_id)
+            if cached and cached[:2] == (version_id, token):
+                _index_cache.move_to_end(project_id)
+                return version_id, cached[2]
+
+        index = MaterialTypeaheadIndex(
+            self._load_entries(version_id),
+            key_cache=cached[2].key_cache if cached else None
+        )
+        logger.info(
+            f"项目 {project_id} 版本 {version_id} 的物料联想索引已重建："
+            f"{len(index.entries)} 个词条，复用 {index.reused_keys} 个"
+        )
+
+        with _index_cache_lock:
+            _index_cache[project_id] = (version_id, token, index)
+            _index_cache.move_to_end(project_id)
+            while len(_index_cache) > max(settings.material_typeahead_cache_size, 1):
+                _index_cache.popitem(last=False)
+
+        return version_id, index
+
+    def _load_entries(self, version_id: int) -> List[Dict[str, Any]]:
+        entries = []
+        for field in TYPEAHEAD_FIELDS:
+            column = getattr(VersionedContractItem, field)
+            rows = self.db.query(
+                column, VersionedContractItem.item_type, func.count(VersionedContractItem.id)
+            ).filter(
+                VersionedContractItem.version_id == version_id,
+                VersionedContractItem.is_active == True,
+                column.isnot(None),
+                column != ''
+            ).group_by(column, VersionedContractItem.item_type).all()
+
+            entries.extend(
+                {"text": text, "field": field, "item_type": item_type, "count": count}
+                for text, item_type, count in rows
+            )
+        return entries
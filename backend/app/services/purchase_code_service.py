@@ -0,0 +1,98 @@
+"""
+申购单号生成服务
+
+单号格式为 PRyyyymmddNNNN，按天从0001开始编号。每天已分配的最大序号保存在 purchase_request_code_sequences
+的一行中，分配时执行一条 UPDATE last_value = last_value + n 并取回新值，不再扫描当天的申购单号：
+- 序号与申购单在同一事务内分配，数据库对序号行加锁，并发创建拿到的序号互不重复；事务回滚时序号一并回滚
+- 一次可以分配连续的 n 个单号（批量创建时只更新一次）
+- 当天第一次分配时按已有单号的最大序号初始化，兼容升级当天已经创建的申购单
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.purchase import PurchaseRequest, PurchaseRequestCodeSequence
+
+# 申购单号前缀
+REQUEST_CODE_PREFIX = "PR"
+# 序号位数（超过9999时自然扩展位数）
+REQUEST_CODE_DIGITS = 4
+
+
+class PurchaseCodeService:
+    """申购单号生成服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.table = PurchaseRequestCodeSequence.__table__
+
+    def next_code(self, today: Optional[datetime] = None) -> str:
+        """分配一个申购单号（不提交事务）"""
+        return self.allocate(1, today)[0]
+
+    def allocate(self, count: int, today: Optional[datetime] = None) -> List[str]:
+        """
+        分配连续的多个申购单号（不提交事务）
+
+        Args:
+            count: 单号数量
+            today: 单号日期（默认当天）
+
+        Returns:
+            List[str]: 按序号递增的申购单号
+        """
+        if count < 1:
+            raise ValueError("分配的单号数量必须大于0")
+
+        prefix = f"{REQUEST_CODE_PREFIX}{(today or datetime.now()).strftime('%Y%m%d')}"
+
+        last_value = self._increment(prefix, count)
+        if last_value is None:
+            self._create_sequence(prefix)
+            last_value = self._increment(prefix, count)
+
+        return [
+            f"{prefix}{str(value).zfill(REQUEST_CODE_DIGITS)}"
+            for value in range(last_value - count + 1, last_value + 1)
+        ]
+
+    def _increment(self, prefix: str, count: int) -> Optional[int]:
+        """序号行加 count 并返回新值，当天还没有序号行时返回None"""
+        statement = update(self.table).where(
+            self.table.c.prefix == prefix
+        ).values(
+            last_value=self.table.c.last_value + count,
+            updated_at=func.now()
+        )
+
+        if self.db.get_bind().dialect.update_returning:
+            return self.db.execute(statement.returning(self.table.c.last_value)).scalar()
+
+        if self.db.execute(statement).rowcount == 0:
+            return None
+        return self.db.query(self.table.c.last_value).filter(self.table.c.prefix == prefix).scalar()
+
+    def _create_sequence(self, prefix: str) -> None:
+        """创建当天的序号行，初始值为当天已有单号的最大序号（并发创建同一行时忽略冲突）"""
+        last_code = self.db.query(PurchaseRequest.request_code).filter(
+            PurchaseRequest.request_code.like(f"{prefix}%")
+        ).order_by(PurchaseRequest.request_code.desc()).first()
+        suffix = last_code[0][len(prefix):] if last_code else ""
+        row = {"prefix": prefix, "last_value": int(suffix) if suffix.isdigit() else 0}
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            self.db.execute(insert(self.table).values(**row).on_conflict_do_nothing(index_elements=['prefix']))
+            return
+
+        try:
+            with self.db.begin_nested():
+                self.db.execute(self.table.insert().values(**row))
+        except IntegrityError:
+            pass
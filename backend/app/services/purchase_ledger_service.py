@@ -0,0 +1,324 @@
+"""
+合同清单项申购台账服务
+
+按合同清单项维护累计数量，读取剩余可申购数量时只查台账的一行，不再汇总全部申购明细：
+- committed 已占用：总经理已批准、已完成的申购单
+- pending 审批中：已提交、已询价、部门已审批的申购单
+
+申购单状态统一通过 transition 切换，台账在同一事务内以 "数量 = 数量 + 变化量" 更新，
+并发审批不会互相覆盖；rebuild 按申购明细重算台账，用于历史数据和校对
+
+申购单提交（从草稿进入台账）时按合同数量预留：
+    UPDATE ... SET pending = pending + q WHERE committed + pending + q <= 合同数量
+校验和占用在同一条语句中完成，数据库对该行加锁，同一清单项的并发提交只有不超量的能成功，
+不同清单项之间互不阻塞；合同数量为空的清单项不能预留
+
+只有主材（item_type == "main"）计入台账，辅材不占用合同数量
+"""
+
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.contract import ContractItem
+from app.models.purchase import (
+    ContractItemPurchaseLedger, PurchaseRequest, PurchaseRequestItem, PurchaseStatus
+)
+
+logger = logging.getLogger(__name__)
+
+# 申购单状态计入的台账字段，草稿、已拒绝、已取消不计入
+LEDGER_STATUS_FIELDS = {
+    PurchaseStatus.SUBMITTED: 'pending_quantity',
+    PurchaseStatus.PRICE_QUOTED: 'pending_quantity',
+    PurchaseStatus.DEPT_APPROVED: 'pending_quantity',
+    PurchaseStatus.FINAL_APPROVED: 'committed_quantity',
+    PurchaseStatus.COMPLETED: 'committed_quantity',
+}
+COMMITTED_STATUSES = [status for status, field in LEDGER_STATUS_FIELDS.items() if field == 'committed_quantity']
+PENDING_STATUSES = [status for status, field in LEDGER_STATUS_FIELDS.items() if field == 'pending_quantity']
+LEDGER_FIELDS = ('committed_quantity', 'pending_quantity')
+# 计入台账的申购明细类型（主材）
+MAIN_ITEM_TYPE = "main"
+
+
+class ContractQuantityExceeded(ValueError):
+    """申购数量超出合同清单数量"""
+
+    def __init__(self, message: str, contract_item_id: int):
+        super().__init__(message)
+        self.contract_item_id = contract_item_id
+
+
+class PurchaseLedgerService:
+    """合同清单项申购台账服务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.table = ContractItemPurchaseLedger.__table__
+
+    def transition(self, purchase_request: PurchaseRequest, new_status: PurchaseStatus) -> None:
+        """
+        切换申购单状态，并把申购明细数量从原状态的台账字段转到新状态的台账字段（不提交事务）
+
+        Args:
+            purchase_request: 申购单
+            new_status: 新状态
+        """
+        old_field = LEDGER_STATUS_FIELDS.get(purchase_request.status)
+        new_field = LEDGER_STATUS_FIELDS.get(new_status)
+        purchase_request.status = new_status
+
+        if old_field == new_field:
+            return
+
+        quantities: Dict[int, Decimal] = defaultdict(Decimal)
+        for item in purchase_request.items:
+            if item.item_type == MAIN_ITEM_TYPE and item.contract_item_id:
+                quantities[item.contract_item_id] += Decimal(str(item.quantity or 0))
+
+        # 从草稿等不计入台账的状态进入台账时，按合同数量预留
+        if old_field is None:
+            self.reserve(quantities, new_field)
+            return
+
+        deltas: Dict[int, Dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+        for contract_item_id, quantity in quantities.items():
+            deltas[contract_item_id][old_field] -= quantity
+            if new_field:
+                deltas[contract_item_id][new_field] += quantity
+
+        self.apply(deltas)
+
+    def reserve(self, quantities: Dict[int, Decimal], field: str = 'pending_quantity') -> None:
+        """
+        预留合同数量：校验不超量并累加到台账字段，两者在同一条 UPDATE 中完成（不提交事务）
+
+        Args:
+            quantities: 合同清单项ID -> 预留数量
+            field: 计入的台账字段
+
+        Raises:
+            ContractQuantityExceeded: 某个清单项预留后会超出合同数量或合同数量为空（之前已预留的清单项需由调用方回滚）
+        """
+        quantities = {contract_item_id: quantity for contract_item_id, quantity in quantities.items() if quantity}
+        if not quantities:
+            return
+
+        self._ensure_rows(quantities.keys())
+
+        contract_quantity = select(ContractItem.quantity).where(
+            ContractItem.id == self.table.c.contract_item_id
+        ).scalar_subquery()
+        reserved = self.table.c.committed_quantity + self.table.c.pending_quantity
+
+        # 按ID顺序更新，并发事务以相同顺序加行锁
+        for contract_item_id in sorted(quantities):
+            quantity = quantities[contract_item_id]
+            result = self.db.execute(
+                update(self.table).where(
+                    self.table.c.contract_item_id == contract_item_id,
+                    reserved + quantity <= contract_quantity
+                ).values(
+                    updated_at=func.now(),
+                    **{field: self.table.c[field] + quantity}
+                )
+            )
+            if result.rowcount == 0:
+                raise self._exceeded(contract_item_id, quantity)
+
+    def apply(self, deltas: Dict[int, Dict[str, Decimal]]) -> None:
+        """
+        按变化量更新台账（不提交事务）
+
+        Args:
+            deltas: 合同清单项ID -> {台账字段: 变化量}
+        """
+        deltas = {
+            contract_item_id: {field: amount for field, amount in changes.items() if amount}
+            for contract_item_id, changes in deltas.items()
+        }
+        deltas = {contract_item_id: changes for contract_item_id, changes in deltas.items() if changes}
+        if not deltas:
+            return
+
+        self._ensure_rows(deltas.keys())
+
+        # 按ID顺序更新，并发事务以相同顺序加行锁
+        for contract_item_id in sorted(deltas):
+            self.db.execute(
+                update(self.table).where(
+                    self.table.c.contract_item_id == contract_item_id
+                ).values(
+                    updated_at=func.now(),
+                    **{field: self.table.c[field] + amount for field, amount in deltas[contract_item_id].items()}
+                )
+            )
+
+    def get_ledger(self, contract_item_id: int) -> Dict[str, Decimal]:
+        """读取单个合同清单项的台账（没有台账行时各数量为0）"""
+        return self.get_ledgers([contract_item_id])[contract_item_id]
+
+    def get_ledgers(self, contract_item_ids: Iterable[int]) -> Dict[int, Dict[str, Decimal]]:
+        """
+        批量读取台账
+
+        Returns:
+            Dict: 合同清单项ID -> {committed_quantity, pending_quantity}
+        """
+        contract_item_ids = list(set(contract_item_ids))
+        ledgers = {
+            contract_item_id: {field: Decimal(0) for field in LEDGER_FIELDS}
+            for contract_item_id in contract_item_ids
+        }
+        if not contract_item_ids:
+            return ledgers
+
+        rows = self.db.query(
+            self.table.c.contract_item_id, *(self.table.c[field] for field in LEDGER_FIELDS)
+        ).filter(self.table.c.contract_item_id.in_(contract_item_ids))
+
+        for contract_item_id, *values in rows:
+            ledgers[contract_item_id] = {
+                field: Decimal(str(value or 0)) for field, value in zip(LEDGER_FIELDS, values)
+            }
+        return ledgers
+
+    def get_requested_quantities(self, contract_item_ids: Iterable[int]) -> Dict[int, Decimal]:
+        """
+        批量读取已申购数量（已占用 + 审批中），与 reserve 校验合同数量时的口径一致
+
+        Returns:
+            Dict: 合同清单项ID -> 已申购数量
+        """
+        return {
+            contract_item_id: ledger['committed_quantity'] + ledger['pending_quantity']
+            for contract_item_id, ledger in self.get_ledgers(contract_item_ids).items()
+        }
+
+    def rebuild(self, contract_item_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        按申购明细重新计算台账（只统计主材，不提交事务）
+
+        Args:
+            contract_item_ids: 需要重算的合同清单项ID（None表示全部）
+
+        Returns:
+            int: 重算后的台账行数
+        """
+        if contract_item_ids is not None:
+            contract_item_ids = list(set(contract_item_ids))
+
+        committed = PurchaseRequest.status.in_(COMMITTED_STATUSES)
+        pending = PurchaseRequest.status.in_(PENDING_STATUSES)
+        query = self.db.query(
+            PurchaseRequestItem.contract_item_id,
+            func.sum(case((committed, PurchaseRequestItem.quantity), else_=0)),
+            func.sum(case((pending, PurchaseRequestItem.quantity), else_=0))
+        ).join(
+            PurchaseRequest
+        ).filter(
+            PurchaseRequestItem.contract_item_id.isnot(None),
+            PurchaseRequestItem.item_type == MAIN_ITEM_TYPE,
+            PurchaseRequest.status.in_(list(LEDGER_STATUS_FIELDS))
+        )
+        if contract_item_ids is not None:
+            query = query.filter(PurchaseRequestItem.contract_item_id.in_(contract_item_ids))
+        rows = query.group_by(PurchaseRequestItem.contract_item_id).all()
+
+        existing = self.db.query(ContractItemPurchaseLedger)
+        if contract_item_ids is not None:
+            existing = existing.filter(ContractItemPurchaseLedger.contract_item_id.in_(contract_item_ids))
+        existing.delete(synchronize_session=False)
+
+        ledgers = [
+            {
+                "contract_item_id": row[0],
+                **{field: Decimal(str(value or 0)) for field, value in zip(LEDGER_FIELDS, row[1:])}
+            }
+            for row in rows
+        ]
+        if ledgers:
+            self.db.execute(self.table.insert(), ledgers)
+
+        self.db.flush()
+        return len(ledgers)
+
+    def _exceeded(self, contract_item_id: int, quantity: Decimal) -> ContractQuantityExceeded:
+        item = self.db.query(ContractItem.item_name, ContractItem.quantity).filter(
+            ContractItem.id == contract_item_id
+        ).first()
+        if not item:
+            return ContractQuantityExceeded(f"合同清单项 {contract_item_id} 不存在", contract_item_id)
+        if item.quantity is None:
+            return ContractQuantityExceeded(
+                f"主材 {item.item_name} 的合同清单未填写数量，不能申购", contract_item_id
+            )
+
+        requested = self.get_requested_quantities([contract_item_id])[contract_item_id]
+        return ContractQuantityExceeded(
+            f"主材 {item.item_name} 申购数量超出合同限制。"
+            f"合同数量: {item.quantity}, "
+            f"已申购: {requested}, "
+            f"本次申购: {quantity}",
+            contract_item_id
+        )
+
+    def _ensure_rows(self, contract_item_ids: Iterable[int]) -> None:
+        """为还没有台账行的合同清单项插入数量为0的台账行（并发插入同一行时忽略冲突）"""
+        rows = [{"contract_item_id": contract_item_id} for contract_item_id in sorted(contract_item_ids)]
+        dialect = self.db.get_bind().dialect.name
+
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            self.db.execute(
+                insert(self.table).on_conflict_do_nothing(index_elements=['contract_item_id']),
+                rows
+            )
+            return
+
+        existing = {
+            contract_item_id for (contract_item_id,) in self.db.query(self.table.c.contract_item_id).filter(
+                self.table.c.contract_item_id.in_([row["contract_item_id"] for row in rows])
+            )
+        }
+        missing = [row for row in rows if row["contract_item_id"] not in existing]
+        if missing:
+            self.db.execute(self.table.insert(), missing)
+
+
+def backfill_purchase_ledger(db: Session) -> int:
+    """
+    为有主材申购记录但还没有台账行的合同清单项建立台账
+
+    用于升级前已有的申购单，可重复执行。只补建缺失的台账行，已有的台账行不重新计算；
+    台账与申购明细不一致（如绕过 transition 直接修改了申购单状态）时，
+    需调用 PurchaseLedgerService.rebuild() 按申购明细全部重算
+
+    Returns:
+        int: 建立台账的合同清单项数
+    """
+    ledger_ids = select(ContractItemPurchaseLedger.contract_item_id)
+    contract_item_ids = [
+        contract_item_id for (contract_item_id,) in db.query(PurchaseRequestItem.contract_item_id).join(
+            PurchaseRequest
+        ).filter(
+            PurchaseRequestItem.contract_item_id.isnot(None),
+            PurchaseRequestItem.contract_item_id.notin_(ledger_ids),
+            PurchaseRequestItem.item_type == MAIN_ITEM_TYPE,
+            PurchaseRequest.status.in_(list(LEDGER_STATUS_FIELDS))
+        ).distinct()
+    ]
+
+    count = PurchaseLedgerService(db).rebuild(contract_item_ids) if contract_item_ids else 0
+    db.commit()
+
+    if count:
+        logger.info(f"已为 {count} 个合同清单项建立申购台账")
+
+    return count
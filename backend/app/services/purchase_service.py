@@ -3,7 +3,6 @@
 """
 
 from typing import List, Optional, Dict, Any
-from datetime import datetime
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
@@ -19,6 +18,8 @@ from app.models.user import User
 from app.schemas.purchase import (
     PurchaseRequestCreate, AuxiliaryTemplateCreate
 )
+from app.services.purchase_code_service import PurchaseCodeService
+from app.services.purchase_ledger_service import LEDGER_STATUS_FIELDS, MAIN_ITEM_TYPE, PurchaseLedgerService
 
 
 class PurchaseService:
@@ -67,6 +68,8 @@ class PurchaseService:
                 
                 if not contract_item:
                     raise ValueError(f"合同清单项 {item_data.contract_item_id} 不存在")
+                if contract_item.quantity is None:
+                    raise ValueError(f"主材 {contract_item.item_name} 的合同清单未填写数量，不能申购")
                 
                 # 检查是否超量（累计申购量）
                 total_requested = self._get_total_requested_quantity(
@@ -122,7 +125,7 @@ class PurchaseService:
     def validate_main_material_quantities(self, purchase_request: PurchaseRequest):
         """
         验证主材申购数量是否超出合同限制
-        用于提交申购单时的最终验证
+        用于提交申购单时的预先验证，提交时由申购台账预留合同数量保证并发提交不超量
         """
         for item in purchase_request.items:
             if item.item_type == ItemType.MAIN_MATERIAL:
@@ -135,8 +138,10 @@ class PurchaseService:
                 
                 if not contract_item:
                     raise ValueError(f"合同清单项 {item.contract_item_id} 不存在")
+                if contract_item.quantity is None:
+                    raise ValueError(f"主材 {contract_item.item_name} 的合同清单未填写数量，不能申购")
                 
-                # 获取该合同项的所有已批准申购数量
+                # 获取该合同项已占用的申购数量（不含本申购单）
                 total_requested = self._get_total_requested_quantity(
                     contract_item.id,
                     exclude_request_id=purchase_request.id
@@ -281,23 +286,8 @@ class PurchaseService:
         return template
     
     def _generate_request_code(self) -> str:
-        """生成申购单号"""
-        today = datetime.now()
-        prefix = f"PR{today.strftime('%Y%m%d')}"
-        
-        # 查找今天的最大序号 - 只查询request_code字段避免枚举解析错误
-        result = self.db.query(PurchaseRequest.request_code).filter(
-            PurchaseRequest.request_code.like(f"{prefix}%")
-        ).order_by(PurchaseRequest.request_code.desc()).first()
-        
-        if result:
-            # 提取序号并加1
-            last_seq = int(result[0][-4:])  # result是tuple，取第一个元素
-            seq = str(last_seq + 1).zfill(4)
-        else:
-            seq = "0001"
-        
-        return f"{prefix}{seq}"
+        """生成申购单号（按日序号原子递增，与申购单在同一事务内分配）"""
+        return PurchaseCodeService(self.db).next_code()
     
     def _get_total_requested_quantity(
         self, 
@@ -306,28 +296,25 @@ class PurchaseService:
     ) -> Decimal:
         """
         获取某个合同清单项的累计已申购数量
-        只统计总经理已批准和已完成的申购单
+        总经理已批准、已完成以及审批中的申购单都占用合同数量（读取申购台账）
         """
-        query = self.db.query(
-            func.sum(PurchaseRequestItem.quantity)
-        ).join(
-            PurchaseRequest
-        ).filter(
-            and_(
-                PurchaseRequestItem.contract_item_id == contract_item_id,
-                PurchaseRequest.status.in_([
-                    PurchaseStatus.FINAL_APPROVED,  # 只有总经理批准后才算真正占用
-                    PurchaseStatus.COMPLETED        # 已完成的也算占用
-                ])
-            )
-        )
+        total = PurchaseLedgerService(self.db).get_requested_quantities([contract_item_id])[contract_item_id]
         
         if exclude_request_id:
-            query = query.filter(PurchaseRequest.id != exclude_request_id)
-        
-        total = query.scalar()
+            # 被排除的申购单如果已占用数量，从累计数量中扣除
+            excluded = self.db.query(
+                func.sum(PurchaseRequestItem.quantity)
+            ).join(
+                PurchaseRequest
+            ).filter(
+                PurchaseRequest.id == exclude_request_id,
+                PurchaseRequestItem.contract_item_id == contract_item_id,
+                PurchaseRequestItem.item_type == MAIN_ITEM_TYPE,
+                PurchaseRequest.status.in_(list(LEDGER_STATUS_FIELDS))
+            ).scalar()
+            total -= Decimal(str(excluded or 0))
         
-        return Decimal(total or 0)
+        return total
     
     def get_purchase_statistics(self, project_id: int) -> Dict[str, Any]:
         """获取项目采购统计信息"""
@@ -6,16 +6,33 @@ Excel文件解析工具类
 根据用户提供的Excel格式进行解析，提取设备信息
 """
 
+import numpy as np
 import pandas as pd
 import openpyxl
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from decimal import Decimal
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import re
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 解析器版本号：解析结果的结构或规则变化时递增，使旧的解析缓存失效
+PARSER_VERSION = "5"
+
+# 流式模式每批构建DataFrame的数据行数
+STREAMING_BATCH_ROWS = 5000
+
+# 辅材关键词（设备名称包含任一关键词即判定为辅材）
+AUXILIARY_KEYWORDS = [
+    '线材', '电缆', '管材', '支架', '配件', '螺丝', '工具',
+    '安装', '调试', '维护', '辅助', '配套'
+]
+AUXILIARY_PATTERN = '|'.join(re.escape(keyword) for keyword in AUXILIARY_KEYWORDS)
+
 class ExcelParseError(Exception):
     """Excel解析异常"""
     pass
@@ -25,11 +42,28 @@ class ContractExcelParser:
     合同清单Excel解析器
     
     支持解析投标清单的Excel文件，提取系统分类和设备明细信息
+    
+    streaming=True 时以只读模式打开工作簿，逐行迭代完成表头检测和数据读取，
+    不构建单元格对象，数据行按 STREAMING_BATCH_ROWS 分批转换为设备明细，原始行和DataFrame的内存占用
+    与工作表行数无关，适合数万行的大型投标清单；解析出的明细与默认模式一致
     """
     
-    def __init__(self):
-        """初始化解析器"""
+    # 常见的表头关键词
+    HEADER_KEYWORDS = [
+        '序号', '设备名称', '设备品牌', '设备型号', '品牌型号', '规格', '单位', '数量', '单价',
+        '综合单价', '合价', '总价', '金额', '备注', '原产地', '型号', '名称'
+    ]
+    
+    def __init__(self, streaming: bool = False):
+        """
+        初始化解析器
+        
+        Args:
+            streaming: 是否使用只读流式模式解析
+        """
+        self.streaming = streaming
         self.workbook = None
+        self.file_path = None
         self.sheet_names = []
         self.parsed_data = {
             'categories': [],  # 系统分类信息
@@ -51,9 +85,12 @@ class ContractExcelParser:
             if not Path(file_path).exists():
                 raise ExcelParseError(f"文件不存在: {file_path}")
             
-            # 使用openpyxl加载Excel文件
-            self.workbook = openpyxl.load_workbook(file_path, data_only=True)
+            # 使用openpyxl加载Excel文件（流式模式下以只读方式打开）
+            self.workbook = openpyxl.load_workbook(
+                file_path, read_only=self.streaming, data_only=True
+            )
             self.sheet_names = self.workbook.sheetnames
+            self.file_path = str(file_path)
             
             logger.info(f"成功加载Excel文件: {file_path}")
             logger.info(f"工作表列表: {self.sheet_names}")
@@ -75,12 +112,6 @@ class ContractExcelParser:
         Returns:
             int: 表头行号(从1开始)
         """
-        # 常见的表头关键词
-        header_keywords = [
-            '序号', '设备名称', '设备品牌', '设备型号', '品牌型号', '规格', '单位', '数量', '单价',
-            '综合单价', '合价', '总价', '金额', '备注', '原产地', '型号', '名称'
-        ]
-        
         for row_num in range(1, min(max_scan_rows + 1, worksheet.max_row + 1)):
             row_values = []
             for col in range(1, min(20, worksheet.max_column + 1)):  # 检查前20列
@@ -88,11 +119,7 @@ class ContractExcelParser:
                 if cell_value:
                     row_values.append(str(cell_value).strip())
             
-            # 检查这一行是否包含足够多的表头关键词
-            keyword_count = sum(1 for keyword in header_keywords 
-                              if any(keyword in value for value in row_values))
-            
-            if keyword_count >= 3:  # 至少包含3个关键词
+            if self._is_header_row(row_values):
                 logger.info(f"检测到表头在第 {row_num} 行: {row_values}")
                 return row_num
         
@@ -100,6 +127,20 @@ class ContractExcelParser:
         logger.warning("未能自动检测到表头，使用第1行作为表头")
         return 1
     
+    def _is_header_row(self, row_values: List[str]) -> bool:
+        """
+        判断一行是否为表头
+        
+        Args:
+            row_values: 该行前20列中非空单元格的文本
+            
+        Returns:
+            bool: 至少包含3个表头关键词时返回True
+        """
+        keyword_count = sum(1 for keyword in self.HEADER_KEYWORDS
+                            if any(keyword in value for value in row_values))
+        return keyword_count >= 3
+    
     def parse_sheet_data(self, sheet_name: str) -> Dict[str, Any]:
         """
         解析单个工作表的数据
@@ -118,33 +159,11 @@ class ContractExcelParser:
         
         worksheet = self.workbook[sheet_name]
         
-        # 检测表头行
-        header_row = self.detect_header_row(worksheet)
-        
-        # 直接从worksheet读取数据，转换为DataFrame
         try:
-            # 获取所有数据
-            data = []
-            headers = []
+            if self.streaming:
+                return self._parse_sheet_streaming(worksheet, sheet_name)
             
-            # 读取表头
-            for col in range(1, worksheet.max_column + 1):
-                header_cell = worksheet.cell(row=header_row, column=col)
-                headers.append(header_cell.value if header_cell.value else f'col_{col}')
-            
-            # 读取数据行
-            for row_num in range(header_row + 1, worksheet.max_row + 1):
-                row_data = []
-                has_data = False
-                
-                for col in range(1, worksheet.max_column + 1):
-                    cell_value = worksheet.cell(row=row_num, column=col).value
-                    row_data.append(cell_value)
-                    if cell_value is not None:
-                        has_data = True
-                
-                if has_data:  # 只添加有数据的行
-                    data.append(row_data)
+            header_row, headers, data = self._read_sheet(worksheet)
             
             # 创建DataFrame
             df = pd.DataFrame(data, columns=headers)
@@ -153,13 +172,15 @@ class ContractExcelParser:
             df = self._clean_dataframe(df)
             
             # 解析设备明细
-            items = self._parse_items_from_dataframe(df, sheet_name)
+            warnings: List[str] = []
+            items = self._parse_items_from_dataframe(df, sheet_name, warnings)
             
             return {
                 'sheet_name': sheet_name,
                 'header_row': header_row,
                 'total_rows': len(df),
                 'items': items,
+                'warnings': warnings,
                 'raw_data': df.to_dict('records') if len(df) < 1000 else None  # 大文件不返回原始数据
             }
             
@@ -167,6 +188,225 @@ class ContractExcelParser:
             logger.error(f"解析工作表 '{sheet_name}' 失败: {str(e)}")
             raise ExcelParseError(f"解析工作表 '{sheet_name}' 失败: {str(e)}")
     
+    def _read_sheet(self, worksheet) -> Tuple[int, List[Any], List[List[Any]]]:
+        """
+        按单元格随机访问读取工作表（默认模式）
+        
+        Args:
+            worksheet: 工作表对象
+            
+        Returns:
+            tuple: (表头行号, 表头列表, 有数据的行列表)
+        """
+        # 检测表头行
+        header_row = self.detect_header_row(worksheet)
+        
+        # 读取表头
+        headers = []
+        for col in range(1, worksheet.max_column + 1):
+            header_cell = worksheet.cell(row=header_row, column=col)
+            headers.append(header_cell.value if header_cell.value else f'col_{col}')
+        
+        # 读取数据行
+        data = []
+        for row_num in range(header_row + 1, worksheet.max_row + 1):
+            row_data = []
+            has_data = False
+            
+            for col in range(1, worksheet.max_column + 1):
+                cell_value = worksheet.cell(row=row_num, column=col).value
+                row_data.append(cell_value)
+                if cell_value is not None:
+                    has_data = True
+            
+            if has_data:  # 只添加有数据的行
+                data.append(row_data)
+        
+        return header_row, headers, data
+    
+    def _iter_sheet_batches_streaming(self, worksheet, batch_rows: Optional[int] = None,
+                                      max_scan_rows: int = 20):
+        """
+        逐行迭代读取只读工作表（流式模式），按固定行数分批返回数据行
+        
+        表头检测和数据读取在同一次遍历中完成，只缓存表头检测窗口内的前几行和当前一批数据行，
+        内存占用与工作表行数无关；只读工作表的行宽可能不一致，每批补齐到已读到的最大列数
+        
+        Args:
+            worksheet: 只读工作表对象
+            batch_rows: 每批的数据行数（默认 STREAMING_BATCH_ROWS）
+            max_scan_rows: 表头检测的最大扫描行数
+            
+        Yields:
+            tuple: (表头行号, 表头列表, 本批有数据的行列表)，空工作表也至少返回一批
+        """
+        batch_rows = batch_rows or STREAMING_BATCH_ROWS
+        
+        # 文件中记录的尺寸可能不准确，按实际单元格确定行列范围
+        worksheet.reset_dimensions()
+        
+        header_row = None
+        header_values: Tuple[Any, ...] = ()
+        scanned_rows = []  # 表头确定前缓存的行
+        batch = []
+        max_width = 0
+        batches = 0
+        
+        def make_batch():
+            headers = [
+                header_values[col - 1] if col <= len(header_values) and header_values[col - 1] else f'col_{col}'
+                for col in range(1, max_width + 1)
+            ]
+            for row_data in batch:
+                if len(row_data) < max_width:
+                    row_data.extend([None] * (max_width - len(row_data)))
+            return header_row, headers, batch
+        
+        for row_num, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+            max_width = max(max_width, len(row))
+            
+            if header_row is None:
+                row_values = [str(value).strip() for value in row[:19] if value]
+                if self._is_header_row(row_values):
+                    header_row = row_num
+                    header_values = row
+                    logger.info(f"检测到表头在第 {row_num} 行: {row_values}")
+                    scanned_rows = []
+                    continue
+                
+                scanned_rows.append(row)
+                if row_num < max_scan_rows:
+                    continue
+                
+                # 扫描窗口内未找到表头，使用第1行作为表头
+                logger.warning("未能自动检测到表头，使用第1行作为表头")
+                header_row = 1
+                header_values = scanned_rows[0]
+                rows = scanned_rows[1:]
+                scanned_rows = []
+            else:
+                rows = (row,)
+            
+            for data_row in rows:
+                if any(value is not None for value in data_row):  # 只添加有数据的行
+                    batch.append(list(data_row))
+            
+            if len(batch) >= batch_rows:
+                yield make_batch()
+                batches += 1
+                batch = []
+        
+        # 工作表行数少于扫描窗口且未找到表头
+        if header_row is None:
+            logger.warning("未能自动检测到表头，使用第1行作为表头")
+            header_row = 1
+            if scanned_rows:
+                header_values = scanned_rows[0]
+                batch = [list(r) for r in scanned_rows[1:] if any(v is not None for v in r)]
+        
+        if batch or not batches:
+            yield make_batch()
+    
+    def _parse_sheet_streaming(self, worksheet, sheet_name: str) -> Dict[str, Any]:
+        """
+        流式解析工作表：每批数据行单独构建DataFrame并转换为设备明细，行号按批次顺延
+        
+        Args:
+            worksheet: 只读工作表对象
+            sheet_name: 工作表名称
+            
+        Returns:
+            dict: 与 parse_sheet_data 默认模式相同结构的解析结果
+        """
+        header_row = None
+        total_rows = 0
+        items: List[Dict[str, Any]] = []
+        warnings: List[str] = []
+        raw_data = None
+        
+        # 各列按整张工作表确定类型，与默认模式整表构建DataFrame的结果一致，与分批方式无关
+        column_dtypes = self._sheet_column_dtypes(worksheet)
+        
+        for batch_index, (header_row, headers, rows) in enumerate(self._iter_sheet_batches_streaming(worksheet)):
+            df = self._clean_dataframe(self._build_batch_dataframe(rows, headers, column_dtypes))
+            df.index = df.index + total_rows
+            items.extend(self._parse_items_from_dataframe(df, sheet_name, warnings))
+            # 批大小大于1000行，不足1000行的工作表只有一批
+            raw_data = df.to_dict('records') if batch_index == 0 and len(df) < 1000 else None
+            total_rows += len(df)
+        
+        return {
+            'sheet_name': sheet_name,
+            'header_row': header_row,
+            'total_rows': total_rows,
+            'items': items,
+            'warnings': warnings,
+            'raw_data': raw_data
+        }
+    
+    def _sheet_column_dtypes(self, worksheet) -> List[Any]:
+        """
+        流式模式先遍历一次工作表，按整张工作表推断各列的类型
+        
+        与 pandas 按整张表构建DataFrame时的推断规则一致：各批推断类型相同时保持不变，
+        整数与浮点数合并为浮点数，其他混合类型为object；整数列有空值时为浮点数，布尔列有空值时为object
+        
+        Args:
+            worksheet: 只读工作表对象
+            
+        Returns:
+            list: 按列位置排列的类型
+        """
+        dtypes: Dict[int, Any] = {}  # 列位置 -> 非空值的类型
+        nullable = set()  # 有空值的列位置
+        batch_widths = []
+        
+        for _, headers, rows in self._iter_sheet_batches_streaming(worksheet):
+            if not rows:
+                continue
+            batch_widths.append(len(headers))
+            frame = pd.DataFrame(rows, columns=range(len(headers)))
+            
+            for position in frame.columns:
+                nulls = frame[position].isna()
+                if nulls.any():
+                    nullable.add(position)
+                if nulls.all():
+                    continue
+                
+                dtype = frame[position].dtype
+                previous = dtypes.get(position)
+                if previous is None or previous == dtype:
+                    dtypes[position] = dtype
+                elif previous.kind in 'iuf' and dtype.kind in 'iuf':
+                    dtypes[position] = np.dtype('float64')
+                else:
+                    dtypes[position] = np.dtype(object)
+        
+        width = max(batch_widths, default=0)
+        # 较早的批次行宽较窄时，这些行在后面的列上为空
+        nullable.update(range(min(batch_widths, default=0), width))
+        
+        column_dtypes = []
+        for position in range(width):
+            dtype = dtypes.get(position, np.dtype(object))
+            if position in nullable and dtype.kind in 'iu':
+                dtype = np.dtype('float64')
+            elif position in nullable and dtype.kind == 'b':
+                dtype = np.dtype(object)
+            column_dtypes.append(dtype)
+        return column_dtypes
+    
+    @staticmethod
+    def _build_batch_dataframe(rows: List[List[Any]], headers: List[Any], column_dtypes: List[Any]) -> pd.DataFrame:
+        """按整张工作表的列类型构建一批数据行的DataFrame"""
+        df = pd.DataFrame(rows, columns=range(len(headers)), dtype=object)
+        for position, dtype in enumerate(column_dtypes[:len(headers)]):
+            if dtype != np.dtype(object):
+                df[position] = df[position].astype(dtype)
+        df.columns = headers
+        return df
+    
     def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         清理DataFrame数据
@@ -254,209 +494,216 @@ class ContractExcelParser:
         # 如果没有匹配，返回原始列名的简化版本
         return col_str.replace(' ', '_').lower()
     
-    def _parse_items_from_dataframe(self, df: pd.DataFrame, sheet_name: str) -> List[Dict[str, Any]]:
+    def _parse_items_from_dataframe(self, df: pd.DataFrame, sheet_name: str,
+                                    warnings: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         从DataFrame中解析设备明细
         
+        按列批量完成取值清洗、数字转换、默认值填充、主材/辅材判定和总价计算，
+        最后一次性组装明细字典，避免逐行调用的开销
+        
         Args:
             df: 数据DataFrame
             sheet_name: 工作表名称
+            warnings: 用于收集逐行警告信息的列表（可选）
             
         Returns:
             list: 设备明细列表
         """
-        items = []
+        if warnings is None:
+            warnings = []
+        
+        if df.empty:
+            logger.info(f"从工作表 '{sheet_name}' 解析出 0 个设备明细")
+            return []
+        
+        # 与按行取值保持一致：混合类型的行会被统一转换为object
+        frame = pd.DataFrame(df.to_numpy(), index=df.index, columns=df.columns)
+        row_numbers = [index + 1 for index in frame.index]
+        
+        # 跳过空行：名称、品牌型号、数量都为空的行
+        has_content = pd.Series(False, index=frame.index)
+        for field in ('item_name', 'brand_model', 'quantity'):
+            if field in frame.columns:
+                has_content |= self._column_text(frame, field, '') != ''
+        
+        # 文本字段及默认值
+        serial_numbers = self._column_text(frame, 'serial_number', pd.Series(
+            [str(number) for number in row_numbers], index=frame.index
+        ))
+        item_names = self._column_text(frame, 'item_name', '')
+        brand_models = self._column_text(frame, 'brand_model', '')
+        specifications = self._column_text(frame, 'specification', '')
+        units = self._column_text(frame, 'unit', '台')
+        origin_places = self._column_text(frame, 'origin_place', '中国')
+        remarks = self._column_text(frame, 'remarks', '')
+        
+        # 数字字段
+        quantities = self._column_decimal(frame, 'quantity', has_content, row_numbers, warnings)
+        unit_prices = self._column_decimal(frame, 'unit_price', has_content, row_numbers, warnings)
+        total_prices = self._column_decimal(frame, 'total_price', has_content, row_numbers, warnings)
+        
+        item_types = self._column_item_type(frame, item_names)
         
-        for index, row in df.iterrows():
-            try:
-                # 跳过空行或无效行
-                if self._is_empty_row(row):
-                    continue
-                
-                # 构建设备明细数据
-                item = self._build_item_from_row(row, sheet_name, index + 1)
-                
-                if item:
-                    items.append(item)
-                    
-            except Exception as e:
-                logger.warning(f"解析第 {index + 1} 行数据失败: {str(e)}")
+        items = []
+        for (row_number, included, serial_number, item_name, brand_model, specification,
+             unit, quantity, unit_price, origin_place, item_type, remark, total_price) in zip(
+                row_numbers, has_content.tolist(), serial_numbers.tolist(), item_names.tolist(),
+                brand_models.tolist(), specifications.tolist(), units.tolist(), quantities,
+                unit_prices, origin_places.tolist(), item_types.tolist(), remarks.tolist(),
+                total_prices):
+            if not included:
                 continue
-        
-        logger.info(f"从工作表 '{sheet_name}' 解析出 {len(items)} 个设备明细")
-        return items
-    
-    def _is_empty_row(self, row: pd.Series) -> bool:
-        """
-        判断是否为空行
-        
-        Args:
-            row: 数据行
             
-        Returns:
-            bool: 是否为空行
-        """
-        # 检查重要字段是否为空
-        important_fields = ['item_name', 'brand_model', 'quantity']
-        
-        for field in important_fields:
-            try:
-                if field in row.index:
-                    value = row[field]
-                    if pd.notna(value):
-                        str_value = str(value).strip()
-                        if str_value:
-                            return False
-            except (KeyError, AttributeError):
+            # 验证必要字段
+            if not item_name:
+                warnings.append(f"第 {row_number} 行缺少设备名称，跳过")
+                continue
+            
+            if quantity is None or quantity.is_nan() or quantity <= 0:
+                warnings.append(f"第 {row_number} 行数量无效: {quantity}，跳过")
                 continue
-        
-        return True
-    
-    def _build_item_from_row(self, row: pd.Series, sheet_name: str, row_number: int) -> Optional[Dict[str, Any]]:
-        """
-        从数据行构建设备明细
-        
-        Args:
-            row: 数据行
-            sheet_name: 工作表名称
-            row_number: 行号
             
-        Returns:
-            dict: 设备明细数据
-        """
-        try:
-            # 提取基本信息
             item = {
-                'serial_number': self._safe_get_value(row, 'serial_number', str(row_number)),
-                'item_name': self._safe_get_value(row, 'item_name', '').strip(),
-                'brand_model': self._safe_get_value(row, 'brand_model', '').strip(),
-                'specification': self._safe_get_value(row, 'specification', '').strip(),
-                'unit': self._safe_get_value(row, 'unit', '台').strip(),
-                'quantity': self._parse_decimal(row, 'quantity'),
-                'unit_price': self._parse_decimal(row, 'unit_price'),
-                'origin_place': self._safe_get_value(row, 'origin_place', '中国').strip(),
-                'item_type': self._determine_item_type(row),
-                'remarks': self._safe_get_value(row, 'remarks', '').strip(),
+                'serial_number': serial_number,
+                'item_name': item_name,
+                'brand_model': brand_model,
+                'specification': specification,
+                'unit': unit,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'origin_place': origin_place,
+                'item_type': item_type,
+                'remarks': remark,
                 'excel_sheet_name': sheet_name,
                 'excel_row_number': row_number
             }
             
-            # 验证必要字段
-            if not item['item_name']:
-                logger.warning(f"第 {row_number} 行缺少设备名称，跳过")
-                return None
-            
-            if item['quantity'] is None or item['quantity'] <= 0:
-                logger.warning(f"第 {row_number} 行数量无效: {item['quantity']}，跳过")
-                return None
-            
-            # 计算总价
-            if item['unit_price'] is not None:
-                item['total_price'] = item['quantity'] * item['unit_price']
+            # 计算总价，没有单价时使用合价列
+            if unit_price is not None:
+                try:
+                    item['total_price'] = quantity * unit_price
+                except ArithmeticError as e:
+                    warnings.append(f"第 {row_number} 行总价计算失败: {str(e)}，跳过")
+                    continue
             else:
-                # 尝试从total_price列获取
-                item['total_price'] = self._parse_decimal(row, 'total_price')
-            
-            return item
+                item['total_price'] = total_price
             
-        except Exception as e:
-            logger.error(f"构建第 {row_number} 行设备明细失败: {str(e)}")
-            return None
+            items.append(item)
+        
+        if warnings:
+            logger.warning(f"工作表 '{sheet_name}' 有 {len(warnings)} 条解析警告:\n" + "\n".join(warnings))
+        
+        logger.info(f"从工作表 '{sheet_name}' 解析出 {len(items)} 个设备明细")
+        return items
     
-    def _safe_get_value(self, row: pd.Series, column: str, default: Any = None) -> Any:
+    def _column_text(self, frame: pd.DataFrame, column: str, default: Any = None) -> pd.Series:
         """
-        安全获取行数据
+        按列获取去除首尾空白的文本值
         
         Args:
-            row: 数据行
+            frame: 数据DataFrame
             column: 列名
-            default: 默认值
+            default: 列不存在或值为空时的默认值（标量或同索引的Series）
             
         Returns:
-            Any: 列值或默认值
+            Series: 文本列
         """
-        try:
-            if column in row.index and pd.notna(row[column]):
-                value = row[column]
-                # 将值转换为字符串并strip
-                if value is not None:
-                    return str(value).strip()
-                return value
-        except (KeyError, AttributeError):
-            pass
-        return default
+        text = pd.Series(default, index=frame.index, dtype=object)
+        if column not in frame.columns:
+            return text
+        
+        values = frame[column]
+        present = values.notna()
+        if present.any():
+            text[present] = values[present].map(str).str.strip()
+        return text
     
-    def _parse_decimal(self, row: pd.Series, column: str) -> Optional[Decimal]:
+    def _column_decimal(self, frame: pd.DataFrame, column: str, rows: pd.Series,
+                        row_numbers: List[int], warnings: List[str]) -> List[Optional[Decimal]]:
         """
-        解析数字字段
+        按列解析数字字段
+        
+        先批量清理金额字符串中的千分位和货币符号，再对去重后的值做Decimal转换
         
         Args:
-            row: 数据行
+            frame: 数据DataFrame
             column: 列名
+            rows: 需要解析的行（无法解析时记录警告）
+            row_numbers: Excel行号列表
+            warnings: 警告信息列表
             
         Returns:
-            Decimal: 解析后的数字或None
+            list: 解析后的数字列表，无法解析的值为None
         """
-        value = self._safe_get_value(row, column)
-        
-        if value is None:
-            return None
+        text = self._column_text(frame, column)
+        present = text.notna()
+        if not present.any():
+            return [None] * len(frame)
+        
+        cleaned = pd.Series(None, index=frame.index, dtype=object)
+        cleaned[present] = (
+            text[present]
+            .str.replace(',', '', regex=False)
+            .str.replace('￥', '', regex=False)
+            .str.replace('¥', '', regex=False)
+            .str.replace('元', '', regex=False)
+            .str.strip()
+        )
         
-        try:
-            # 清理数字字符串
-            if isinstance(value, str):
-                # 移除常见的非数字字符
-                value = value.replace(',', '').replace('￥', '').replace('¥', '').replace('元', '').strip()
-                if not value:
-                    return None
-            
-            return Decimal(str(value))
-            
-        except (ValueError, TypeError, Exception):
-            logger.warning(f"无法解析数字: {value}")
-            return None
+        parsed: Dict[str, Optional[Decimal]] = {}
+        invalid = set()
+        for value in cleaned[present].unique():
+            if not value:
+                parsed[value] = None
+                continue
+            try:
+                parsed[value] = Decimal(value)
+            except (ValueError, TypeError, ArithmeticError):
+                parsed[value] = None
+                invalid.add(value)
+        
+        result = []
+        for value, is_present, row_number, included in zip(
+                cleaned.tolist(), present.tolist(), row_numbers, rows.tolist()):
+            if not is_present:
+                result.append(None)
+                continue
+            if value in invalid and included:
+                warnings.append(f"第 {row_number} 行无法解析数字: {value}")
+            result.append(parsed[value])
+        return result
     
-    def _determine_item_type(self, row: pd.Series) -> str:
+    def _column_item_type(self, frame: pd.DataFrame, item_names: pd.Series) -> pd.Series:
         """
-        确定物料类型
+        按列确定物料类型（主材或辅材）
+        
+        有物料类型列且值有效时直接使用，否则按设备名称中的辅材关键词判断
         
         Args:
-            row: 数据行
+            frame: 数据DataFrame
+            item_names: 设备名称列
             
         Returns:
-            str: 物料类型（主材或辅材）
+            Series: 物料类型列
         """
-        # 如果有item_type列，直接使用
-        item_type = self._safe_get_value(row, 'item_type', '')
-        if item_type and str(item_type).strip() in ['主材', '辅材']:
-            return str(item_type).strip()
-        
-        # 根据设备名称判断
-        item_name = self._safe_get_value(row, 'item_name', '')
-        if not item_name:
-            return '主材'
-            
-        item_name_str = str(item_name).lower()
-        
-        # 辅材关键词
-        auxiliary_keywords = [
-            '线材', '电缆', '管材', '支架', '配件', '螺丝', '工具',
-            '安装', '调试', '维护', '辅助', '配套'
-        ]
-        
-        for keyword in auxiliary_keywords:
-            if keyword in item_name_str:
-                return '辅材'
-        
-        # 默认为主材
-        return '主材'
+        declared = self._column_text(frame, 'item_type', '')
+        is_auxiliary = item_names.str.lower().str.contains(AUXILIARY_PATTERN, regex=True)
+        inferred = is_auxiliary.map({True: '辅材', False: '主材'})
+        return declared.where(declared.isin(['主材', '辅材']), inferred)
     
-    def parse_all_sheets(self) -> Dict[str, Any]:
+    def parse_all_sheets(self, max_workers: Optional[int] = None,
+                         progress_callback: Optional[Callable[[str, Optional[Dict[str, Any]], Optional[str]], None]] = None
+                         ) -> Dict[str, Any]:
         """
         解析所有工作表
         
+        Args:
+            max_workers: 并行解析的最大进程数，为空或1时在当前进程中逐个解析
+            progress_callback: 每个工作表处理完成后的回调，参数为(工作表名称, 解析结果, 错误信息)
+        
         Returns:
-            dict: 解析结果
+            dict: 解析结果，明细和分类按工作表顺序合并
         """
         if not self.workbook:
             raise ExcelParseError("请先加载Excel文件")
@@ -473,11 +720,10 @@ class ContractExcelParser:
             }
         }
         
-        for sheet_name in self.sheet_names:
+        for sheet_name, sheet_result, parse_error in self._iter_sheet_results(max_workers):
             try:
-                logger.info(f"开始解析工作表: {sheet_name}")
-                
-                sheet_result = self.parse_sheet_data(sheet_name)
+                if parse_error is not None:
+                    raise parse_error
                 
                 # 创建系统分类
                 category = {
@@ -511,6 +757,12 @@ class ContractExcelParser:
                 error_msg = f"解析工作表 '{sheet_name}' 失败: {str(e)}"
                 logger.error(error_msg)
                 all_results['summary']['parse_errors'].append(error_msg)
+                
+                if progress_callback:
+                    progress_callback(sheet_name, None, error_msg)
+            else:
+                if progress_callback:
+                    progress_callback(sheet_name, sheet_result, None)
         
         # 计算总金额
         all_results['summary']['total_amount'] = sum(
@@ -523,6 +775,45 @@ class ContractExcelParser:
         
         return all_results
     
+    def _iter_sheet_results(self, max_workers: Optional[int] = None):
+        """
+        按工作表顺序产出解析结果
+        
+        多个工作表且max_workers大于1时，使用有界进程池并行解析，
+        每个子进程独立打开文件只解析一个工作表
+        
+        Args:
+            max_workers: 最大进程数
+            
+        Yields:
+            tuple: (工作表名称, 解析结果, 解析异常)
+        """
+        workers = min(max_workers or 1, len(self.sheet_names))
+        
+        if workers <= 1 or not self.file_path:
+            for sheet_name in self.sheet_names:
+                logger.info(f"开始解析工作表: {sheet_name}")
+                try:
+                    yield sheet_name, self.parse_sheet_data(sheet_name), None
+                except Exception as e:
+                    yield sheet_name, None, e
+            return
+        
+        logger.info(f"使用 {workers} 个进程并行解析 {len(self.sheet_names)} 个工作表")
+        
+        # 使用spawn启动子进程，避免在多线程的Web进程中fork
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_parse_sheet_in_process, self.file_path, sheet_name, self.streaming)
+                for sheet_name in self.sheet_names
+            ]
+            for sheet_name, future in zip(self.sheet_names, futures):
+                try:
+                    yield sheet_name, future.result(), None
+                except Exception as e:
+                    yield sheet_name, None, e
+    
     def _generate_category_code(self, sheet_name: str) -> str:
         """
         生成系统分类编码
@@ -533,9 +824,6 @@ class ContractExcelParser:
         Returns:
             str: 系统分类编码
         """
-        # 简单的编码生成逻辑，可以根据需要改进
-        import re
-        
         # 移除特殊字符，保留中英文和数字
         clean_name = re.sub(r'[^\w\u4e00-\u9fff]', '', sheet_name)
         
@@ -559,21 +847,43 @@ class ContractExcelParser:
             self.workbook.close()
             self.workbook = None
 
+def _parse_sheet_in_process(file_path: str, sheet_name: str, streaming: bool) -> Dict[str, Any]:
+    """
+    在子进程中解析单个工作表
+    
+    Args:
+        file_path: Excel文件路径
+        sheet_name: 工作表名称
+        streaming: 是否使用只读流式模式解析
+        
+    Returns:
+        dict: 该工作表的解析结果
+    """
+    parser = ContractExcelParser(streaming=streaming)
+    try:
+        parser.load_excel_file(file_path)
+        return parser.parse_sheet_data(sheet_name)
+    finally:
+        parser.close()
+
 # 便捷函数
-def parse_contract_excel(file_path: str) -> Dict[str, Any]:
+def parse_contract_excel(file_path: str, streaming: bool = False,
+                         max_workers: Optional[int] = None) -> Dict[str, Any]:
     """
     解析合同清单Excel文件的便捷函数
     
     Args:
         file_path: Excel文件路径
+        streaming: 是否使用只读流式模式解析
+        max_workers: 并行解析工作表的最大进程数，为空或1时顺序解析
         
     Returns:
         dict: 解析结果
     """
-    parser = ContractExcelParser()
+    parser = ContractExcelParser(streaming=streaming)
     try:
         parser.load_excel_file(file_path)
-        return parser.parse_all_sheets()
+        return parser.parse_all_sheets(max_workers=max_workers)
     finally:
         parser.close()
 
@@ -0,0 +1,152 @@
+# backend/app/utils/pagination.py
+"""
+列表接口分页工具
+
+支持两种分页方式：
+- 页码分页（默认）：page/size，兼容现有前端
+- 游标分页（可选）：传入 cursor 参数（第一页传空字符串），按稳定排序键取"上一页最后一行之后"的数据，
+  返回 next_cursor 供下一页使用；深翻页与第一页的代价相同，适合滚动加载和导出
+
+总数统计可选：exact 精确统计，estimate 最多统计到上限（超过上限时返回上限并标记为估算），none 不统计
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query
+
+from app.core.config import settings
+
+# 总数统计方式
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把排序键的值编码为不透明的游标字符串"""
+    payload = []
+    for value in values:
+        if isinstance(value, datetime):
+            payload.append({"dt": value.isoformat()})
+        elif isinstance(value, date):
+            payload.append({"d": value.isoformat()})
+        elif isinstance(value, Decimal):
+            payload.append({"dec": str(value)})
+        else:
+            payload.append(value)
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, expected_length: int) -> List[Any]:
+    """
+    解析游标字符串
+
+    Raises:
+        HTTPException: 游标格式不正确（400）
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        if not isinstance(payload, list) or len(payload) != expected_length:
+            raise ValueError("游标长度与排序键不匹配")
+
+        values = []
+        for value in payload:
+            if isinstance(value, dict) and "dt" in value:
+                values.append(datetime.fromisoformat(value["dt"]))
+            elif isinstance(value, dict) and "d" in value:
+                values.append(date.fromisoformat(value["d"]))
+            elif isinstance(value, dict) and "dec" in value:
+                values.append(Decimal(value["dec"]))
+            else:
+                values.append(value)
+        return values
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"无效的分页游标: {str(e)}")
+
+
+def _after_cursor(order_by: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    """排序键大于（降序列为小于）游标值的条件：(a, b) > (x, y) 展开为 a > x OR (a = x AND b > y)"""
+    clauses = []
+    for index, (column, descending) in enumerate(order_by):
+        equal_prefix = [prefix_column == value for (prefix_column, _), value in zip(order_by[:index], values)]
+        beyond = column < values[index] if descending else column > values[index]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def count_rows(query: Query, count: str) -> Tuple[Optional[int], bool]:
+    """
+    按统计方式计算总数
+
+    Returns:
+        tuple: (总数，不统计时为None；是否为估算值)
+    """
+    if count == "none":
+        return None, False
+
+    query = query.order_by(None)
+    if count == "exact":
+        return query.count(), False
+
+    cap = settings.pagination_count_estimate_cap
+    capped = query.session.query(func.count()).select_from(query.limit(cap + 1).subquery()).scalar()
+    return min(capped, cap), capped > cap
+
+
+def paginate(query: Query, order_by: Sequence[Tuple[Any, bool]], size: int, page: int = 1,
+             cursor: Optional[str] = None, count: str = "exact", preserve_order: bool = False) -> Dict[str, Any]:
+    """
+    分页查询
+
+    Args:
+        query: 已应用筛选条件的查询
+        order_by: 稳定排序键 [(列, 是否降序)]，最后一列必须唯一（通常为主键），各列不能为空
+        size: 每页数量
+        page: 页码（游标分页时忽略）
+        cursor: 游标，None 表示页码分页，空字符串表示游标分页的第一页
+        count: 总数统计方式 exact/estimate/none
+        preserve_order: 页码分页时保留查询已有的排序（如搜索相关度），游标分页总是按 order_by 排序
+
+    Returns:
+        Dict: items、total、page、size、pages、next_cursor、total_is_estimate
+    """
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count 参数只能是 {'/'.join(COUNT_MODES)}")
+
+    total, total_is_estimate = count_rows(query, count)
+
+    if cursor is None and preserve_order:
+        ordered = query
+    else:
+        ordered = query.order_by(None).order_by(
+            *(column.desc() if descending else column.asc() for column, descending in order_by)
+        )
+
+    if cursor is None:
+        items = ordered.offset((page - 1) * size).limit(size).all()
+        next_cursor = None
+    else:
+        if cursor:
+            ordered = ordered.filter(_after_cursor(order_by, decode_cursor(cursor, len(order_by))))
+        rows = ordered.limit(size + 1).all()
+        items = rows[:size]
+        next_cursor = None
+        if len(rows) > size:
+            last = items[-1]
+            next_cursor = encode_cursor([getattr(last, column.key) for column, _ in order_by])
+
+    return {
+        "items": items,
+        "total": total,
+        "page": page if cursor is None else None,
+        "size": size,
+        "pages": (total + size - 1) // size if total is not None else None,
+        "next_cursor": next_cursor,
+        "total_is_estimate": total_is_estimate
+    }
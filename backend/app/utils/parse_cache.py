@@ -0,0 +1,126 @@
+# backend/app/utils/parse_cache.py
+"""
+合同清单解析结果缓存
+
+以上传文件的内容哈希和解析器版本为键，把解析结果保存在磁盘上，
+同一份Excel文件重复上传时直接取回解析结果，跳过整个解析过程
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.utils.excel_parser import PARSER_VERSION
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 计算哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_hash(file_path: str) -> str:
+    """
+    计算文件内容的SHA-256哈希
+
+    Args:
+        file_path: 文件路径
+
+    Returns:
+        str: 十六进制哈希字符串
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ContractParseCache:
+    """
+    解析结果磁盘缓存
+
+    缓存文件名为 {文件哈希}_v{解析器版本}.pkl，解析器版本变化后旧缓存失效，在下次写入时删除；
+    最多保留 max_entries 个缓存文件，超出时按最近使用时间删除最旧的（命中时更新文件修改时间）；
+    缓存只由服务端写入，读取失败（损坏、版本不兼容）时视为未命中
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 200):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+
+    def _cache_path(self, file_hash: str) -> Path:
+        return self.cache_dir / f"{file_hash}_v{PARSER_VERSION}.pkl"
+
+    def get(self, file_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的解析结果
+
+        Args:
+            file_hash: 文件内容哈希
+
+        Returns:
+            Optional[Dict]: 解析结果，未命中时返回None
+        """
+        cache_path = self._cache_path(file_hash)
+        if self.max_entries <= 0 or not cache_path.exists():
+            return None
+
+        try:
+            with open(cache_path, "rb") as f:
+                parsed_result = pickle.load(f)
+            os.utime(cache_path)
+            return parsed_result
+        except Exception as e:
+            logger.warning(f"读取解析缓存失败，将重新解析: {cache_path}: {str(e)}")
+            return None
+
+    def set(self, file_hash: str, parsed_result: Dict[str, Any]) -> None:
+        """
+        保存解析结果（先写临时文件再原子替换，避免并发读到半个文件）
+
+        Args:
+            file_hash: 文件内容哈希
+            parsed_result: 解析结果
+        """
+        if self.max_entries <= 0:
+            return
+
+        tmp_path = self.cache_dir / f".{uuid.uuid4().hex}.tmp"
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(parsed_result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._cache_path(file_hash))
+        except Exception as e:
+            logger.warning(f"保存解析缓存失败: {str(e)}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return
+
+        self._prune()
+
+    def _prune(self) -> None:
+        """删除其他解析器版本的缓存，以及超出 max_entries 的最久未使用的缓存"""
+        current = []
+        for cache_path in self.cache_dir.glob("*_v*.pkl"):
+            try:
+                if cache_path.name.endswith(f"_v{PARSER_VERSION}.pkl"):
+                    current.append((cache_path.stat().st_mtime, cache_path))
+                else:
+                    cache_path.unlink()
+            except OSError:
+                pass  # 已被并发写入的其他进程删除
+
+        current.sort(reverse=True)
+        for _, cache_path in current[self.max_entries:]:
+            try:
+                cache_path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,120 @@
+"""
+异步数据库会话单元测试
+
+验证异步驱动URL的选择、热点读接口在同步会话（线程池）和 AsyncSession（aiosqlite）下返回相同结果
+"""
+
+import asyncio
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1.purchases import get_purchase_request, get_purchase_requests
+from app.core.config import Settings
+from app.core.database import Base, run_in_session
+from app.models.project import Project
+from app.models.purchase import PurchaseRequest, PurchaseRequestItem, PurchaseStatus
+from app.models.user import User, UserRole
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    """创建含一个项目和两张申购单的临时数据库，返回数据库文件路径"""
+    path = tmp_path / "async.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    project = Project(project_code="P001", project_name="异步项目", contract_amount=1000, project_manager="测试")
+    requester = User(username="pm", password_hash="x", name="项目经理", role=UserRole.PROJECT_MANAGER)
+    session.add_all([project, requester, User(username="admin", password_hash="x", name="管理员", role=UserRole.ADMIN)])
+    session.flush()
+    for index in range(2):
+        request = PurchaseRequest(
+            request_code=f"PR2025030100{index + 1:02d}", project_id=project.id,
+            requester_id=requester.id, status=PurchaseStatus.DRAFT
+        )
+        request.items = [PurchaseRequestItem(item_name="网线", unit="箱", quantity=Decimal(3), item_type="auxiliary")]
+        session.add(request)
+    session.commit()
+    session.close()
+    engine.dispose()
+    return path
+
+
+def _read_views(db, admin):
+    """通过接口读取申购单列表和第一张申购单详情"""
+    async def read():
+        listing = await get_purchase_requests(
+            page=1, size=10, project_id=None, status=None, requester_id=None, search=None,
+            cursor=None, count="exact", db=db, current_user=admin
+        )
+        detail = await get_purchase_request(listing["items"][0]["id"], db=db, current_user=admin)
+        return listing, detail
+    return read
+
+
+class TestAsyncDatabase:
+    """异步数据库会话测试类"""
+
+    def test_async_url_follows_driver(self):
+        """测试按 database_driver 选择 aiosqlite 或 asyncpg"""
+        print("\n🔌 测试异步驱动URL...")
+
+        sqlite_settings = Settings(SECRET_KEY="t", database_url="sqlite:///./erp.db")
+        assert sqlite_settings.effective_async_database_url == "sqlite+aiosqlite:///./erp.db"
+
+        postgres_settings = Settings(
+            SECRET_KEY="t", database_driver="postgresql", postgres_password="pw", postgres_db="erp"
+        )
+        assert postgres_settings.effective_async_database_url == "postgresql+asyncpg://erp_user:pw@localhost:5432/erp"
+        print("   ✅ 异步驱动URL正确")
+
+    def test_sync_session_runs_in_threadpool(self, database_path):
+        """测试未开启异步引擎时，同步会话上的查询放到线程池执行"""
+        print("\n🧵 测试同步会话...")
+
+        engine = create_engine(f"sqlite:///{database_path}", connect_args={"check_same_thread": False})
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        admin = db.query(User).filter(User.username == "admin").one()
+        try:
+            listing, detail = asyncio.run(_read_views(db, admin)())
+        finally:
+            db.close()
+            engine.dispose()
+
+        assert listing["total"] == 2
+        assert (detail["request_code"], detail["project_name"]) == ("PR202503010001", "异步项目")
+        print("   ✅ 同步会话查询正确")
+
+    def test_async_session_matches_sync(self, database_path):
+        """测试 AsyncSession 通过 run_sync 复用同步查询代码，结果与同步会话一致"""
+        print("\n⚡ 测试异步会话...")
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async def read():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+            try:
+                async with async_sessionmaker(engine, autoflush=False)() as db:
+                    admin = await run_in_session(db, lambda session: session.query(User).filter(User.username == "admin").one())
+                    return await _read_views(db, admin)()
+            finally:
+                await engine.dispose()
+
+        listing, detail = asyncio.run(read())
+
+        engine = create_engine(f"sqlite:///{database_path}", connect_args={"check_same_thread": False})
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        admin = db.query(User).filter(User.username == "admin").one()
+        try:
+            assert (listing, detail) == asyncio.run(_read_views(db, admin)())
+        finally:
+            db.close()
+            engine.dispose()
+        print("   ✅ 异步会话结果与同步会话一致")
@@ -0,0 +1,359 @@
+"""
+合同清单异步导入任务单元测试
+
+验证后台导入任务的状态流转、按工作表记录的进度以及最终结果
+"""
+
+import io
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import openpyxl
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.project import Project
+from app.models.contract import (
+    ContractImportJob, ContractItem, ContractFileVersion, SystemCategory, VersionedContractItem
+)
+from app.services import contract_import_service
+from app.services.contract_import_service import ContractImportService, run_contract_import_job
+from app.utils.excel_parser import ContractExcelParser
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """基于临时SQLite文件的会话工厂，后台任务与测试共用同一个数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'import_job.db'}", echo=False)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(contract_import_service, "SessionLocal", factory)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def project_id(session_factory):
+    db = session_factory()
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="导入任务测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+    project_id = project.id
+    db.close()
+    return project_id
+
+
+def _write_workbook(path):
+    workbook = openpyxl.Workbook()
+    video = workbook.active
+    video.title = "视频监控"
+    video.append(["序号", "设备名称", "设备型号", "单位", "数量", "综合单价"])
+    video.append([1, "网络摄像机", "DS-2CD", "台", 10, 1200])
+    video.append([2, "硬盘录像机", "DS-7816", "台", 2, 5000])
+
+    access = workbook.create_sheet("门禁")
+    access.append(["名称", "型号", "数量"])
+    access.append(["门禁控制器", "AC-1", 4])
+    workbook.save(path)
+    return str(path)
+
+
+class TestContractImportJob:
+    """异步导入任务测试类"""
+
+    def test_job_records_progress_and_result(self, session_factory, project_id, tmp_path):
+        """测试导入任务完成后记录进度、版本和上传结果"""
+        print("\n📥 测试异步导入任务...")
+
+        file_path = _write_workbook(tmp_path / "contract.xlsx")
+        db = session_factory()
+        job = ContractImportService(db).create_import_job(
+            project_id=project_id,
+            file_path=file_path,
+            original_filename="contract.xlsx",
+            upload_user_name="测试用户"
+        )
+        assert job.status == "pending"
+        job_id = job.job_id
+        db.close()
+
+        run_contract_import_job(job_id)
+
+        db = session_factory()
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == job_id).first()
+        status = job.to_dict()
+
+        assert status["status"] == "completed"
+        assert status["total_sheets"] == 2
+        assert status["parsed_sheets"] == 2
+        assert status["rows_parsed"] == 3
+        assert status["rows_inserted"] == 3
+        assert [(s["sheet_name"], s["status"], s["items_inserted"]) for s in status["sheet_progress"]] == [
+            ("视频监控", "imported", 2),
+            ("门禁", "imported", 1),
+        ]
+        assert status["start_time"] and status["end_time"]
+        assert job.result["success"] is True
+        assert job.result["version_id"] == job.version_id
+        assert db.query(ContractItem).filter(ContractItem.version_id == job.version_id).count() == 3
+        db.close()
+        print("   ✅ 任务进度和结果记录正确")
+
+    def test_job_failure_is_recorded(self, session_factory, project_id, tmp_path):
+        """测试无法解析的文件使任务失败并记录错误"""
+        print("\n❌ 测试导入任务失败...")
+
+        file_path = tmp_path / "broken.xlsx"
+        file_path.write_bytes(b"not an excel file")
+
+        db = session_factory()
+        job = ContractImportService(db).create_import_job(
+            project_id=project_id,
+            file_path=str(file_path),
+            original_filename="broken.xlsx",
+            upload_user_name="测试用户"
+        )
+        job_id = job.job_id
+        db.close()
+
+        run_contract_import_job(job_id)
+
+        db = session_factory()
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == job_id).first()
+        assert job.status == "failed"
+        assert job.result["success"] is False
+        assert job.errors
+        assert db.query(ContractFileVersion).filter(ContractFileVersion.project_id == project_id).count() == 0
+        assert not file_path.exists()
+        db.close()
+        print("   ✅ 失败状态记录正确")
+
+    def test_chunked_bulk_import(self, session_factory, project_id, tmp_path, monkeypatch):
+        """测试按块批量写入明细，总价计算正确，导入完成后才切换当前版本，内容相同的明细由新版本直接引用"""
+        print("\n📦 测试分块批量导入...")
+        monkeypatch.setattr(contract_import_service.settings, "contract_import_chunk_size", 2)
+
+        first_path = _write_workbook(tmp_path / "first.xlsx")
+        second_path = _write_workbook(tmp_path / "second.xlsx")
+
+        db = session_factory()
+        service = ContractImportService(db)
+        first = service.import_contract_file(project_id, first_path, "first.xlsx", "测试用户")
+        second = service.import_contract_file(project_id, second_path, "second.xlsx", "测试用户")
+        assert first.success and second.success
+        assert second.parsed_data["imported_items"] == 3
+
+        versions = db.query(ContractFileVersion).filter(
+            ContractFileVersion.project_id == project_id
+        ).order_by(ContractFileVersion.version_number).all()
+        assert [(v.version_number, v.is_current) for v in versions] == [(1, False), (2, True)]
+
+        items = db.query(VersionedContractItem).filter(
+            VersionedContractItem.version_id == second.version_id
+        ).order_by(VersionedContractItem.id).all()
+        assert [float(item.total_price) if item.total_price is not None else None for item in items] == [12000.0, 10000.0, None]
+        assert all(item.category_id is not None and item.is_active for item in items)
+
+        # 非增量导入同样不复制未变化的明细行，也不返回差异报告
+        assert [item.id for item in items] == [
+            item.id for item in db.query(ContractItem).filter(ContractItem.version_id == first.version_id).order_by(ContractItem.id)
+        ]
+        assert db.query(ContractItem).filter(ContractItem.project_id == project_id).count() == 3
+        assert second.parsed_data["incremental"] is None
+        db.close()
+        print("   ✅ 分块导入结果正确")
+
+    def test_failed_chunk_discards_partial_version(self, session_factory, project_id, tmp_path, monkeypatch):
+        """测试中途写入失败时清理已提交的分类和明细"""
+        print("\n🧹 测试导入失败清理...")
+        monkeypatch.setattr(contract_import_service.settings, "contract_import_chunk_size", 1)
+
+        db = session_factory()
+        original_execute = db.execute
+        item_chunks = []
+
+        def failing_execute(statement, *args, **kwargs):
+            # 第三个明细数据块写入时失败（此时前两块已经提交）
+            if args and isinstance(args[0], list) and "contract_items" in str(statement):
+                item_chunks.append(args[0])
+                if len(item_chunks) == 3:
+                    raise RuntimeError("数据库写入失败")
+            return original_execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(db, "execute", failing_execute)
+
+        file_path = _write_workbook(tmp_path / "contract.xlsx")
+        response = ContractImportService(db).import_contract_file(project_id, file_path, "contract.xlsx", "测试用户")
+
+        assert response.success is False
+        assert db.query(ContractFileVersion).filter(ContractFileVersion.project_id == project_id).count() == 0
+        assert db.query(ContractItem).filter(ContractItem.project_id == project_id).count() == 0
+        assert db.query(SystemCategory).filter(SystemCategory.project_id == project_id).count() == 0
+        db.close()
+        print("   ✅ 不完整版本已清理")
+
+    def test_repeat_upload_uses_parse_cache(self, session_factory, project_id, tmp_path, monkeypatch):
+        """测试相同内容的文件再次导入时使用解析缓存，不再解析Excel"""
+        print("\n🗂️ 测试解析缓存...")
+
+        file_path = _write_workbook(tmp_path / "contract.xlsx")
+        db = session_factory()
+        service = ContractImportService(db)
+        first = service.import_contract_file(project_id, file_path, "contract.xlsx", "测试用户")
+
+        def fail_load(self, path):
+            raise AssertionError("命中缓存时不应重新解析")
+
+        monkeypatch.setattr(ContractExcelParser, "load_excel_file", fail_load)
+        job = service.create_import_job(project_id, file_path, "contract.xlsx", "测试用户")
+        second = service.import_contract_file(project_id, file_path, "contract.xlsx", "测试用户", job=job)
+
+        assert first.success and second.success
+        assert second.parsed_data == first.parsed_data
+        assert job.parsed_sheets == 2 and job.rows_inserted == 3
+        db.close()
+        print("   ✅ 重复上传跳过解析")
+
+    def test_parse_cache_is_bounded(self, tmp_path):
+        """测试解析缓存写入时删除其他解析器版本的文件，并只保留最近使用的 max_entries 个"""
+        print("\n🧽 测试解析缓存清理...")
+        from app.utils.excel_parser import PARSER_VERSION
+        from app.utils.parse_cache import ContractParseCache
+
+        cache_dir = tmp_path / "parse_cache"
+        cache_dir.mkdir()
+        (cache_dir / "old_v0.pkl").write_bytes(b"stale")
+        cache = ContractParseCache(str(cache_dir), max_entries=2)
+
+        for index, file_hash in enumerate(("a", "b", "c")):
+            cache.set(file_hash, {"index": index})
+            os.utime(cache_dir / f"{file_hash}_v{PARSER_VERSION}.pkl", (index, index))
+            if file_hash == "b":
+                assert cache.get("a") == {"index": 0}  # 命中后 a 成为最近使用的
+
+        assert sorted(os.listdir(cache_dir)) == [f"a_v{PARSER_VERSION}.pkl", f"c_v{PARSER_VERSION}.pkl"]
+
+        disabled = ContractParseCache(str(cache_dir), max_entries=0)
+        disabled.set("d", {"index": 3})
+        assert disabled.get("a") is None and not (cache_dir / f"d_v{PARSER_VERSION}.pkl").exists()
+        print("   ✅ 解析缓存数量受限")
+
+    def test_identical_uploads_stored_once(self, tmp_path, monkeypatch):
+        """测试相同内容的上传文件按哈希只保存一份"""
+        print("\n🔐 测试上传文件去重...")
+        from fastapi import UploadFile
+        from app.api.v1 import file_upload
+
+        monkeypatch.setattr(file_upload, "UPLOAD_DIR", tmp_path)
+        content = Path(_write_workbook(tmp_path / "source.xlsx")).read_bytes()
+
+        first_path, first_hash = file_upload.save_uploaded_file(
+            UploadFile(file=io.BytesIO(content), filename="a.xlsx"), 1)
+        second_path, second_hash = file_upload.save_uploaded_file(
+            UploadFile(file=io.BytesIO(content), filename="b.XLSX"), 2)
+
+        assert first_path == second_path
+        assert first_hash == second_hash
+        assert os.path.basename(first_path) == f"contract_{first_hash}.xlsx"
+        assert sorted(os.listdir(tmp_path)) == sorted(["source.xlsx", os.path.basename(first_path)])
+        print("   ✅ 相同文件只保存一份")
+
+    def test_job_reuses_upload_hash(self, session_factory, project_id, tmp_path, monkeypatch):
+        """测试导入任务保存上传时计算的文件哈希，后台导入不再重新计算"""
+        print("\n#️⃣ 测试任务复用文件哈希...")
+        from fastapi import BackgroundTasks, UploadFile
+        from app.api.v1 import file_upload
+
+        monkeypatch.setattr(file_upload, "UPLOAD_DIR", tmp_path / "uploads")
+        (tmp_path / "uploads").mkdir()
+        content = Path(_write_workbook(tmp_path / "source.xlsx")).read_bytes()
+
+        db = session_factory()
+        background_tasks = BackgroundTasks()
+        response = file_upload.create_contract_import_job(
+            project_id, background_tasks, UploadFile(file=io.BytesIO(content), filename="contract.xlsx"),
+            upload_reason=None, change_description=None, incremental=False,
+            db=db, current_user=type("CurrentUser", (), {"name": "测试用户"})()
+        )
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == response["job_id"]).one()
+        assert job.file_hash and os.path.basename(job.stored_file_path) == f"contract_{job.file_hash}.xlsx"
+        db.close()
+
+        def fail_hash(path):
+            raise AssertionError("导入任务应复用上传时的文件哈希")
+
+        monkeypatch.setattr(contract_import_service, "compute_file_hash", fail_hash)
+        run_contract_import_job(response["job_id"])
+
+        db = session_factory()
+        job = db.query(ContractImportJob).filter(ContractImportJob.job_id == response["job_id"]).one()
+        assert job.status == "completed"
+        db.close()
+        print("   ✅ 任务复用上传时的哈希")
+
+    def test_incremental_import_writes_only_changes(self, session_factory, project_id, tmp_path):
+        """测试增量导入：未变化的明细由新版本直接引用，只写入新增和变化的明细，并返回差异报告"""
+        print("\n🔁 测试增量导入...")
+
+        db = session_factory()
+        service = ContractImportService(db)
+        first = service.import_contract_file(project_id, _write_workbook(tmp_path / "v1.xlsx"), "v1.xlsx", "测试用户")
+
+        # 手工标记的关键设备在新版本中应保留
+        camera = db.query(ContractItem).filter(
+            ContractItem.version_id == first.version_id, ContractItem.item_name == "网络摄像机"
+        ).one()
+        camera.is_key_equipment = True
+        db.commit()
+
+        workbook = openpyxl.Workbook()
+        video = workbook.active
+        video.title = "视频监控"
+        video.append(["序号", "设备名称", "设备型号", "单位", "数量", "综合单价"])
+        video.append([1, "网络摄像机", "DS-2CD", "台", 10, 1200])
+        video.append([2, "硬盘录像机", "DS-7816", "台", 3, 5000])
+        video.append([3, "交换机", "S5700", "台", 1, 800])
+        workbook.create_sheet("门禁").append(["名称", "型号", "数量"])
+        second_path = tmp_path / "v2.xlsx"
+        workbook.save(second_path)
+
+        second = service.import_contract_file(project_id, str(second_path), "v2.xlsx", "测试用户", incremental=True)
+        assert second.success
+
+        report = second.parsed_data["incremental"]
+        assert report["base_version_id"] == first.version_id
+        assert report["summary"] == {"added": 1, "changed": 1, "removed": 1, "unchanged": 1}
+        assert report["added"][0]["item_name"] == "交换机"
+        assert report["changed"][0]["changes"] == {"quantity": {"old": 2.0, "new": 3.0}}
+        assert report["removed"][0]["item_name"] == "门禁控制器"
+
+        items = {
+            item.item_name: item
+            for item in db.query(VersionedContractItem).filter(VersionedContractItem.version_id == second.version_id)
+        }
+        assert sorted(items) == ["交换机", "硬盘录像机", "网络摄像机"]
+        assert items["网络摄像机"].id == camera.id
+        assert items["网络摄像机"].is_key_equipment is True
+        assert items["网络摄像机"].category_id == items["交换机"].category_id
+        assert items["网络摄像机"].origin_version_id == first.version_id
+        assert float(items["硬盘录像机"].quantity) == 3.0
+        assert items["硬盘录像机"].original_item_id is not None
+        assert items["交换机"].original_item_id is None
+
+        # 明细表只增加了新增和变化的两行
+        assert db.query(ContractItem).filter(ContractItem.project_id == project_id).count() == 5
+        db.close()
+        print("   ✅ 增量导入差异正确")
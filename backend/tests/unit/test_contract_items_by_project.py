@@ -0,0 +1,110 @@
+"""
+合同清单物料查询（by-project）单元测试
+
+验证字段选择、输出格式与 ContractItem.to_dict 一致，以及 ndjson/json 流式输出
+"""
+
+import json
+import os
+import sys
+import uuid
+
+import openpyxl
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1.purchase_query import _item_row_to_dict, _parse_item_fields, _stream_items
+from app.core.database import Base
+from app.models.project import Project
+from app.models.contract import ContractItem, VersionedContractItem
+from app.services import contract_import_service
+from app.services.contract_import_service import ContractImportService
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def version_id(db, tmp_path):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="物料查询测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "视频监控"
+    sheet.append(["序号", "设备名称", "设备品牌", "单位", "数量", "综合单价"])
+    for index in range(25):
+        sheet.append([index + 1, f"监控相机{index}", "海康威视", "台", index + 1, 1200])
+    workbook.save(tmp_path / "contract.xlsx")
+
+    response = ContractImportService(db).import_contract_file(
+        project.id, str(tmp_path / "contract.xlsx"), "contract.xlsx", "测试用户"
+    )
+    assert response.success
+    return response.version_id
+
+
+def _query(db, version_id, fields):
+    columns = [VersionedContractItem.id] + [getattr(VersionedContractItem, field) for field in fields if field != "id"]
+    return db.query(*columns).filter(VersionedContractItem.version_id == version_id).order_by(VersionedContractItem.id)
+
+
+class TestContractItemsByProject:
+    """合同清单物料查询测试类"""
+
+    def test_parse_fields(self):
+        """测试字段参数解析"""
+        print("\n🧾 测试字段选择...")
+
+        assert _parse_item_fields(None)[0] == "id"
+        assert _parse_item_fields("item_name, id,item_name") == ["item_name", "id"]
+        with pytest.raises(HTTPException) as exc_info:
+            _parse_item_fields("item_name,password")
+        assert exc_info.value.status_code == 400
+        print("   ✅ 字段选择解析正确")
+
+    def test_row_format_matches_to_dict(self, db, version_id):
+        """测试按列查询的输出与 ContractItem.to_dict 一致"""
+        print("\n🔍 测试输出格式...")
+
+        fields = _parse_item_fields(None)
+        row = _query(db, version_id, fields).first()
+        item = db.get(ContractItem, row.id)
+
+        assert _item_row_to_dict(row, fields) == {
+            key: value for key, value in item.to_dict().items() if key in fields
+        }
+        print("   ✅ 输出格式与 to_dict 一致")
+
+    def test_stream_modes(self, db, version_id):
+        """测试 ndjson 与 json 流式输出"""
+        print("\n🌊 测试流式输出...")
+
+        fields = ["id", "item_name", "quantity"]
+        lines = list(_stream_items(_query(db, version_id, fields), fields, "ndjson", 1, version_id))
+        assert len(lines) == 25
+        assert json.loads(lines[0]) == {"id": 1, "item_name": "监控相机0", "quantity": 1.0}
+
+        body = json.loads("".join(_stream_items(_query(db, version_id, fields), fields, "json", 1, version_id)))
+        assert body["total"] == 25 and body["version_id"] == version_id
+        assert [item["item_name"] for item in body["items"][:2]] == ["监控相机0", "监控相机1"]
+        print("   ✅ 流式输出正确")
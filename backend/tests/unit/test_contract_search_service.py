@@ -0,0 +1,140 @@
+"""
+合同清单明细全文检索单元测试
+
+验证中文/英文切词、按相关度排序的搜索结果，以及导入、修改、删除版本时索引的同步
+"""
+
+import os
+import sys
+import uuid
+
+import openpyxl
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.project import Project
+from app.models.contract import CONTRACT_ITEM_SEARCH_TABLE, ContractFileVersion, VersionedContractItem
+from app.services import contract_import_service
+from app.services.contract_import_service import ContractImportService
+from app.services.contract_search_service import (
+    ContractSearchService, backfill_search_index, tokenize_for_index, tokenize_query
+)
+from app.services.contract_version_service import ContractVersionService
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def project_id(db):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="全文检索测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+    return project.id
+
+
+def _import(db, project_id, tmp_path, name="v1.xlsx", incremental=False):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "视频监控"
+    sheet.append(["序号", "设备名称", "设备品牌", "设备型号", "单位", "数量", "综合单价"])
+    sheet.append([1, "网络摄像机", "海康威视", "DS-2CD3T46 400万像素监控相机", "台", 10, 1200])
+    sheet.append([2, "监控硬盘", "希捷", "ST4000 4TB监控级", "块", 8, 600])
+    sheet.append([3, "硬盘录像机", "海康威视", "DS-7816 16路", "台", 2, 5000])
+    workbook.save(tmp_path / name)
+
+    response = ContractImportService(db).import_contract_file(
+        project_id, str(tmp_path / name), name, "测试用户", incremental=incremental
+    )
+    assert response.success
+    return response.version_id
+
+
+def _search(db, version_id, keyword):
+    query = db.query(VersionedContractItem).filter(VersionedContractItem.version_id == version_id)
+    return [item.item_name for item in ContractSearchService(db).apply_search(query, VersionedContractItem.id, keyword)]
+
+
+class TestContractSearch:
+    """全文检索测试类"""
+
+    def test_tokenize(self):
+        """测试中文按单字和两字切分，英文数字按词切分"""
+        print("\n✂️ 测试切词...")
+
+        assert tokenize_for_index("监控相机 DS-2CD") == "监 控 相 机 监控 控相 相机 ds 2cd"
+        assert tokenize_query("监控相机") == [("监控", False), ("控相", False), ("相机", False)]
+        assert tokenize_query("DS-2c") == [("ds", True), ("2c", True)]
+        assert tokenize_query("-") == []
+        print("   ✅ 切词正确")
+
+    def test_search_ranks_name_matches_first(self, db, project_id, tmp_path):
+        """测试两字中文、型号前缀搜索，名称命中排在规格命中之前"""
+        print("\n🔎 测试全文检索...")
+
+        version_id = _import(db, project_id, tmp_path)
+
+        assert _search(db, version_id, "监控") == ["监控硬盘", "网络摄像机"]
+        assert _search(db, version_id, "硬盘") == ["监控硬盘", "硬盘录像机"]
+        assert _search(db, version_id, "ds-2c") == ["网络摄像机"]
+        assert _search(db, version_id, "摄像机") == ["网络摄像机"]
+        assert _search(db, version_id, "交换机") == []
+        print("   ✅ 检索结果和排序正确")
+
+    def test_index_follows_item_writes(self, db, project_id, tmp_path):
+        """测试修改明细、删除版本后索引同步更新"""
+        print("\n🔄 测试索引同步...")
+
+        v1 = _import(db, project_id, tmp_path, "v1.xlsx")
+        v2 = _import(db, project_id, tmp_path, "v2.xlsx", incremental=True)
+        camera_id = db.query(VersionedContractItem.id).filter(
+            VersionedContractItem.version_id == v2, VersionedContractItem.item_name == "网络摄像机"
+        ).scalar()
+
+        ContractVersionService(db).update_item(project_id, v2, camera_id, {"item_name": "球形摄像机"})
+        db.commit()
+
+        assert _search(db, v1, "网络") == ["网络摄像机"]
+        assert _search(db, v2, "网络") == []
+        assert _search(db, v2, "球形") == ["球形摄像机"]
+
+        ContractVersionService(db).delete_version_contents(v2)
+        db.query(ContractFileVersion).filter(ContractFileVersion.id == v2).delete()
+        db.commit()
+
+        indexed = db.execute(text(f"SELECT count(*) FROM {CONTRACT_ITEM_SEARCH_TABLE}")).scalar()
+        assert indexed == 3
+        assert _search(db, v1, "球形") == []
+        print("   ✅ 索引随明细写入同步")
+
+    def test_backfill_search_index(self, db, project_id, tmp_path):
+        """测试为未建立索引的历史明细补建索引"""
+        print("\n🧱 测试索引补建...")
+
+        version_id = _import(db, project_id, tmp_path)
+        db.execute(text(f"DELETE FROM {CONTRACT_ITEM_SEARCH_TABLE}"))
+        db.commit()
+        assert _search(db, version_id, "监控") == []
+
+        assert backfill_search_index(db) == 3
+        assert backfill_search_index(db) == 0
+        assert _search(db, version_id, "监控") == ["监控硬盘", "网络摄像机"]
+        print("   ✅ 历史明细索引已补建")
@@ -0,0 +1,305 @@
+"""
+合同清单版本写时复制存储单元测试
+
+验证版本之间共享明细行、修改共享明细时的写时复制、删除版本时的明细归属转移、历史数据补全、版本差异比较和版本汇总维护
+"""
+
+import os
+import sys
+import uuid
+
+import openpyxl
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.project import Project
+from app.models.contract import (
+    ContractFileVersion, ContractItem, ContractVersionItem, ContractVersionSummary, SystemCategory,
+    VersionedContractItem
+)
+from app.services import contract_import_service, contract_version_service
+from app.services.contract_import_service import ContractImportService
+from app.services.contract_version_service import (
+    ContractVersionService, backfill_version_memberships, backfill_version_summaries
+)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def project_id(db):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="版本存储测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+    return project.id
+
+
+DEFAULT_ROWS = [
+    [1, "网络摄像机", "DS-2CD", "台", 10, 1200],
+    [2, "硬盘录像机", "DS-7816", "台", 2, 5000],
+]
+
+
+def _write_workbook(path, rows=DEFAULT_ROWS):
+    workbook = openpyxl.Workbook()
+    video = workbook.active
+    video.title = "视频监控"
+    video.append(["序号", "设备名称", "设备型号", "单位", "数量", "综合单价"])
+    for row in rows:
+        video.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def _version_items(db, version_id):
+    return {
+        item.item_name: item
+        for item in db.query(VersionedContractItem).filter(VersionedContractItem.version_id == version_id)
+    }
+
+
+class TestContractVersionStorage:
+    """版本写时复制存储测试类"""
+
+    def _import_two_versions(self, db, project_id, tmp_path):
+        service = ContractImportService(db)
+        first = service.import_contract_file(project_id, _write_workbook(tmp_path / "v1.xlsx"), "v1.xlsx", "测试用户")
+        second = service.import_contract_file(
+            project_id, _write_workbook(tmp_path / "v2.xlsx"), "v2.xlsx", "测试用户", incremental=True
+        )
+        assert first.success and second.success
+        return first.version_id, second.version_id
+
+    def test_versions_share_unchanged_rows(self, db, project_id, tmp_path):
+        """测试未变化的版本共享明细行，按版本查询结果与各自的分类一致"""
+        print("\n🔗 测试版本共享明细...")
+
+        v1, v2 = self._import_two_versions(db, project_id, tmp_path)
+
+        first, second = _version_items(db, v1), _version_items(db, v2)
+        assert sorted(first) == sorted(second) == ["硬盘录像机", "网络摄像机"]
+        assert first["网络摄像机"].id == second["网络摄像机"].id
+        assert first["网络摄像机"].category_id != second["网络摄像机"].category_id
+        assert db.query(ContractItem).filter(ContractItem.project_id == project_id).count() == 2
+        print("   ✅ 明细行被两个版本共享")
+
+    def test_update_shared_item_copies_on_write(self, db, project_id, tmp_path):
+        """测试修改共享明细时复制新行，其他版本不受影响"""
+        print("\n✏️ 测试写时复制...")
+
+        v1, v2 = self._import_two_versions(db, project_id, tmp_path)
+        camera_id = _version_items(db, v2)["网络摄像机"].id
+
+        new_id = ContractVersionService(db).update_item(project_id, v2, camera_id, {"quantity": 12})
+        db.commit()
+
+        assert new_id != camera_id
+        assert float(_version_items(db, v1)["网络摄像机"].quantity) == 10
+        edited = _version_items(db, v2)["网络摄像机"]
+        assert edited.id == new_id
+        assert float(edited.quantity) == 12
+        assert float(edited.total_price) == 14400
+        assert edited.original_item_id == camera_id
+
+        # 只属于一个版本的明细直接原地修改
+        same_id = ContractVersionService(db).update_item(project_id, v2, new_id, {"remarks": "二次修改"})
+        db.commit()
+        assert same_id == new_id
+        print("   ✅ 共享明细按写时复制修改")
+
+    def test_delete_version_keeps_shared_items(self, db, project_id, tmp_path):
+        """测试删除版本时保留仍被其他版本引用的明细并转移归属"""
+        print("\n🗑️ 测试删除版本...")
+
+        v1, v2 = self._import_two_versions(db, project_id, tmp_path)
+        camera_id = _version_items(db, v2)["网络摄像机"].id
+        ContractVersionService(db).update_item(project_id, v2, camera_id, {"quantity": 12})
+        db.commit()
+
+        ContractVersionService(db).delete_version_contents(v1)
+        db.query(ContractFileVersion).filter(ContractFileVersion.id == v1).delete()
+        db.commit()
+
+        remaining = _version_items(db, v2)
+        assert sorted(remaining) == ["硬盘录像机", "网络摄像机"]
+        assert remaining["硬盘录像机"].origin_version_id == v2
+        assert remaining["硬盘录像机"].origin_category_id == remaining["硬盘录像机"].category_id
+        assert remaining["网络摄像机"].original_item_id is None
+        assert db.query(ContractItem).filter(ContractItem.id == camera_id).count() == 0
+        print("   ✅ 共享明细保留，只属于被删版本的明细已删除")
+
+    def test_backfill_memberships_for_legacy_rows(self, db, project_id):
+        """测试为没有成员记录的历史明细补充版本成员关系"""
+        print("\n🧩 测试历史数据补全...")
+
+        version = ContractFileVersion(
+            project_id=project_id, version_number=1, upload_user_name="测试用户",
+            original_filename="legacy.xlsx", stored_filename="legacy.xlsx"
+        )
+        db.add(version)
+        db.commit()
+
+        # 绕过ORM写入，模拟升级前的数据
+        db.execute(insert(ContractItem.__table__), [
+            {"project_id": project_id, "version_id": version.id, "item_name": "历史设备", "quantity": 1},
+        ])
+        db.commit()
+        assert _version_items(db, version.id) == {}
+
+        assert backfill_version_memberships(db) == 1
+        assert backfill_version_memberships(db) == 0
+        assert list(_version_items(db, version.id)) == ["历史设备"]
+        assert db.query(ContractVersionItem).count() == 1
+        print("   ✅ 历史明细已补充成员关系")
+
+
+class TestContractVersionDiff:
+    """版本差异比较测试类"""
+
+    @pytest.fixture(autouse=True)
+    def _clear_diff_cache(self):
+        contract_version_service._diff_cache.clear()
+        yield
+        contract_version_service._diff_cache.clear()
+
+    def _import(self, db, project_id, tmp_path, name, rows=DEFAULT_ROWS, incremental=False):
+        response = ContractImportService(db).import_contract_file(
+            project_id, _write_workbook(tmp_path / name, rows), name, "测试用户", incremental=incremental
+        )
+        assert response.success
+        return response.version_id
+
+    def test_diff_reports_item_and_category_changes(self, db, project_id, tmp_path):
+        """测试差异报告包含新增、删除、逐字段变化和分类金额变化"""
+        print("\n🔍 测试版本差异...")
+
+        v1 = self._import(db, project_id, tmp_path, "v1.xlsx")
+        v2 = self._import(db, project_id, tmp_path, "v2.xlsx", rows=[
+            [1, "网络摄像机", "DS-2CD", "台", 12, 1200],
+            [3, "交换机", "S5720", "台", 1, 3000],
+        ], incremental=True)
+
+        diff = ContractVersionService(db).diff_versions(v1, v2)
+
+        assert diff["summary"] == {"added": 1, "removed": 1, "modified": 1, "unchanged": 0}
+        assert diff["added"][0]["item_name"] == "交换机"
+        assert diff["removed"][0]["item_name"] == "硬盘录像机"
+        assert diff["modified"][0]["changes"] == {
+            "quantity": {"old": 10.0, "new": 12.0},
+            "total_price": {"old": 12000.0, "new": 14400.0}
+        }
+
+        category = diff["categories"][0]
+        assert category["base"]["total_amount"] == 22000.0
+        assert category["target"]["total_amount"] == 17400.0
+        assert category["delta"] == {"items_count": 0, "total_amount": -4600.0, "budget_amount": -4600.0}
+        print("   ✅ 差异报告正确")
+
+    def test_diff_matches_rows_of_full_imports(self, db, project_id, tmp_path):
+        """测试两次全量导入的相同内容（不共享明细行）比较为全部未变化"""
+        print("\n🟰 测试全量导入版本比较...")
+
+        v1 = self._import(db, project_id, tmp_path, "v1.xlsx")
+        v2 = self._import(db, project_id, tmp_path, "v2.xlsx")
+
+        diff = ContractVersionService(db).diff_versions(v1, v2)
+
+        assert diff["summary"] == {"added": 0, "removed": 0, "modified": 0, "unchanged": 2}
+        assert diff["categories"][0]["delta"]["items_count"] == 0
+        print("   ✅ 相同内容比较为未变化")
+
+    def test_diff_cache_invalidated_by_item_update(self, db, project_id, tmp_path):
+        """测试差异结果被缓存，修改明细后重新计算"""
+        print("\n🗃️ 测试差异缓存...")
+
+        v1 = self._import(db, project_id, tmp_path, "v1.xlsx")
+        v2 = self._import(db, project_id, tmp_path, "v2.xlsx", incremental=True)
+        service = ContractVersionService(db)
+
+        first = service.diff_versions(v1, v2)
+        assert first["summary"]["unchanged"] == 2
+        assert service.diff_versions(v1, v2) is first
+
+        camera_id = _version_items(db, v2)["网络摄像机"].id
+        service.update_item(project_id, v2, camera_id, {"specification": "400万像素"})
+        db.commit()
+
+        second = service.diff_versions(v1, v2)
+        assert second is not first
+        assert second["summary"]["modified"] == 1
+        assert second["modified"][0]["changes"]["specification"] == {"old": "DS-2CD", "new": "400万像素"}
+        print("   ✅ 缓存命中且在明细修改后失效")
+
+
+class TestContractVersionSummary:
+    """版本汇总维护测试类"""
+
+    def test_import_and_update_maintain_summary(self, db, project_id, tmp_path):
+        """测试导入生成汇总，修改明细后只更新所在版本的汇总和分类明细数"""
+        print("\n📊 测试版本汇总维护...")
+
+        service = ContractImportService(db)
+        v1 = service.import_contract_file(project_id, _write_workbook(tmp_path / "v1.xlsx"), "v1.xlsx", "测试用户")
+        v2 = service.import_contract_file(
+            project_id, _write_workbook(tmp_path / "v2.xlsx"), "v2.xlsx", "测试用户", incremental=True
+        )
+        v1, v2 = v1.version_id, v2.version_id
+
+        version_service = ContractVersionService(db)
+        summary = version_service.get_version_summary(v2)
+        assert summary["items_count"] == 2
+        assert summary["main_items_count"] + summary["auxiliary_items_count"] == 2
+        assert float(summary["total_amount"]) == 22000
+        assert float(summary["main_amount"] + summary["auxiliary_amount"]) == 22000
+        assert len(summary["categories"]) == 1
+
+        camera_id = _version_items(db, v2)["网络摄像机"].id
+        version_service.update_item(project_id, v2, camera_id, {"quantity": 12, "item_type": "辅材"})
+        db.commit()
+
+        updated = version_service.get_version_summary(v2)
+        assert float(updated["total_amount"]) == 24400
+        assert float(updated["auxiliary_amount"]) == 14400
+        assert updated["auxiliary_items_count"] == 1
+        assert float(version_service.get_version_summary(v1)["total_amount"]) == 22000
+
+        category = db.query(SystemCategory).filter(SystemCategory.version_id == v2).one()
+        assert category.total_items_count == 2
+        print("   ✅ 汇总随明细修改同步更新")
+
+    def test_backfill_summaries_for_legacy_versions(self, db, project_id, tmp_path):
+        """测试为没有汇总记录的历史版本生成汇总"""
+        print("\n🧮 测试历史版本汇总补全...")
+
+        response = ContractImportService(db).import_contract_file(
+            project_id, _write_workbook(tmp_path / "v1.xlsx"), "v1.xlsx", "测试用户"
+        )
+        db.query(ContractVersionSummary).delete()
+        db.commit()
+        assert ContractVersionService(db).get_version_summary(response.version_id)["items_count"] == 0
+
+        assert backfill_version_summaries(db) == 1
+        assert backfill_version_summaries(db) == 0
+        summary = ContractVersionService(db).get_version_summary(response.version_id)
+        assert summary["items_count"] == 2
+        assert float(summary["total_amount"]) == 22000
+        print("   ✅ 历史版本汇总已生成")
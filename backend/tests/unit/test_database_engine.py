@@ -0,0 +1,89 @@
+"""
+数据库引擎配置单元测试
+
+验证连接池参数来自配置、SQLite新建连接时设置 WAL 等参数，以及写事务进行中读取不被阻塞
+"""
+
+import os
+import sys
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.config import settings
+from app.core.database import create_database_engine
+
+
+def _pragma(connection, name):
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def _read_during_exclusive_write(engine):
+    """写连接持有排他事务并插入一行时，用另一个连接读取行数"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("CREATE TABLE imports (id INTEGER PRIMARY KEY)")
+        connection.commit()
+
+    with engine.connect() as writer, engine.connect() as reader:
+        writer.exec_driver_sql("BEGIN EXCLUSIVE")
+        writer.exec_driver_sql("INSERT INTO imports DEFAULT VALUES")
+        try:
+            return reader.exec_driver_sql("SELECT COUNT(*) FROM imports").scalar()
+        finally:
+            writer.rollback()
+
+
+class TestDatabaseEngine:
+    """数据库引擎配置测试类"""
+
+    def test_pool_and_sqlite_pragmas(self, tmp_path):
+        """测试连接池大小和SQLite连接参数"""
+        print("\n⚙️ 测试引擎配置...")
+
+        engine = create_database_engine(f"sqlite:///{tmp_path / 'erp.db'}")
+        try:
+            with engine.connect() as connection:
+                assert _pragma(connection, "journal_mode") == "wal"
+                assert _pragma(connection, "synchronous") == 1  # NORMAL
+                assert _pragma(connection, "cache_size") == -settings.sqlite_cache_size_kb
+                assert _pragma(connection, "mmap_size") == settings.sqlite_mmap_size
+                assert _pragma(connection, "busy_timeout") == settings.sqlite_busy_timeout_ms
+            assert engine.pool.size() == settings.database_pool_size
+            assert engine.pool._max_overflow == settings.database_max_overflow
+            assert engine.pool._pre_ping == settings.database_pool_pre_ping
+        finally:
+            engine.dispose()
+
+        # 内存库不使用连接池参数
+        memory_engine = create_database_engine("sqlite://")
+        with memory_engine.connect() as connection:
+            assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+        memory_engine.dispose()
+        print("   ✅ 连接池和SQLite参数正确")
+
+    def test_reads_continue_during_write(self, tmp_path, monkeypatch):
+        """测试WAL模式下写事务（如合同导入）进行中读取不被阻塞，回滚日志模式下会被阻塞"""
+        print("\n📖 测试写入期间读取...")
+
+        monkeypatch.setattr(settings, "sqlite_busy_timeout_ms", 200)
+
+        engine = create_database_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+        started = time.perf_counter()
+        try:
+            assert _read_during_exclusive_write(engine) == 0
+        finally:
+            engine.dispose()
+        assert time.perf_counter() - started < 1
+
+        monkeypatch.setattr(settings, "sqlite_journal_mode", "DELETE")
+        engine = create_database_engine(f"sqlite:///{tmp_path / 'journal.db'}")
+        try:
+            with pytest.raises(OperationalError, match="locked"):
+                _read_during_exclusive_write(engine)
+        finally:
+            engine.dispose()
+        print("   ✅ WAL模式下读取不被写入阻塞")
@@ -0,0 +1,81 @@
+"""
+Excel解析器按列转换单元测试
+
+验证设备明细的批量转换：金额清洗、默认值填充、主材/辅材判定、总价计算和警告收集
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.utils.excel_parser import ContractExcelParser
+
+
+class TestExcelParserItems:
+    """设备明细按列转换测试类"""
+
+    def setup_method(self):
+        """每个测试方法前的设置"""
+        self.parser = ContractExcelParser()
+
+    def test_column_conversion(self):
+        """测试金额清洗、默认值和总价计算"""
+        print("\n🧮 测试按列转换...")
+
+        df = pd.DataFrame([
+            [None, " 网络摄像机 ", "海康", "￥1,200.00", 10, None, None],
+            ["A2", "安装调试", None, None, "3", "900元", "辅材"],
+            ["A3", "交换机", "华为", "500", 2, None, "其他"],
+        ], columns=['serial_number', 'item_name', 'brand_model', 'unit_price',
+                    'quantity', 'total_price', 'item_type'])
+
+        items = self.parser._parse_items_from_dataframe(df, "视频监控")
+
+        assert len(items) == 3
+        camera, install, switch = items
+        assert camera['serial_number'] == "1"
+        assert camera['item_name'] == "网络摄像机"
+        assert camera['unit'] == "台"
+        assert camera['origin_place'] == "中国"
+        assert camera['unit_price'] == Decimal("1200.00")
+        assert camera['total_price'] == Decimal("12000.00")
+        assert camera['item_type'] == "主材"
+        assert camera['excel_row_number'] == 1
+
+        assert install['unit_price'] is None
+        assert install['total_price'] == Decimal("900")
+        assert install['item_type'] == "辅材"
+
+        assert switch['item_type'] == "主材"
+        assert list(camera.keys())[-1] == 'total_price'
+        print("   ✅ 字段转换正确")
+
+    def test_warnings_collected_in_bulk(self):
+        """测试无效行被跳过且警告被批量收集"""
+        print("\n⚠️ 测试警告收集...")
+
+        df = pd.DataFrame([
+            ["电缆", "abc"],
+            [None, 5],
+            ["摄像机", 0],
+            [None, None],
+            ["支架", 4],
+        ], columns=['item_name', 'quantity'])
+
+        warnings = []
+        items = self.parser._parse_items_from_dataframe(df, "综合布线", warnings)
+
+        assert [item['item_name'] for item in items] == ["支架"]
+        assert items[0]['item_type'] == "辅材"
+        assert warnings == [
+            "第 1 行无法解析数字: abc",
+            "第 1 行数量无效: None，跳过",
+            "第 2 行缺少设备名称，跳过",
+            "第 3 行数量无效: 0，跳过",
+        ]
+        print("   ✅ 警告收集正确")
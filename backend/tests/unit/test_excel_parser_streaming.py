@@ -0,0 +1,149 @@
+"""
+Excel解析器流式模式单元测试
+
+验证只读流式模式、多进程并行解析与默认模式的解析结果完全一致
+"""
+
+import math
+import os
+import sys
+
+import openpyxl
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.utils import excel_parser
+from app.utils.excel_parser import ContractExcelParser, parse_contract_excel
+
+
+def _normalize(value):
+    """把NaN统一为None，便于比较解析结果"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+@pytest.fixture
+def contract_workbook(tmp_path):
+    """构造一个包含标题行、空行、金额字符串和无表头sheet的投标清单"""
+    workbook = openpyxl.Workbook()
+
+    video = workbook.active
+    video.title = "视频监控"
+    video.append(["某项目投标清单"])
+    video.append([])
+    video.append(["序号", "设备名称", "设备品牌", "设备型号", "单位", "数量", "综合单价", "备注"])
+    video.append([1, "网络摄像机", "海康", "DS-2CD", "台", 10, "￥1,200.00", None])
+    video.append([None, None, None, None, None, None, None, None])
+    video.append([2, "硬盘录像机", "海康", "DS-7816", "台", "2", 5000, "含硬盘"])
+    video.append([3, "超五类网线", None, "CAT5e", "米", 300, 2.5, None])
+    video.append([4, "无效行", None, None, None, 0, 10, None])
+    video.append([None, None, None, None, None, None, None, None, "表外备注"])
+
+    access = workbook.create_sheet("门禁")
+    access.append(["名称", "型号", "数量"])
+    access.append(["门禁控制器", "AC-1", 4])
+    access.append(["安装调试", None, 1])
+
+    plain = workbook.create_sheet("其他")
+    plain.append(["a", "b"])
+    plain.append(["c", 1])
+
+    file_path = tmp_path / "contract.xlsx"
+    workbook.save(file_path)
+    return str(file_path)
+
+
+class TestExcelParserStreaming:
+    """流式解析模式测试类"""
+
+    def test_streaming_matches_default_mode(self, contract_workbook):
+        """测试流式模式与默认模式输出一致"""
+        print("\n🌊 测试流式解析结果一致性...")
+
+        default_result = parse_contract_excel(contract_workbook)
+        streaming_result = parse_contract_excel(contract_workbook, streaming=True)
+
+        assert _normalize(streaming_result) == _normalize(default_result)
+        assert streaming_result['summary']['total_items'] == 5
+        print("   ✅ 流式模式与默认模式结果一致")
+
+    def test_streaming_header_detection(self, contract_workbook):
+        """测试流式模式在一次遍历中检测表头"""
+        print("\n🔍 测试流式表头检测...")
+
+        parser = ContractExcelParser(streaming=True)
+        try:
+            parser.load_excel_file(contract_workbook)
+            video = parser.parse_sheet_data("视频监控")
+            plain = parser.parse_sheet_data("其他")
+        finally:
+            parser.close()
+
+        assert video['header_row'] == 3
+        assert [item['item_name'] for item in video['items']] == ["网络摄像机", "硬盘录像机", "超五类网线"]
+        assert str(video['items'][0]['unit_price']) == "1200.00"
+        assert plain['header_row'] == 1
+        print("   ✅ 表头行检测正确")
+
+    def test_parallel_sheets_match_sequential(self, contract_workbook):
+        """测试多进程并行解析工作表的结果按工作表顺序合并"""
+        print("\n⚡ 测试并行解析工作表...")
+
+        sequential = parse_contract_excel(contract_workbook, streaming=True)
+        parallel = parse_contract_excel(contract_workbook, streaming=True, max_workers=2)
+
+        assert _normalize(parallel) == _normalize(sequential)
+        assert [c['category_name'] for c in parallel['categories']] == ["视频监控", "门禁", "其他"]
+        print("   ✅ 并行解析结果与顺序解析一致")
+
+    def test_batched_rows_match_default_mode(self, contract_workbook, monkeypatch):
+        """测试数据行分批转换时，每批不超过批大小，明细（含行号和默认序号）与默认模式一致"""
+        print("\n📦 测试分批流式解析...")
+
+        monkeypatch.setattr(excel_parser, "STREAMING_BATCH_ROWS", 2)
+        default_result = parse_contract_excel(contract_workbook)
+        streaming_result = parse_contract_excel(contract_workbook, streaming=True)
+
+        assert _normalize(streaming_result['items']) == _normalize(default_result['items'])
+        assert streaming_result['summary'] == default_result['summary']
+
+        parser = ContractExcelParser(streaming=True)
+        try:
+            parser.load_excel_file(contract_workbook)
+            batches = list(parser._iter_sheet_batches_streaming(parser.workbook["视频监控"]))
+            video = parser.parse_sheet_data("视频监控")
+        finally:
+            parser.close()
+
+        assert [len(rows) for _, _, rows in batches] == [2, 2, 1]
+        assert video['total_rows'] == 5 and video['raw_data'] is None
+        print("   ✅ 分批解析结果与默认模式一致")
+
+    def test_batches_use_sheet_column_types(self, tmp_path, monkeypatch):
+        """测试分批时各列仍按整张工作表推断类型：有空值的整数序号列与默认模式一样按浮点数转换"""
+        print("\n🔢 测试分批列类型...")
+
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "视频监控"
+        sheet.append(["序号", "设备名称", "单位", "数量", "综合单价"])
+        sheet.append([1, "网络摄像机", "台", 10, 1200])
+        sheet.append([None, "超五类网线", "米", 300, 2.5])
+        sheet.append([3, "硬盘录像机", "台", 2, 5000])
+        file_path = tmp_path / "serials.xlsx"
+        workbook.save(file_path)
+
+        monkeypatch.setattr(excel_parser, "STREAMING_BATCH_ROWS", 1)
+        default_result = parse_contract_excel(str(file_path))
+        streaming_result = parse_contract_excel(str(file_path), streaming=True)
+
+        assert [item['serial_number'] for item in default_result['items']] == ["1.0", "2", "3.0"]
+        assert _normalize(streaming_result['items']) == _normalize(default_result['items'])
+        print("   ✅ 分批列类型与默认模式一致")
@@ -0,0 +1,152 @@
+"""
+物料名称联想输入单元测试
+
+验证汉字、全拼、拼音首字母前缀匹配，联想排序，以及切换版本后索引的增量重建
+"""
+
+import os
+import sys
+import uuid
+
+import openpyxl
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.project import Project
+from app.models.contract import VersionedContractItem
+from app.services import contract_import_service, material_typeahead_service
+from app.services.contract_import_service import ContractImportService
+from app.services.contract_version_service import ContractVersionService
+from app.services.material_typeahead_service import (
+    MaterialTypeaheadIndex, MaterialTypeaheadService, build_keys
+)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    material_typeahead_service._index_cache.clear()
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+    material_typeahead_service._index_cache.clear()
+
+
+@pytest.fixture
+def project_id(db):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="联想输入测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+    return project.id
+
+
+def _import(db, project_id, tmp_path, name, rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "视频监控"
+    sheet.append(["序号", "设备名称", "设备品牌", "单位", "数量", "综合单价"])
+    for row in rows:
+        sheet.append(row)
+    workbook.save(tmp_path / name)
+
+    response = ContractImportService(db).import_contract_file(project_id, str(tmp_path / name), name, "测试用户")
+    assert response.success
+    return response.version_id
+
+
+ROWS = [
+    [1, "监控相机", "海康威视", "台", 10, 1200],
+    [2, "监控相机", "海康威视", "台", 4, 1300],
+    [3, "监控硬盘", "希捷", "块", 8, 600],
+    [4, "交换机", "华为", "台", 2, 3000],
+]
+
+
+def _texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+class TestMaterialTypeahead:
+    """物料名称联想输入测试类"""
+
+    def test_build_keys(self):
+        """测试从每个字开始生成原文、全拼和首字母键"""
+        print("\n🔤 测试联想键生成...")
+
+        keys = dict(build_keys("监控相机"))
+        assert keys["监控相机"] == 0
+        assert keys["jiankongxiangji"] == 0
+        assert keys["jkxj"] == 0
+        assert keys["xiangji"] == 2
+        assert keys["xj"] == 2
+        assert dict(build_keys("DS-2CD 摄像机"))["ds-2cdsxj"] == 0
+        print("   ✅ 联想键正确")
+
+    def test_suggest_by_hanzi_pinyin_and_initials(self, db, project_id, tmp_path):
+        """测试汉字、全拼、首字母联想及排序"""
+        print("\n💡 测试联想输入...")
+
+        _import(db, project_id, tmp_path, "v1.xlsx", ROWS)
+        service = MaterialTypeaheadService(db)
+
+        assert _texts(service.suggest(project_id, "jkxj")[1]) == ["监控相机"]
+        assert _texts(service.suggest(project_id, "jiankong")[1]) == ["监控相机", "监控硬盘"]
+        assert _texts(service.suggest(project_id, "监控")[1]) == ["监控相机", "监控硬盘"]
+        assert _texts(service.suggest(project_id, "xj")[1]) == ["希捷", "监控相机"]
+        assert _texts(service.suggest(project_id, "hk")[1]) == ["海康威视"]
+        assert _texts(service.suggest(project_id, "j", limit=2)[1]) == ["监控相机", "交换机"]
+        assert service.suggest(project_id, "监控相机")[1][0]["count"] == 2
+        assert service.suggest(project_id, "xyz")[1] == []
+        print("   ✅ 联想结果和排序正确")
+
+    def test_index_rebuilt_incrementally(self, db, project_id, tmp_path):
+        """测试新版本生效或明细修改后重建索引，并复用已有词条的拼音键"""
+        print("\n♻️ 测试索引增量重建...")
+
+        _import(db, project_id, tmp_path, "v1.xlsx", ROWS)
+        first_version, first_index = MaterialTypeaheadService(db).get_index(project_id)
+
+        v2 = _import(db, project_id, tmp_path, "v2.xlsx", ROWS + [[5, "光纤收发器", "华为", "对", 4, 300]])
+        version_id, index = MaterialTypeaheadService(db).get_index(project_id)
+
+        assert version_id == v2 and first_version != v2
+        assert index is not first_index
+        assert index.reused_keys == len(first_index.entries)
+        assert _texts(MaterialTypeaheadService(db).suggest(project_id, "gx")[1]) == ["光纤收发器"]
+
+        item_id = db.query(VersionedContractItem.id).filter(
+            VersionedContractItem.version_id == v2, VersionedContractItem.item_name == "交换机"
+        ).scalar()
+        ContractVersionService(db).update_item(project_id, v2, item_id, {"item_name": "核心交换机"})
+        db.commit()
+
+        assert _texts(MaterialTypeaheadService(db).suggest(project_id, "hxjhj")[1]) == ["核心交换机"]
+        # 内容未变化时直接命中缓存
+        _, cached = MaterialTypeaheadService(db).get_index(project_id)
+        assert MaterialTypeaheadService(db).get_index(project_id)[1] is cached
+        print("   ✅ 索引按版本和内容变化重建")
+
+    def test_item_type_filter(self):
+        """测试按物料类型筛选联想结果"""
+        print("\n🏷️ 测试物料类型筛选...")
+
+        index = MaterialTypeaheadIndex([
+            {"text": "六类网线", "field": "item_name", "item_type": "辅材", "count": 3},
+            {"text": "录像机", "field": "item_name", "item_type": "主材", "count": 1},
+        ])
+        assert _texts(index.search("l")) == ["六类网线", "录像机"]
+        assert _texts(index.search("l", item_type="主材")) == ["录像机"]
+        print("   ✅ 物料类型筛选正确")
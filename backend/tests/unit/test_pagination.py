@@ -0,0 +1,128 @@
+"""
+列表分页工具单元测试
+
+验证页码分页、游标分页（含多列降序排序键）、总数统计方式和无效游标处理
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.project import Project
+from app.models.test_result import TestRun
+from app.utils import pagination
+from app.utils.pagination import decode_cursor, encode_cursor, paginate
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def projects(db):
+    db.add_all([
+        Project(project_code=f"P{i:03d}", project_name=f"分页项目{i}", contract_amount=1000, project_manager="测试")
+        for i in range(25)
+    ])
+    db.commit()
+    return [project.id for project in db.query(Project).order_by(Project.id)]
+
+
+def _walk(query, order_by, size, count="none"):
+    """按游标逐页取完所有数据"""
+    ids, cursor, pages = [], "", 0
+    while cursor is not None:
+        result = paginate(query, order_by, size, cursor=cursor, count=count)
+        ids.extend(item.id for item in result["items"])
+        cursor = result["next_cursor"]
+        pages += 1
+    return ids, pages
+
+
+class TestPagination:
+    """分页工具测试类"""
+
+    def test_page_mode_unchanged(self, db, projects):
+        """测试页码分页的返回结构与原有接口一致"""
+        print("\n📄 测试页码分页...")
+
+        result = paginate(db.query(Project), [(Project.id, False)], size=10, page=3)
+
+        assert [item.id for item in result["items"]] == projects[20:]
+        assert (result["total"], result["page"], result["pages"]) == (25, 3, 3)
+        assert result["next_cursor"] is None
+        print("   ✅ 页码分页正确")
+
+    def test_cursor_mode_walks_all_rows(self, db, projects):
+        """测试游标分页逐页取完全部数据且不重复"""
+        print("\n➡️ 测试游标分页...")
+
+        ids, pages = _walk(db.query(Project), [(Project.id, False)], size=10)
+
+        assert ids == projects
+        assert pages == 3
+        print("   ✅ 游标分页覆盖全部数据")
+
+    def test_cursor_with_descending_ties(self, db):
+        """测试多列降序排序键在时间相同时不丢行"""
+        print("\n⏬ 测试降序多列排序键...")
+
+        same_time = datetime(2025, 1, 1, 8, 0, 0)
+        db.add_all([
+            TestRun(run_id=f"run-{i}", run_type="manual", status="completed", start_time=same_time,
+                    created_at=same_time if i % 2 else datetime(2025, 1, 2, i))
+            for i in range(9)
+        ])
+        db.commit()
+
+        order_by = [(TestRun.created_at, True), (TestRun.id, True)]
+        ids, _ = _walk(db.query(TestRun), order_by, size=2)
+        expected = [run.id for run in db.query(TestRun).order_by(TestRun.created_at.desc(), TestRun.id.desc())]
+
+        assert ids == expected
+        print("   ✅ 时间相同时按ID继续翻页")
+
+    def test_count_modes(self, db, projects, monkeypatch):
+        """测试不统计总数和估算总数"""
+        print("\n🔢 测试总数统计方式...")
+
+        result = paginate(db.query(Project), [(Project.id, False)], size=10, count="none")
+        assert result["total"] is None and result["pages"] is None
+
+        monkeypatch.setattr(pagination.settings, "pagination_count_estimate_cap", 20)
+        result = paginate(db.query(Project), [(Project.id, False)], size=10, count="estimate")
+        assert (result["total"], result["total_is_estimate"]) == (20, True)
+
+        monkeypatch.setattr(pagination.settings, "pagination_count_estimate_cap", 100)
+        result = paginate(db.query(Project), [(Project.id, False)], size=10, count="estimate")
+        assert (result["total"], result["total_is_estimate"]) == (25, False)
+        print("   ✅ 总数统计方式正确")
+
+    def test_cursor_encoding(self):
+        """测试游标编码往返和无效游标"""
+        print("\n🔐 测试游标编码...")
+
+        values = [datetime(2025, 3, 1, 12, 30), 42, "申购"]
+        assert decode_cursor(encode_cursor(values), 3) == values
+
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor("not-a-cursor", 1)
+        assert exc_info.value.status_code == 400
+        with pytest.raises(HTTPException):
+            decode_cursor(encode_cursor([1, 2]), 1)
+        print("   ✅ 游标编码正确")
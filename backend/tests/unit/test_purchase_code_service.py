@@ -0,0 +1,112 @@
+"""
+申购单号生成单元测试
+
+验证按日序号递增、批量分配、按已有单号初始化序号，以及并发创建时单号不重复
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.core.database import Base
+from app.models.purchase import PurchaseRequest
+from app.services.purchase_code_service import PurchaseCodeService
+
+DAY = datetime(2025, 3, 1, 9, 30)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+class TestPurchaseCodeService:
+    """申购单号生成测试类"""
+
+    def test_sequential_and_block_allocation(self, db):
+        """测试单号按日递增、批量分配连续单号、次日重新编号"""
+        print("\n🔢 测试单号分配...")
+
+        service = PurchaseCodeService(db)
+        assert service.next_code(DAY) == "PR202503010001"
+        assert service.allocate(3, DAY) == ["PR202503010002", "PR202503010003", "PR202503010004"]
+        assert service.next_code(DAY) == "PR202503010005"
+        assert service.next_code(datetime(2025, 3, 2)) == "PR202503020001"
+
+        with pytest.raises(ValueError):
+            service.allocate(0, DAY)
+        print("   ✅ 单号分配正确")
+
+    def test_seeded_from_existing_codes(self, db):
+        """测试当天第一次分配时从已有单号的最大序号继续编号"""
+        print("\n🌱 测试序号初始化...")
+
+        db.add_all([
+            PurchaseRequest(request_code=code, project_id=1, requester_id=1)
+            for code in ("PR202503010007", "PR202503010012", "PR202502280099")
+        ])
+        db.commit()
+
+        assert PurchaseCodeService(db).next_code(DAY) == "PR202503010013"
+        print("   ✅ 从已有单号继续编号")
+
+    def test_rollback_releases_code(self, db):
+        """测试事务回滚后序号一并回滚"""
+        print("\n↩️ 测试回滚...")
+
+        PurchaseCodeService(db).next_code(DAY)
+        db.commit()
+        PurchaseCodeService(db).next_code(DAY)
+        db.rollback()
+
+        assert PurchaseCodeService(db).next_code(DAY) == "PR202503010002"
+        print("   ✅ 回滚后序号不跳号")
+
+    def test_concurrent_creates_get_unique_codes(self, tmp_path):
+        """测试多个会话并发创建申购单时单号不重复"""
+        print("\n🧵 测试并发创建...")
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'codes.db'}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        errors = []
+
+        def create():
+            session = Session()
+            try:
+                code = PurchaseCodeService(session).next_code(DAY)
+                session.add(PurchaseRequest(request_code=code, project_id=1, requester_id=1))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                errors.append(e)
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=create) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        session = Session()
+        codes = sorted(code for (code,) in session.query(PurchaseRequest.request_code))
+        session.close()
+        engine.dispose()
+
+        assert errors == []
+        assert codes == [f"PR20250301{seq:04d}" for seq in range(1, 11)]
+        print("   ✅ 并发创建单号不重复")
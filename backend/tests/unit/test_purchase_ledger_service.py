@@ -0,0 +1,333 @@
+"""
+合同清单项申购台账单元测试
+
+验证申购单在工作流各步骤流转时台账的增减、剩余数量读取、超量校验、并发提交时的数量预留，
+以及按申购明细重建台账
+"""
+
+import os
+import sys
+import threading
+import uuid
+from decimal import Decimal
+
+import openpyxl
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1 import purchase_workflow
+from app.api.v1.purchase_query import get_contract_item_details, get_specifications_by_material
+from app.api.v1.purchase_utils import enrich_purchase_item_details
+from app.core.database import Base
+from app.models.contract import VersionedContractItem
+from app.models.project import Project
+from app.models.purchase import ContractItemPurchaseLedger, PurchaseRequest, PurchaseRequestItem, PurchaseStatus
+from app.models.user import User, UserRole
+from app.schemas.purchase import (
+    ApprovalStatus, ItemType, PurchaseItemCreate, PurchaseItemPriceQuote,
+    PurchaseRequestApprove, PurchaseRequestCreate, PurchaseRequestPriceQuote
+)
+from app.services import contract_import_service
+from app.services.contract_import_service import ContractImportService
+from app.services.purchase_ledger_service import (
+    ContractQuantityExceeded, PurchaseLedgerService, backfill_purchase_ledger
+)
+from app.services.purchase_service import PurchaseService
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def users(db):
+    users = {
+        role: User(username=role.value, password_hash="x", name=f"测试{role.value}", role=role)
+        for role in (UserRole.PROJECT_MANAGER, UserRole.PURCHASER, UserRole.DEPT_MANAGER, UserRole.GENERAL_MANAGER)
+    }
+    db.add_all(users.values())
+    db.commit()
+    return users
+
+
+@pytest.fixture
+def contract_items(db, users, tmp_path):
+    """导入合同清单，返回 (项目ID, [(合同清单项ID, 系统分类ID)])"""
+    return _import_contract(db, tmp_path, users[UserRole.PROJECT_MANAGER].id)
+
+
+def _import_contract(db, tmp_path, project_manager_id=None):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="申购台账测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师",
+        project_manager_id=project_manager_id
+    )
+    db.add(project)
+    db.commit()
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "视频监控"
+    sheet.append(["序号", "设备名称", "设备品牌", "单位", "数量", "综合单价"])
+    sheet.append([1, "监控相机", "海康威视", "台", 10, 1200])
+    sheet.append([2, "监控硬盘", "希捷", "块", 8, 600])
+    workbook.save(tmp_path / "contract.xlsx")
+
+    response = ContractImportService(db).import_contract_file(
+        project.id, str(tmp_path / "contract.xlsx"), "contract.xlsx", "测试用户"
+    )
+    assert response.success
+    rows = db.query(VersionedContractItem.id, VersionedContractItem.category_id).filter(
+        VersionedContractItem.version_id == response.version_id
+    ).order_by(VersionedContractItem.id).all()
+    return project.id, [tuple(row) for row in rows]
+
+
+def _create_request(db, users, project_id, items):
+    request_data = PurchaseRequestCreate(
+        project_id=project_id,
+        items=[
+            PurchaseItemCreate(
+                contract_item_id=contract_item_id, system_category_id=category_id,
+                item_name="主材", unit="台", quantity=Decimal(quantity), item_type=ItemType.MAIN_MATERIAL
+            )
+            for contract_item_id, category_id, quantity in items
+        ]
+    )
+    return PurchaseService(db).create_purchase_request(request_data, users[UserRole.PROJECT_MANAGER].id)
+
+
+def _run_workflow(db, users, request_id, until=PurchaseStatus.FINAL_APPROVED):
+    """按实际工作流接口推进申购单"""
+    approve = PurchaseRequestApprove(approval_status=ApprovalStatus.APPROVED)
+    purchase_workflow.submit_purchase_request(request_id, db, users[UserRole.PROJECT_MANAGER])
+    if until == PurchaseStatus.SUBMITTED:
+        return
+
+    request = db.get(PurchaseRequest, request_id)
+    quote = PurchaseRequestPriceQuote(items=[
+        PurchaseItemPriceQuote(item_id=item.id, unit_price=Decimal("100")) for item in request.items
+    ])
+    purchase_workflow.quote_purchase_request(request_id, quote, db, users[UserRole.PURCHASER])
+    purchase_workflow.dept_approve_purchase_request(request_id, approve, db, users[UserRole.DEPT_MANAGER])
+    if until == PurchaseStatus.DEPT_APPROVED:
+        return
+    purchase_workflow.final_approve_purchase_request(request_id, approve, db, users[UserRole.GENERAL_MANAGER])
+
+
+def _quantities(db, contract_item_id):
+    ledger = PurchaseLedgerService(db).get_ledger(contract_item_id)
+    return ledger["committed_quantity"], ledger["pending_quantity"]
+
+
+class TestPurchaseLedger:
+    """申购台账测试类"""
+
+    def test_workflow_transitions_update_ledger(self, db, users, contract_items):
+        """测试提交、审批、退回时台账在审批中和已占用之间转移"""
+        print("\n📒 测试工作流流转更新台账...")
+
+        project_id, [(camera_id, category_id), _] = contract_items
+        request = _create_request(db, users, project_id, [(camera_id, category_id, 3)])
+        assert _quantities(db, camera_id) == (0, 0)
+
+        _run_workflow(db, users, request.id, until=PurchaseStatus.SUBMITTED)
+        assert _quantities(db, camera_id) == (0, 3)
+
+        # 采购员退回到草稿，审批中数量释放
+        purchase_workflow.return_purchase_request(
+            request.id, PurchaseRequestApprove(approval_status=ApprovalStatus.REJECTED, approval_notes="价格待确认"),
+            db, users[UserRole.PURCHASER]
+        )
+        assert _quantities(db, camera_id) == (0, 0)
+
+        _run_workflow(db, users, request.id, until=PurchaseStatus.DEPT_APPROVED)
+        assert _quantities(db, camera_id) == (0, 3)
+
+        # 总经理驳回回到部门审批前，仍然是审批中
+        purchase_workflow.final_approve_purchase_request(
+            request.id, PurchaseRequestApprove(approval_status=ApprovalStatus.REJECTED),
+            db, users[UserRole.GENERAL_MANAGER]
+        )
+        assert _quantities(db, camera_id) == (0, 3)
+
+        purchase_workflow.dept_approve_purchase_request(
+            request.id, PurchaseRequestApprove(approval_status=ApprovalStatus.APPROVED),
+            db, users[UserRole.DEPT_MANAGER]
+        )
+        purchase_workflow.final_approve_purchase_request(
+            request.id, PurchaseRequestApprove(approval_status=ApprovalStatus.APPROVED),
+            db, users[UserRole.GENERAL_MANAGER]
+        )
+        assert _quantities(db, camera_id) == (3, 0)
+        print("   ✅ 台账随工作流正确增减")
+
+    def test_remaining_quantity_and_limit(self, db, users, contract_items):
+        """测试剩余数量读取台账，超出合同数量时拒绝创建"""
+        print("\n📏 测试剩余数量与超量校验...")
+
+        project_id, [(camera_id, category_id), _] = contract_items
+        request = _create_request(db, users, project_id, [(camera_id, category_id, 6)])
+        _run_workflow(db, users, request.id)
+
+        details = get_contract_item_details(camera_id, db, users[UserRole.PROJECT_MANAGER])
+        assert (details["purchased_quantity"], details["remaining_quantity"]) == (6.0, 4.0)
+
+        service = PurchaseService(db)
+        assert service._get_total_requested_quantity(camera_id) == Decimal("6")
+        assert service._get_total_requested_quantity(camera_id, exclude_request_id=request.id) == Decimal("0")
+
+        with pytest.raises(ValueError):
+            _create_request(db, users, project_id, [(camera_id, category_id, 5)])
+        db.rollback()
+        print("   ✅ 剩余数量和超量校验正确")
+
+    def test_remaining_quantity_includes_pending(self, db, users, contract_items):
+        """测试各处读取的剩余数量都扣除审批中的数量，与提交时的超量校验一致"""
+        print("\n🧮 测试剩余数量口径...")
+
+        project_id, [(camera_id, category_id), _] = contract_items
+        approved = _create_request(db, users, project_id, [(camera_id, category_id, 2)])
+        pending = _create_request(db, users, project_id, [(camera_id, category_id, 3)])
+        _run_workflow(db, users, approved.id)
+        _run_workflow(db, users, pending.id, until=PurchaseStatus.SUBMITTED)
+
+        manager = users[UserRole.PROJECT_MANAGER]
+        details = get_contract_item_details(camera_id, db, manager)
+        assert (details["purchased_quantity"], details["remaining_quantity"]) == (5.0, 5.0)
+
+        specifications = get_specifications_by_material(project_id, "监控相机", db, manager)["specifications"]
+        assert [(spec["purchased_quantity"], spec["remaining_quantity"]) for spec in specifications] == [(5.0, 5.0)]
+
+        result = {"items": [{"item_type": "main", "contract_item_id": camera_id, "system_category_id": category_id}]}
+        enrich_purchase_item_details(db, result)
+        assert result["items"][0]["remaining_quantity"] == 5.0
+
+        assert PurchaseService(db)._get_total_requested_quantity(camera_id) == Decimal("5")
+        print("   ✅ 剩余数量与超量校验口径一致")
+
+    def test_rebuild_matches_incremental_ledger(self, db, users, contract_items):
+        """测试按申购明细重建的台账与增量维护的台账一致，并能为历史数据补建台账"""
+        print("\n🔁 测试台账重建...")
+
+        project_id, [(camera_id, camera_category), (disk_id, disk_category)] = contract_items
+        first = _create_request(db, users, project_id, [(camera_id, camera_category, 2), (disk_id, disk_category, 4)])
+        second = _create_request(db, users, project_id, [(camera_id, camera_category, 1)])
+        _run_workflow(db, users, first.id)
+        _run_workflow(db, users, second.id, until=PurchaseStatus.SUBMITTED)
+
+        incremental = PurchaseLedgerService(db).get_ledgers([camera_id, disk_id])
+        assert incremental[camera_id]["committed_quantity"] == Decimal("2")
+        assert incremental[camera_id]["pending_quantity"] == Decimal("1")
+
+        # 模拟升级前没有台账的数据
+        db.query(ContractItemPurchaseLedger).delete()
+        db.commit()
+        assert backfill_purchase_ledger(db) == 2
+        assert backfill_purchase_ledger(db) == 0
+
+        assert PurchaseLedgerService(db).get_ledgers([camera_id, disk_id]) == incremental
+        print("   ✅ 重建结果与增量维护一致")
+
+    def test_submit_reserves_contract_quantity(self, db, users, contract_items):
+        """测试提交时预留合同数量，审批中的数量也不能被再次申购"""
+        print("\n🔒 测试提交预留合同数量...")
+
+        project_id, [(camera_id, category_id), _] = contract_items
+        first = _create_request(db, users, project_id, [(camera_id, category_id, 6)])
+        second = _create_request(db, users, project_id, [(camera_id, category_id, 6)])
+
+        _run_workflow(db, users, first.id, until=PurchaseStatus.SUBMITTED)
+        assert _quantities(db, camera_id) == (0, 6)
+
+        with pytest.raises(HTTPException) as exc_info:
+            _run_workflow(db, users, second.id, until=PurchaseStatus.SUBMITTED)
+        assert exc_info.value.status_code == 400
+        assert db.get(PurchaseRequest, second.id).status == PurchaseStatus.DRAFT
+        assert _quantities(db, camera_id) == (0, 6)
+
+        # 审批中的数量同样计入已申购，新建时即提示超量
+        with pytest.raises(ValueError):
+            _create_request(db, users, project_id, [(camera_id, category_id, 5)])
+        print("   ✅ 提交预留合同数量正确")
+
+    def test_auxiliary_items_not_reserved(self, db, users, contract_items):
+        """测试关联了合同清单项的辅材不占用合同数量"""
+        print("\n🧩 测试辅材不计入台账...")
+
+        project_id, [(camera_id, category_id), _] = contract_items
+        request = _create_request(db, users, project_id, [(camera_id, category_id, 2)])
+        db.add(PurchaseRequestItem(
+            request_id=request.id, contract_item_id=camera_id, system_category_id=category_id,
+            item_name="安装支架", unit="个", quantity=Decimal("20"), item_type="auxiliary"
+        ))
+        db.commit()
+
+        _run_workflow(db, users, request.id)
+        assert _quantities(db, camera_id) == (2, 0)
+        assert PurchaseService(db)._get_total_requested_quantity(camera_id, exclude_request_id=request.id) == Decimal("0")
+
+        # 重建台账同样只统计主材
+        PurchaseLedgerService(db).rebuild()
+        assert _quantities(db, camera_id) == (2, 0)
+        print("   ✅ 只有主材占用合同数量")
+
+    def test_concurrent_reservations(self, tmp_path, monkeypatch):
+        """测试多个会话并发预留同一清单项时不超量，不同清单项互不影响"""
+        print("\n🧵 测试并发预留...")
+
+        monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+        engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        session = Session()
+        _, [(camera_id, _), (disk_id, _)] = _import_contract(session, tmp_path)
+        session.close()
+
+        results = []
+
+        def reserve(contract_item_id):
+            session = Session()
+            try:
+                PurchaseLedgerService(session).reserve({contract_item_id: Decimal("3")})
+                session.commit()
+                results.append((contract_item_id, True))
+            except ContractQuantityExceeded:
+                session.rollback()
+                results.append((contract_item_id, False))
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=reserve, args=(camera_id,)) for _ in range(8)]
+        threads += [threading.Thread(target=reserve, args=(disk_id,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 相机合同数量10台，每次3台最多成功3次；硬盘合同数量8块，两次都成功
+        assert sum(ok for item_id, ok in results if item_id == camera_id) == 3
+        assert sum(ok for item_id, ok in results if item_id == disk_id) == 2
+
+        session = Session()
+        ledgers = PurchaseLedgerService(session).get_ledgers([camera_id, disk_id])
+        assert ledgers[camera_id]["pending_quantity"] == Decimal("9")
+        assert ledgers[disk_id]["pending_quantity"] == Decimal("6")
+        session.close()
+        engine.dispose()
+        print("   ✅ 并发预留不超量")
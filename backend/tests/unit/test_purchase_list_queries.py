@@ -0,0 +1,123 @@
+"""
+申购单列表和详情查询次数单元测试
+
+验证明细、项目和申请人批量预加载后，列表和详情的查询次数固定，不随申购单和明细数量增长
+"""
+
+import asyncio
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1.purchases import get_purchase_request, get_purchase_requests
+from app.core.database import Base
+from app.models.project import Project
+from app.models.purchase import PurchaseRequest, PurchaseRequestItem, PurchaseStatus
+from app.models.user import User, UserRole
+
+# 每页100条申购单时允许的查询次数：总数、分页、明细、项目、申请人
+LIST_QUERY_BUDGET = 5
+# 详情允许的查询次数：申购单、明细、项目、申请人，以及补充系统分类和剩余数量
+DETAIL_QUERY_BUDGET = 7
+
+
+@pytest.fixture
+def engine():
+    # 接口在线程池中执行查询，内存数据库需要跨线程共用同一个连接
+    engine = create_engine(
+        "sqlite:///:memory:", echo=False, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def admin(db):
+    """创建管理员、申请人、项目和100张各含3条明细的申购单，返回管理员"""
+    admin = User(username="admin", password_hash="x", name="管理员", role=UserRole.ADMIN)
+    requesters = [
+        User(username=f"pm{i}", password_hash="x", name=f"项目经理{i}", role=UserRole.PROJECT_MANAGER)
+        for i in range(4)
+    ]
+    projects = [
+        Project(project_code=f"P{i:03d}", project_name=f"申购项目{i}", contract_amount=1000, project_manager="测试")
+        for i in range(5)
+    ]
+    db.add_all([admin, *requesters, *projects])
+    db.flush()
+
+    for index in range(100):
+        request = PurchaseRequest(
+            request_code=f"PR20250301{index + 1:04d}",
+            project_id=projects[index % 5].id,
+            requester_id=requesters[index % 4].id,
+            status=PurchaseStatus.DRAFT
+        )
+        request.items = [
+            PurchaseRequestItem(item_name=f"辅材{line}", unit="个", quantity=Decimal(line + 1), item_type="auxiliary")
+            for line in range(3)
+        ]
+        db.add(request)
+    db.commit()
+    db.expunge_all()
+    return db.query(User).filter(User.username == "admin").one()
+
+
+def _count_queries(engine, func, *args, **kwargs):
+    statements = []
+    listener = lambda *event_args: statements.append(event_args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = asyncio.run(func(*args, **kwargs))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, statements
+
+
+class TestPurchaseListQueries:
+    """申购单列表和详情查询次数测试类"""
+
+    def test_list_query_budget(self, db, engine, admin):
+        """测试每页100条申购单的查询次数固定"""
+        print("\n📚 测试申购单列表查询次数...")
+
+        result, statements = _count_queries(
+            engine, get_purchase_requests,
+            page=1, size=100, project_id=None, status=None, requester_id=None, search=None,
+            cursor=None, count="exact", db=db, current_user=admin
+        )
+
+        assert result["total"] == 100 and len(result["items"]) == 100
+        first = result["items"][0]
+        assert (first["project_name"], first["requester_name"]) == ("申购项目0", "项目经理0")
+        assert len(first["items"]) == 3
+        assert len(statements) <= LIST_QUERY_BUDGET, statements
+        print(f"   ✅ 100条申购单共 {len(statements)} 次查询")
+
+    def test_detail_query_budget(self, db, engine, admin):
+        """测试申购单详情的查询次数固定"""
+        print("\n📄 测试申购单详情查询次数...")
+
+        request_id = db.query(PurchaseRequest.id).filter(PurchaseRequest.request_code == "PR202503010007").scalar()
+        result, statements = _count_queries(engine, get_purchase_request, request_id, db=db, current_user=admin)
+
+        assert (result["project_name"], result["requester_name"]) == ("申购项目1", "项目经理2")
+        assert len(result["items"]) == 3
+        assert len(statements) <= DETAIL_QUERY_BUDGET, statements
+        print(f"   ✅ 详情共 {len(statements)} 次查询")
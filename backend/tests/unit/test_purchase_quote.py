@@ -0,0 +1,159 @@
+"""
+采购员询价单元测试
+
+验证询价一次加载全部明细（查询次数与明细行数无关）、明细必须属于申购单，以及多张申购单的批量询价
+"""
+
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1.purchase_workflow import batch_quote_purchase_requests, quote_purchase_request
+from app.core.database import Base
+from app.models.purchase import PurchaseRequest, PurchaseRequestItem, PurchaseStatus, PurchaseWorkflowLog
+from app.models.user import User, UserRole
+from app.schemas.purchase import (
+    PurchaseItemPriceQuote, PurchaseRequestBatchQuote, PurchaseRequestBatchQuoteItem, PurchaseRequestPriceQuote
+)
+
+# 询价允许的查询和写入语句数（与明细行数无关）
+QUOTE_STATEMENT_BUDGET = 10
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def purchaser(db):
+    purchaser = User(username="purchaser", password_hash="x", name="采购员", role=UserRole.PURCHASER)
+    db.add_all([purchaser, User(username="dept", password_hash="x", name="部门主管", role=UserRole.DEPT_MANAGER)])
+    db.commit()
+    return purchaser
+
+
+def _submitted_request(db, purchaser, code, lines):
+    request = PurchaseRequest(
+        request_code=code, project_id=1, requester_id=1, status=PurchaseStatus.SUBMITTED,
+        current_step="purchaser", current_approver_id=purchaser.id
+    )
+    request.items = [
+        PurchaseRequestItem(item_name=f"辅材{line}", unit="个", quantity=Decimal(2), item_type="auxiliary")
+        for line in range(lines)
+    ]
+    db.add(request)
+    db.commit()
+    return request.id, [item.id for item in request.items]
+
+
+def _quote(item_ids, price="10"):
+    return PurchaseRequestPriceQuote(items=[
+        PurchaseItemPriceQuote(item_id=item_id, unit_price=Decimal(price), supplier_name="供应商A")
+        for item_id in item_ids
+    ])
+
+
+class TestPurchaseQuote:
+    """询价测试类"""
+
+    def test_quote_statement_count_independent_of_lines(self, db, engine, purchaser):
+        """测试300行申购单询价的语句数固定"""
+        print("\n💰 测试大申购单询价...")
+
+        request_id, item_ids = _submitted_request(db, purchaser, "PR202503010001", 300)
+
+        statements = []
+        # 明细的价格修改在提交时以 executemany 按批写入，只算一条语句
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            result = quote_purchase_request(request_id, _quote(item_ids), db, purchaser)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert result.status == PurchaseStatus.PRICE_QUOTED
+        assert result.total_amount == Decimal("6000")
+        assert db.query(PurchaseRequestItem).filter(PurchaseRequestItem.total_price == 20).count() == 300
+        assert len(statements) <= QUOTE_STATEMENT_BUDGET, statements
+        print(f"   ✅ 300行明细共 {len(statements)} 条语句")
+
+    def test_quote_rejects_foreign_items(self, db, purchaser):
+        """测试报价中包含其他申购单的明细时拒绝，且不写入任何修改"""
+        print("\n🚫 测试明细归属校验...")
+
+        request_id, item_ids = _submitted_request(db, purchaser, "PR202503010001", 2)
+        _, other_ids = _submitted_request(db, purchaser, "PR202503010002", 1)
+
+        with pytest.raises(HTTPException) as exc_info:
+            quote_purchase_request(request_id, _quote(item_ids + other_ids), db, purchaser)
+        assert exc_info.value.status_code == 404
+        assert str(other_ids[0]) in exc_info.value.detail
+
+        db.rollback()
+        assert db.get(PurchaseRequest, request_id).status == PurchaseStatus.SUBMITTED
+        print("   ✅ 明细归属校验正确")
+
+    def test_batch_quote(self, db, purchaser):
+        """测试批量询价全部成功，或任意一张失败时整体不生效"""
+        print("\n📦 测试批量询价...")
+
+        requests = [_submitted_request(db, purchaser, f"PR20250301000{i}", 3) for i in range(1, 4)]
+        quoted_id, _ = requests[2]
+        db.query(PurchaseRequest).filter(PurchaseRequest.id == quoted_id).update({"status": PurchaseStatus.PRICE_QUOTED})
+        db.commit()
+
+        batch = PurchaseRequestBatchQuote(quotes=[
+            PurchaseRequestBatchQuoteItem(request_id=request_id, items=_quote(item_ids).items)
+            for request_id, item_ids in requests
+        ])
+        with pytest.raises(HTTPException) as exc_info:
+            batch_quote_purchase_requests(batch, db, purchaser)
+        assert exc_info.value.status_code == 400 and "PR202503010003" in exc_info.value.detail
+        assert db.query(PurchaseWorkflowLog).count() == 0
+        assert db.query(PurchaseRequest).filter(PurchaseRequest.status == PurchaseStatus.PRICE_QUOTED).count() == 1
+
+        batch.quotes = batch.quotes[:2]
+        result = batch_quote_purchase_requests(batch, db, purchaser)
+        assert [request.id for request in result] == [request_id for request_id, _ in requests[:2]]
+        assert all(request.status == PurchaseStatus.PRICE_QUOTED for request in result)
+        assert [request.total_amount for request in result] == [Decimal("60"), Decimal("60")]
+        assert db.query(PurchaseWorkflowLog).filter(PurchaseWorkflowLog.operation == "quote").count() == 2
+        print("   ✅ 批量询价正确")
+
+    def test_batch_quote_rejects_duplicates(self, db, purchaser):
+        """测试批量询价中重复的申购单整体拒绝，并在错误信息中列出重复的ID"""
+        print("\n🔁 测试重复申购单...")
+
+        first_id, first_items = _submitted_request(db, purchaser, "PR202503010001", 2)
+        second_id, second_items = _submitted_request(db, purchaser, "PR202503010002", 1)
+
+        batch = PurchaseRequestBatchQuote(quotes=[
+            PurchaseRequestBatchQuoteItem(request_id=request_id, items=_quote(item_ids).items)
+            for request_id, item_ids in ((first_id, first_items), (second_id, second_items), (first_id, first_items))
+        ])
+        with pytest.raises(HTTPException) as exc_info:
+            batch_quote_purchase_requests(batch, db, purchaser)
+        assert exc_info.value.status_code == 400
+        assert f"申购单 {first_id} 重复" in exc_info.value.detail
+        assert db.query(PurchaseWorkflowLog).count() == 0
+        assert db.query(PurchaseRequest).filter(PurchaseRequest.status == PurchaseStatus.PRICE_QUOTED).count() == 0
+        print("   ✅ 重复申购单被拒绝")
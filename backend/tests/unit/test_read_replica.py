@@ -0,0 +1,100 @@
+"""
+只读副本路由单元测试
+
+验证只读GET接口读副本、写请求走主库，以及写入后的粘滞时间窗口内该用户的读请求仍走主库
+"""
+
+import os
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api import deps
+from app.core import database
+from app.core.database import READ_PRIMARY_COOKIE, Base
+from app.main import app
+from app.models.project import Project
+from app.models.user import User, UserRole
+
+
+def _session_factory(path, project_name):
+    """创建含一个项目的数据库，返回会话工厂"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = Session()
+    session.add(Project(project_code="P001", project_name=project_name, contract_amount=1000, project_manager="测试"))
+    session.commit()
+    session.close()
+    return Session
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """主库和副本中的项目名称不同，据此判断请求读的是哪个库"""
+    primary = _session_factory(tmp_path / "primary.db", "主库项目")
+    replica = _session_factory(tmp_path / "replica.db", "副本项目")
+    monkeypatch.setattr(database, "SessionLocal", primary)
+    monkeypatch.setattr(database, "ReplicaSessionLocals", [replica])
+
+    user = User(id=1, username="admin", password_hash="x", name="管理员", role=UserRole.ADMIN)
+    app.dependency_overrides[deps.get_current_user] = lambda: user
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _project_names(client):
+    response = client.get("/api/v1/projects/")
+    assert response.status_code == 200
+    return [item["project_name"] for item in response.json()["items"]]
+
+
+class TestReadReplica:
+    """只读副本路由测试类"""
+
+    def test_reads_go_to_replica_and_writes_to_primary(self, client):
+        """测试GET读副本，写入走主库，写入后短时间内读主库"""
+        print("\n🪞 测试副本路由...")
+
+        assert _project_names(client) == ["副本项目"]
+
+        response = client.post("/api/v1/projects/", json={"project_code": "P002", "project_name": "新项目"})
+        assert response.status_code == 200
+        assert READ_PRIMARY_COOKIE in response.cookies
+
+        # 写入后的粘滞时间窗口内读到自己刚写入的数据
+        assert _project_names(client) == ["主库项目", "新项目"]
+
+        # 时间窗口过后重新读副本
+        client.cookies.set(READ_PRIMARY_COOKIE, str(time.time() - 1))
+        assert _project_names(client) == ["副本项目"]
+        print("   ✅ 副本路由正确")
+
+    def test_failed_write_keeps_replica_reads(self, client):
+        """测试写入失败时不切换到主库"""
+        print("\n🚫 测试写入失败...")
+
+        response = client.post("/api/v1/projects/", json={"project_code": "P001", "project_name": "重复编号"})
+        assert response.status_code == 400
+        assert READ_PRIMARY_COOKIE not in response.cookies
+        assert _project_names(client) == ["副本项目"]
+        print("   ✅ 写入失败不影响读副本")
+
+    def test_no_replicas_reads_primary(self, client, monkeypatch):
+        """测试未配置副本时所有请求走主库，也不设置Cookie"""
+        print("\n🗄️ 测试未配置副本...")
+
+        monkeypatch.setattr(database, "ReplicaSessionLocals", [])
+        response = client.post("/api/v1/projects/", json={"project_code": "P002", "project_name": "新项目"})
+        assert READ_PRIMARY_COOKIE not in response.cookies
+
+        client.cookies.clear()
+        assert _project_names(client) == ["主库项目", "新项目"]
+        print("   ✅ 未配置副本时读主库")
@@ -0,0 +1,151 @@
+"""
+按物料名称查询规格型号单元测试
+
+验证返回结果与逐条汇总申购明细的结果一致，且查询次数与规格数量无关
+"""
+
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+import openpyxl
+import pytest
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.v1.purchase_query import get_specifications_by_material
+from app.core.database import Base
+from app.models.contract import VersionedContractItem
+from app.models.project import Project
+from app.models.purchase import PurchaseRequest, PurchaseRequestItem, PurchaseStatus
+from app.services import contract_import_service
+from app.services.contract_import_service import ContractImportService
+from app.services.purchase_ledger_service import LEDGER_STATUS_FIELDS, PurchaseLedgerService
+
+# 同一物料名称下的规格数量
+VARIANTS = 60
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(contract_import_service.settings, "contract_parse_cache_dir", str(tmp_path / "parse_cache"))
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def project_id(db, tmp_path):
+    project = Project(
+        project_code=f"TEST_{uuid.uuid4().hex[:8]}",
+        project_name="规格查询测试项目",
+        contract_amount=1000000.00,
+        project_manager="测试工程师"
+    )
+    db.add(project)
+    db.commit()
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "视频监控"
+    sheet.append(["序号", "设备名称", "设备品牌", "规格", "单位", "数量", "综合单价"])
+    for index in range(VARIANTS):
+        sheet.append([index + 1, "网络摄像机", "海康威视", f"DS-2CD{index:04d}", "台", 10, 800 + index])
+    sheet.append([VARIANTS + 1, "交换机", "华为", "S5735", "台", 2, 3000])
+    workbook.save(tmp_path / "contract.xlsx")
+
+    response = ContractImportService(db).import_contract_file(
+        project.id, str(tmp_path / "contract.xlsx"), "contract.xlsx", "测试用户"
+    )
+    assert response.success
+
+    # 对部分规格建立已批准和审批中的申购单
+    item_ids = [item_id for (item_id,) in db.query(VersionedContractItem.id).filter(
+        VersionedContractItem.version_id == response.version_id,
+        VersionedContractItem.item_name == "网络摄像机"
+    ).order_by(VersionedContractItem.id)]
+    for index, status in enumerate((PurchaseStatus.FINAL_APPROVED, PurchaseStatus.COMPLETED, PurchaseStatus.SUBMITTED)):
+        request = PurchaseRequest(request_code=f"PR-{index}", project_id=project.id, requester_id=1, status=status)
+        request.items = [
+            PurchaseRequestItem(contract_item_id=item_id, item_name="网络摄像机", unit="台",
+                                quantity=Decimal(index + 3), item_type="main")
+            for item_id in item_ids[index::7]
+        ]
+        db.add(request)
+    db.flush()
+    PurchaseLedgerService(db).rebuild()
+    db.commit()
+    return project.id
+
+
+def _expected(db, project_id, item_name):
+    """逐条汇总申购明细计算的结果（已批准、已完成以及审批中的主材申购都计入已申购）"""
+    items = db.query(VersionedContractItem).filter(
+        VersionedContractItem.project_id == project_id,
+        VersionedContractItem.item_name == item_name,
+        VersionedContractItem.is_active == True
+    ).order_by(VersionedContractItem.id).all()
+
+    specifications = []
+    for item in items:
+        purchased_quantity = db.query(func.sum(PurchaseRequestItem.quantity)).join(PurchaseRequest).filter(
+            PurchaseRequestItem.contract_item_id == item.id,
+            PurchaseRequestItem.item_type == "main",
+            PurchaseRequest.status.in_(list(LEDGER_STATUS_FIELDS))
+        ).scalar() or 0
+        remaining_quantity = float(item.quantity) - float(purchased_quantity)
+        specifications.append({
+            "contract_item_id": item.id,
+            "specification": item.specification,
+            "brand_model": item.brand_model,
+            "unit": item.unit,
+            "total_quantity": float(item.quantity),
+            "purchased_quantity": float(purchased_quantity),
+            "remaining_quantity": max(0, remaining_quantity),
+            "unit_price": float(item.unit_price) if item.unit_price else None
+        })
+    return specifications
+
+
+class TestSpecificationsByMaterial:
+    """规格型号查询测试类"""
+
+    def test_response_unchanged(self, db, project_id):
+        """测试返回结果与逐条汇总一致"""
+        print("\n📋 测试规格查询结果...")
+
+        result = get_specifications_by_material(project_id, "网络摄像机", db, None)
+
+        assert result["item_name"] == "网络摄像机" and result["project_id"] == project_id
+        assert len(result["specifications"]) == VARIANTS
+        assert result["specifications"] == _expected(db, project_id, "网络摄像机")
+        assert any(spec["purchased_quantity"] for spec in result["specifications"])
+        print("   ✅ 规格查询结果一致")
+
+    def test_query_count_bounded(self, db, engine, project_id):
+        """测试查询次数与规格数量无关"""
+        print("\n🔢 测试规格查询次数...")
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            result = get_specifications_by_material(project_id, "网络摄像机", db, None)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert len(result["specifications"]) == VARIANTS
+        assert len(statements) <= 2, statements
+        print(f"   ✅ {VARIANTS} 个规格共 {len(statements)} 次查询")
@@ -0,0 +1,99 @@
+"""
+接口执行模型单元测试
+
+验证 /api/v1 下的接口都是同步函数（由线程池执行阻塞的数据库查询和文件读写）或通过 get_async_db 执行查询，
+以及单个进程内的多个慢请求并行处理，而不是在事件循环上排队
+"""
+
+import asyncio
+import inspect
+import os
+import sys
+import time
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api import deps
+from app.api.v1 import projects
+from app.core import database
+from app.core.database import Base
+from app.main import app
+from app.models.user import User, UserRole
+
+# 每个请求在接口内阻塞的秒数和并发请求数
+BLOCKING_SECONDS = 0.2
+CONCURRENT_REQUESTS = 8
+
+
+@pytest.fixture
+def client_app(tmp_path, monkeypatch):
+    """使用临时数据库和固定用户的应用，项目列表接口每次查询前阻塞一段时间"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'threadpool.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    user = User(id=1, username="admin", password_hash="x", name="管理员", role=UserRole.ADMIN)
+    paginate = projects.paginate
+
+    def slow_paginate(*args, **kwargs):
+        time.sleep(BLOCKING_SECONDS)
+        return paginate(*args, **kwargs)
+
+    monkeypatch.setattr(projects, "paginate", slow_paginate)
+    app.dependency_overrides[database.get_db] = get_test_db
+    app.dependency_overrides[database.get_read_db] = get_test_db
+    app.dependency_overrides[deps.get_current_user] = lambda: user
+    yield app
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+async def _get_concurrently(application, url, count):
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(url) for _ in range(count)))
+
+
+class TestThreadpoolExecution:
+    """接口执行模型测试类"""
+
+    def test_api_routes_are_sync(self):
+        """测试 /api/v1 下的 async def 接口都通过 get_async_db 获取会话，其余接口由线程池执行"""
+        print("\n🔍 检查接口声明...")
+
+        api_routes = [route for route in app.routes if getattr(route, "path", "").startswith("/api/v1")]
+        async_routes = [route for route in api_routes if inspect.iscoroutinefunction(route.endpoint)]
+        blocking_routes = [
+            route.path for route in async_routes
+            if database.get_async_db not in [dependency.call for dependency in route.dependant.dependencies]
+        ]
+
+        assert api_routes and async_routes
+        assert blocking_routes == []
+        print(f"   ✅ {len(api_routes)} 个接口中 {len(async_routes)} 个使用 get_async_db，其余由线程池执行")
+
+    def test_blocking_requests_overlap(self, client_app):
+        """测试多个阻塞请求在同一进程内并行处理"""
+        print("\n⏱️ 测试并发请求...")
+
+        started = time.perf_counter()
+        responses = asyncio.run(_get_concurrently(client_app, "/api/v1/projects/", CONCURRENT_REQUESTS))
+        elapsed = time.perf_counter() - started
+
+        assert all(response.status_code == 200 for response in responses)
+        # 串行执行至少需要 8 × 0.2 = 1.6 秒
+        assert elapsed < BLOCKING_SECONDS * CONCURRENT_REQUESTS / 2
+        print(f"   ✅ {CONCURRENT_REQUESTS} 个请求共耗时 {elapsed:.2f} 秒")
@@ -0,0 +1,118 @@
+"""
+已认证用户缓存单元测试
+
+验证命中缓存时认证不访问数据库、用户被修改或停用后缓存失效，以及缓存的容量和过期时间
+"""
+
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from app.api.deps import get_current_user, require_permission
+from app.core import user_cache
+from app.core.config import settings
+from app.core.database import Base
+from app.core.security import SecurityException, create_access_token
+from app.models.user import User, UserRole
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", echo=False)
+    Base.metadata.create_all(bind=engine)
+    user_cache.clear_user_cache()
+    yield engine
+    user_cache.clear_user_cache()
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(username="purchaser", password_hash="x", name="采购员", role=UserRole.PURCHASER))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _request(token):
+    return Request({"type": "http", "headers": [(b"cookie", f"access_token={token}".encode())]})
+
+
+def _authenticate(engine, db, token):
+    """调用 get_current_user，返回 (用户, 执行的语句数)"""
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        return get_current_user(_request(token), db, None), len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+class TestUserCache:
+    """已认证用户缓存测试类"""
+
+    def test_cache_hit_skips_database(self, engine, db):
+        """测试第二次认证命中缓存，不执行任何语句，权限判断不变"""
+        print("\n👤 测试缓存命中...")
+
+        token = create_access_token(subject=1)
+        user, statements = _authenticate(engine, db, token)
+        assert statements == 1
+
+        cached, statements = _authenticate(engine, db, token)
+        assert statements == 0
+        assert (cached.id, cached.username, cached.name, cached.role) == (1, "purchaser", "采购员", UserRole.PURCHASER)
+        assert cached.is_active and cached.can_view_price()
+        assert require_permission("quote_price")(cached) is cached
+        print("   ✅ 命中缓存时不访问数据库")
+
+    def test_update_and_deactivate_invalidate(self, engine, db):
+        """测试修改角色、停用用户后缓存失效"""
+        print("\n🔄 测试缓存失效...")
+
+        token = create_access_token(subject=1)
+        _authenticate(engine, db, token)
+
+        db.get(User, 1).role = UserRole.FINANCE
+        db.commit()
+        user, statements = _authenticate(engine, db, token)
+        assert statements == 1 and user.role == UserRole.FINANCE
+
+        db.query(User).filter(User.id == 1).update({"is_active": False})
+        db.commit()
+        with pytest.raises(SecurityException, match="禁用"):
+            _authenticate(engine, db, token)
+        print("   ✅ 修改和停用后重新读取用户")
+
+    def test_size_and_ttl(self, engine, db, monkeypatch):
+        """测试缓存容量上限、令牌过期和关闭缓存"""
+        print("\n⏳ 测试容量和过期...")
+
+        monkeypatch.setattr(settings, "user_cache_size", 2)
+        tokens = [create_access_token(subject=1, expires_delta=timedelta(minutes=minutes)) for minutes in (1, 2, 3)]
+        for token in tokens:
+            _authenticate(engine, db, token)
+        assert user_cache.get_cached_user(tokens[0]) is None
+        assert user_cache.get_cached_user(tokens[2]) is not None
+
+        # 缓存时间不超过令牌自身的过期时间
+        expired = create_access_token(subject=1, expires_delta=timedelta(seconds=-1))
+        user_cache.cache_user(expired, db.get(User, 1))
+        assert user_cache.get_cached_user(expired) is None
+
+        monkeypatch.setattr(settings, "user_cache_ttl_seconds", 0)
+        user_cache.clear_user_cache()
+        token = create_access_token(subject=1)
+        _authenticate(engine, db, token)
+        assert _authenticate(engine, db, token)[1] == 1
+        print("   ✅ 容量和过期时间正确")